@@ -1,17 +1,44 @@
 import streamlit as st
 import os
-from utils.ai_generator import generate_mcqs
-from utils.file_parser import extract_text_from_pdf, extract_text_from_docx
-from utils.exporter import export_to_json, export_to_pdf
-from utils.session_manager import init_session, save_set, load_set, get_all_sets, delete_set
+import json
+import tempfile
+from datetime import datetime
+from utils.ai_generator import generate_mcqs_stream, generate_mcqs_bulk, BULK_THRESHOLD
+from utils.attempt_history import get_history
+from utils.bank_io import export_bank, import_bank
+from utils.passage_selector import select_passages
+from utils.file_parser import PageRangeError, iter_document_chunks
+from utils.exam_builder import MAX_EXAM_VARIANTS, build_exam, new_seed
+from utils.exporter import export_variants_zip, get_export
+from utils.job_queue import job_queue, JobQueueFull, DONE, CANCELLED
+from utils.metrics import metrics, start_metrics_file_writer
+from utils.quiz_analytics import MIN_RESPONSES, analyze, question_rows, suggest_difficulties
+from utils.quiz_engine import Quiz
+from utils.session_manager import init_session, keep_widget_state, save_set, load_set, delete_set, list_sets, count_sets, list_categories, question_strata, update_difficulties
 from dotenv import load_dotenv
 
+# Keyed inputs whose values survive switching to another tab and back
+PERSISTENT_WIDGET_KEYS = [
+    "ai_text_input", "num_q_ai_gen", "difficulty_ai_gen", "category_ai_gen", "fresh_ai_gen",
+    "page_range_doc_gen", "num_q_doc_gen", "difficulty_doc_gen", "category_doc_gen",
+    "fresh_doc_gen", "focus_doc_gen", "prompt_budget_doc_gen",
+    "quiz_set_selector", "show_quiz_stats", "exam_seed", "exam_variants", "exam_title", "new_set_name",
+    "manage_sets_search", "manage_sets_category", "manage_sets_difficulty",
+    "export_format_selector",
+]
+# Initial values of persistent inputs (set through session state, not the widget's value=)
+WIDGET_DEFAULTS = {"num_q_ai_gen": 5, "num_q_doc_gen": 5, "prompt_budget_doc_gen": 6000,
+                   "exam_seed": new_seed(), "exam_variants": 1, "exam_title": "Exam"}
+
 # Load environment variables (e.g., Gemini API Key)
 load_dotenv()
 
 # Initialize session state variables
 init_session()
 
+# Inputs of tabs that are not open are not rendered, so keep their values across tab switches
+keep_widget_state(PERSISTENT_WIDGET_KEYS, WIDGET_DEFAULTS)
+
 # --- Configuration ---
 st.set_page_config(
     page_title="QuizGenius - AI MCQ Generator",
@@ -19,6 +46,14 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+SETS_PER_PAGE = 10 # Saved sets shown per page in the Manage Sets tab
+JOB_POLL_INTERVAL = 1.0 # Seconds between progress refreshes of running generation jobs
+# Set QUIZGENIUS_ADMIN_PANEL=1 to show the process-wide metrics in the sidebar
+ADMIN_PANEL = os.getenv("QUIZGENIUS_ADMIN_PANEL", "").lower() in ("1", "true", "yes")
+
+# Writes the metrics to QUIZGENIUS_METRICS_FILE periodically, if it is set (once per process)
+start_metrics_file_writer()
+
 # Function to load custom CSS
 def load_css(file_name):
     try:
@@ -30,17 +65,159 @@ def load_css(file_name):
 # Load the main UI CSS (this will style Streamlit's native widgets)
 load_css("assets/styles.css")
 
-# --- Simplified Streamlit UI ---
+# Function to render a single MCQ with its options and details
+def render_mcq(number, q):
+    st.markdown(f"**{number}. {q['question']}**")
+    for opt_idx, opt in enumerate(q['options']):
+        st.write(f"    {chr(65 + opt_idx)}. {opt}")
+    st.write(f"    **Correct Answer:** {q['correct_answer']}")
+    st.write(f"    *Difficulty: {q['difficulty']} | Category: {q['category']}*")
+    if q.get("near_duplicate_of"):
+        duplicate_of = q["near_duplicate_of"]
+        st.caption(f"Possible near-duplicate of question {duplicate_of['position']} in "
+                   f"'{duplicate_of['set']}' ({duplicate_of['similarity']:.0%} similar)")
+    st.markdown("---")
 
-st.title("QuizGenius - AI MCQ Generator")
-st.write("Create, manage, and take multiple-choice quizzes effortlessly.")
+# Background job body: generates the questions, reporting progress and streamed questions on the job
+def generation_job(job, text, num_questions, difficulty, category, use_cache):
+    if num_questions > BULK_THRESHOLD:
+        # Large question banks are built in parallel batches
+        def report_progress(batches_done, collected, target):
+            job.report(collected / target, f"{collected} of {target} questions ready ({batches_done} batches done)")
 
-# Main navigation tabs
-tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
-    "AI Generator", "Manual Entry", "Upload Doc", "Take Quiz", "Manage Sets", "Export"
-])
+        return generate_mcqs_bulk(text, num_questions, difficulty, category, use_cache=use_cache,
+                                  progress_callback=report_progress, should_stop=lambda: job.cancel_requested)
 
-with tab1:
+    mcqs = []
+    mcq_stream = generate_mcqs_stream(text, num_questions, difficulty, category, use_cache=use_cache)
+    try:
+        for q in mcq_stream:
+            job.check_cancelled()
+            mcqs.append(q)
+            job.add_partial(q)
+            job.report(len(mcqs) / num_questions, f"{len(mcqs)} of {num_questions} questions ready")
+    finally:
+        mcq_stream.close()
+    return mcqs
+
+# Function to submit a generation job for a tab; the tab then follows its progress
+def start_generation(tab_name, label, text, num_questions, difficulty, category, use_cache):
+    try:
+        job = job_queue.submit(label, generation_job, text, num_questions, difficulty, category, use_cache)
+    except JobQueueFull as e:
+        st.error(str(e))
+        return
+    st.session_state.generation_jobs[tab_name] = job.id
+
+# Function to move the results of finished generation jobs into the current questions
+def deliver_finished_jobs():
+    finished = [job_queue.get(job_id) for job_id in st.session_state.generation_jobs.values()]
+    finished = [job for job in finished if job and job.status == DONE and job.id not in st.session_state.delivered_jobs]
+    for job in sorted(finished, key=lambda job: job.finished):
+        st.session_state.delivered_jobs.add(job.id)
+        if job.result:
+            st.session_state.current_mcqs = job.result
+            st.toast(f"{job.label}: {len(job.result)} questions are ready.")
+
+# Live progress of a running job; polls until the job finishes, then reruns the app to deliver it
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def job_progress(job_id, heading):
+    job = job_queue.get(job_id)
+    if job is None or job.is_finished:
+        st.rerun()
+    st.progress(job.progress, text=f"{job.label}: {job.message}")
+    if st.button("Cancel", key=f"cancel_job_{job_id}", disabled=job.cancel_requested):
+        job_queue.cancel(job_id)
+    partial = job.partial_snapshot()
+    if partial:
+        st.markdown("---")
+        st.subheader(heading)
+        for i, q in enumerate(partial):
+            render_mcq(i + 1, q)
+
+# Compact progress of jobs started in tabs that are not open
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def background_jobs_status(job_ids):
+    running = [job for job in map(job_queue.get, job_ids) if job and not job.is_finished]
+    if not running:
+        st.rerun()
+    for job in running:
+        st.caption(f"⏳ {job.label}: {job.message} ({job.progress:.0%})")
+
+# Function to show a tab's generation job: its progress while it runs, then its outcome once
+def render_generation_job(tab_name, heading, failure_message):
+    job = job_queue.get(st.session_state.generation_jobs.get(tab_name))
+    if job is None:
+        return
+    if not job.is_finished:
+        job_progress(job.id, heading)
+        return
+    del st.session_state.generation_jobs[tab_name] # The outcome is shown once, like an inline run
+    for level, message in job.messages_snapshot():
+        getattr(st, level)(message)
+    if job.status == DONE and job.result:
+        st.success(f"Successfully generated {len(job.result)} MCQs!")
+        st.markdown("---")
+        st.subheader(heading)
+        for i, q in enumerate(job.result):
+            render_mcq(i + 1, q)
+    elif job.status == CANCELLED:
+        st.info("Generation cancelled.")
+    else:
+        st.error(failure_message)
+
+# Operator view of the metrics of the whole process (every session), for finding the slow stage
+@st.fragment
+def admin_panel():
+    st.header("Metrics")
+    st.caption("Totals since the server started, across all sessions.")
+    st.button("Refresh", key="refresh_metrics")
+    snapshot = metrics.snapshot()
+    sources = snapshot["sources"]
+
+    st.subheader("Stages")
+    stages = metrics.stage_summary()
+    if stages:
+        st.dataframe(stages, hide_index=True)
+    else:
+        st.caption("Nothing has been timed yet.")
+
+    st.subheader("Caches")
+    for name, label in (("mcq_cache", "Generated questions"), ("export_cache", "Exports")):
+        cache = sources.get(name)
+        if cache:
+            st.metric(f"{label} hit rate", f"{cache['hit_rate']:.0%}",
+                      help=f"{cache['hits']} hits, {cache['misses']} misses, {cache['entries']} entries")
+
+    st.subheader("Model calls")
+    tokens = [{"mode": h["labels"]["mode"], "direction": h["labels"]["direction"], "calls": h["count"],
+               "total": int(h["sum"]), "mean": round(h["mean"]), "p95": round(h["p95"])}
+              for h in snapshot["histograms"] if h["name"] == "llm_call_tokens"]
+    if tokens:
+        st.dataframe(tokens, hide_index=True)
+    st.caption("Token counts are estimates (about 4 characters per token).")
+    for name in ("llm_client", "jobs", "repair"):
+        if sources.get(name):
+            with st.expander(name.replace("_", " ").capitalize()):
+                st.json(sources[name])
+    outcomes = {c["labels"]["outcome"]: c["value"] for c in snapshot["counters"] if c["name"] == "questions_total"}
+    if outcomes:
+        with st.expander("Generated question outcomes"):
+            st.json(outcomes)
+    bank = {c["labels"]["direction"]: c["value"] for c in snapshot["counters"] if c["name"] == "bank_questions_total"}
+    if bank:
+        with st.expander("Bank import/export"):
+            st.json(bank)
+
+    st.download_button("Download (Prometheus)", data=metrics.render_prometheus,
+                       file_name="quizgenius_metrics.prom", mime="text/plain")
+    st.download_button("Download (JSON)", data=lambda: json.dumps(metrics.snapshot(), indent=2),
+                       file_name="quizgenius_metrics.json", mime="application/json")
+
+# --- Tab sections ---
+
+@st.fragment
+def ai_generator_tab():
     st.header("Generate MCQs from Text")
     st.write("Enter text below to generate multiple-choice questions using AI.")
     
@@ -48,7 +225,8 @@ with tab1:
                               placeholder="Paste your learning material, notes, or article here...")
     
     num_questions = st.number_input(
-        "Number of questions to generate:", min_value=1, max_value=20, value=5, key="num_q_ai_gen"
+        "Number of questions to generate:", min_value=1, max_value=500, key="num_q_ai_gen",
+        help=f"More than {BULK_THRESHOLD} questions are generated in parallel batches."
     )
     difficulty = st.selectbox(
         "Difficulty Level:", ["Easy", "Medium", "Hard"], key="difficulty_ai_gen"
@@ -56,29 +234,22 @@ with tab1:
     category = st.text_input(
         "Category (optional):", key="category_ai_gen", placeholder="e.g., Science, History"
     )
+    fresh_ai = st.checkbox(
+        "Generate fresh questions (ignore cached results)", key="fresh_ai_gen"
+    )
 
-    if st.button("Generate MCQs", key="generate_mcqs_btn"):
+    running = job_queue.get(st.session_state.generation_jobs.get("AI Generator"))
+    if st.button("Generate MCQs", key="generate_mcqs_btn", disabled=bool(running and not running.is_finished)):
         if text_input:
-            with st.spinner("Generating questions... This may take a moment."):
-                mcqs = generate_mcqs(text_input, num_questions, difficulty, category)
-                if mcqs:
-                    st.session_state.current_mcqs = mcqs
-                    st.success(f"Successfully generated {len(mcqs)} MCQs!")
-                    st.markdown("---")
-                    st.subheader("Generated Questions")
-                    for i, q in enumerate(st.session_state.current_mcqs):
-                        st.markdown(f"**{i+1}. {q['question']}**")
-                        for opt_idx, opt in enumerate(q['options']):
-                            st.write(f"    {chr(65 + opt_idx)}. {opt}")
-                        st.write(f"    **Correct Answer:** {q['correct_answer']}")
-                        st.write(f"    *Difficulty: {q['difficulty']} | Category: {q['category']}*")
-                        st.markdown("---")
-                else:
-                    st.error("Failed to generate MCQs. Please try again with different text or check your API key.")
+            start_generation("AI Generator", "Generating MCQs", text_input, num_questions, difficulty,
+                             category, not fresh_ai)
         else:
             st.warning("Please enter some text to generate MCQs.")
+    render_generation_job("AI Generator", "Generated Questions",
+                          "Failed to generate MCQs. Please try again with different text or check your API key.")
 
-with tab2:
+@st.fragment
+def manual_entry_tab():
     st.header("Manually Create Questions")
     st.write("Add your own custom Multiple Choice Questions.")
 
@@ -119,18 +290,14 @@ with tab2:
 
         if manual_questions_only:
             for i, q in enumerate(manual_questions_only):
-                st.markdown(f"**{i+1}. {q['question']}**")
-                for opt_idx, opt in enumerate(q['options']):
-                    st.write(f"    {chr(65 + opt_idx)}. {opt}")
-                st.write(f"    **Correct Answer:** {q['correct_answer']}")
-                st.write(f"    *Difficulty: {q['difficulty']} | Category: {q['category']}*")
-                st.markdown("---")
+                render_mcq(i + 1, q)
         else:
             st.info("No questions added manually yet.")
     else:
         st.info("No questions added manually yet.")
 
-with tab3:
+@st.fragment
+def upload_doc_tab():
     st.header("Generate MCQs from Document Upload")
     st.write("Upload a PDF, DOCX, or TXT file to automatically generate MCQs.")
 
@@ -138,8 +305,13 @@ with tab3:
         "Choose a file", type=["pdf", "docx", "txt"], key="doc_uploader"
     )
 
+    page_range_doc = st.text_input(
+        "Pages to use (PDF only, optional):", key="page_range_doc_gen", placeholder="e.g., 1-20, 35, 40-"
+    )
+
     num_questions_doc = st.number_input(
-        "Number of questions to generate from document:", min_value=1, max_value=20, value=5, key="num_q_doc_gen"
+        "Number of questions to generate from document:", min_value=1, max_value=500, key="num_q_doc_gen",
+        help=f"More than {BULK_THRESHOLD} questions are generated in parallel batches."
     )
     difficulty_doc = st.selectbox(
         "Difficulty Level (Document):", ["Easy", "Medium", "Hard"], key="difficulty_doc_gen"
@@ -147,160 +319,376 @@ with tab3:
     category_doc = st.text_input(
         "Category (optional, Document):", key="category_doc_gen", placeholder="e.g., Biology, Computer Science"
     )
-
-    if st.button("Generate from Document", key="generate_doc_btn"):
+    fresh_doc = st.checkbox(
+        "Generate fresh questions (ignore cached results)", key="fresh_doc_gen"
+    )
+    focus_doc = st.checkbox(
+        "Only send the most relevant passages (faster and cheaper for long documents)", key="focus_doc_gen"
+    )
+    if focus_doc:
+        prompt_budget_doc = st.number_input(
+            "Prompt budget (approximate tokens of document text):",
+            min_value=500, max_value=100000, step=500, key="prompt_budget_doc_gen"
+        )
+
+    running = job_queue.get(st.session_state.generation_jobs.get("Upload Doc"))
+    if st.button("Generate from Document", key="generate_doc_btn", disabled=bool(running and not running.is_finished)):
         if uploaded_file is not None:
-            file_type = uploaded_file.type
-            extracted_text = ""
-            
+            chunks = None # Pages of a PDF, sections of a DOCX or TXT file
             with st.spinner("Extracting text from document..."):
-                if "pdf" in file_type:
-                    extracted_text = extract_text_from_pdf(uploaded_file)
-                elif "docx" in file_type:
-                    extracted_text = extract_text_from_docx(uploaded_file)
-                elif "text" in file_type:
-                    extracted_text = uploaded_file.read().decode("utf-8")
-                else:
-                    st.error("Unsupported file type. Please upload PDF, DOCX, or TXT.")
-            
-            if extracted_text:
-                with st.spinner("Generating questions from document content..."):
-                    mcqs = generate_mcqs(extracted_text, num_questions_doc, difficulty_doc, category_doc)
-                    if mcqs:
-                        st.session_state.current_mcqs = mcqs
-                        st.success(f"Successfully generated {len(mcqs)} MCQs!")
-                        st.markdown("---")
-                        st.subheader("Generated Questions from Document")
-                        for i, q in enumerate(st.session_state.current_mcqs):
-                            st.markdown(f"**{i+1}. {q['question']}**")
-                            for opt_idx, opt in enumerate(q['options']):
-                                st.write(f"    {chr(65 + opt_idx)}. {opt}")
-                            st.write(f"    **Correct Answer:** {q['correct_answer']}")
-                            st.write(f"    *Difficulty: {q['difficulty']} | Category: {q['category']}*")
-                            st.markdown("---")
-                    else:
-                        st.error("Failed to generate MCQs from document. Please check the document content or API key.")
-            else:
+                try:
+                    chunks = list(iter_document_chunks(uploaded_file, uploaded_file.type, page_range_doc))
+                except PageRangeError as e:
+                    st.error(f"Invalid page selection: {e}")
+                except Exception as e:
+                    st.error(f"Error reading the document: {e}")
+                    print(f"Error reading the document: {e}") # For developer debugging
+
+            extracted_text = ""
+            if chunks and focus_doc:
+                # Passages are picked from the chunks, so only the selected text is ever joined
+                extracted_text, selection = select_passages(chunks, prompt_budget_doc, focus=category_doc or "")
+                st.caption(
+                    f"Using {selection['kept_fraction']:.0%} of the document "
+                    f"({selection['kept_passages']} of {selection['total_passages']} passages, "
+                    f"~{selection['kept_tokens']} tokens)."
+                )
+            elif chunks:
+                extracted_text = "".join(chunks)
+
+            if extracted_text.strip():
+                start_generation("Upload Doc", "Generating MCQs from document", extracted_text, num_questions_doc,
+                                 difficulty_doc, category_doc, not fresh_doc)
+            elif chunks is not None:
                 st.error("Could not extract text from the uploaded document.")
         else:
             st.warning("Please upload a document first.")
-
-with tab4:
+    render_generation_job("Upload Doc", "Generated Questions from Document",
+                          "Failed to generate MCQs from document. Please check the document content or API key.")
+
+# Function to copy the answers chosen on the quiz page on screen into the quiz
+def save_quiz_page(quiz):
+    quiz.finish_page()
+    for i in quiz.page_indexes():
+        quiz.answer(i, st.session_state.get(f"quiz_q_{i}"))
+
+# Callbacks of the quiz form's buttons; they run before the rerun, so it shows the new page or the results
+def turn_quiz_page(quiz, step):
+    save_quiz_page(quiz)
+    quiz.go_to_page(quiz.page + step)
+
+def submit_quiz(quiz):
+    save_quiz_page(quiz)
+    quiz.grade()
+    # Every graded attempt feeds the quiz statistics; failing to record one must not lose the results
+    try:
+        get_history().record(quiz.questions, quiz.answers, quiz.seconds, quiz.label)
+    except Exception as e:
+        print(f"Could not record the quiz attempt: {e}") # For developer debugging
+
+# Function to re-tag the difficulty of the saved questions as the quiz statistics suggest
+def apply_suggested_difficulties(suggestions):
+    history = get_history()
+    catalog = history.catalog() # Its options are already in canonical (sorted) order
+    changed = update_difficulties({(row["question"], tuple(catalog[row["key"]]["options"])): row["suggested"]
+                                   for row in suggestions})
+    history.set_difficulties({row["key"]: row["suggested"] for row in suggestions})
+    st.session_state.retag_result = changed
+
+# Function to show the statistics of every recorded quiz attempt (only while the toggle is on)
+def quiz_statistics_section():
+    history = get_history()
+    columns = history.columns()
+    if not len(columns["attempt_ids"]):
+        st.info("No quizzes have been taken yet.")
+        return
+    catalog = history.catalog()
+    stats = analyze(columns, catalog)
+    st.write(f"{stats['attempts']} attempts · {stats['answers']} answers · {len(stats['questions']['key'])} questions")
+    st.markdown("**Mastery by category** (share of correct answers)")
+    st.dataframe(stats["categories"], hide_index=True)
+    st.markdown("**Questions** (p-value: share answered correctly; discrimination: how much better the best "
+                "attempts did than the worst on it)")
+    st.dataframe(question_rows(stats, catalog), hide_index=True)
+
+    if "retag_result" in st.session_state:
+        st.success(f"Re-tagged {st.session_state.pop('retag_result')} saved questions.")
+    suggestions = suggest_difficulties(stats, catalog)
+    if suggestions:
+        st.markdown(f"**Suggested difficulty changes** (questions answered at least {MIN_RESPONSES} times)")
+        st.dataframe([{k: v for k, v in row.items() if k != "key"} for row in suggestions], hide_index=True)
+        st.button("Apply Suggested Difficulties", key="apply_difficulties_btn",
+                  on_click=apply_suggested_difficulties, args=(suggestions,))
+
+# Function to write a download to a temporary file on disk instead of building it in memory
+def download_file(write):
+    output = tempfile.TemporaryFile()
+    write(output)
+    # download_button reads raw files in one go; the buffered wrapper is flushed and dropped
+    return output.detach()
+
+# Function to build the ZIP of every variant of an exam with their answer keys
+def exam_variants_zip(exam, title):
+    return download_file(lambda output: export_variants_zip(
+        exam["variants"], output, title=f"{title} (seed {exam['seed']})"))
+
+# Function to export every saved question in a bank file format
+def bank_export(file_format):
+    return download_file(lambda output: export_bank(output, file_format))
+
+# Function to draw an exam by category and difficulty from every saved set, in shuffled variants
+def exam_builder_section():
+    strata = question_strata()
+    st.caption(f"The bank holds {sum(strata.values())} questions. Each row draws that many questions at random "
+               "from every saved set; the same seed always draws the same exam.")
+    categories = sorted({category for category, _ in strata} - {""})
+    blueprint_rows = st.data_editor(
+        [{"Category": "Any", "Difficulty": "Any", "Count": 10}],
+        column_config={
+            "Category": st.column_config.SelectboxColumn(options=["Any"] + categories, required=True),
+            "Difficulty": st.column_config.SelectboxColumn(options=["Any", "Easy", "Medium", "Hard"], required=True),
+            "Count": st.column_config.NumberColumn(min_value=1, max_value=1000, step=1, required=True),
+        },
+        num_rows="dynamic",
+        key="exam_blueprint",
+    )
+    col_exam1, col_exam2 = st.columns(2)
+    with col_exam1:
+        exam_seed = st.number_input("Seed:", min_value=0, max_value=2**31 - 1, step=1, key="exam_seed")
+    with col_exam2:
+        num_variants = st.number_input("Variants:", min_value=1, max_value=MAX_EXAM_VARIANTS, step=1, key="exam_variants")
+
+    if st.button("Build Exam", key="build_exam_btn"):
+        blueprint = [
+            {
+                "category": None if row.get("Category") in (None, "Any") else row["Category"],
+                "difficulty": None if row.get("Difficulty") in (None, "Any") else row["Difficulty"],
+                "count": row.get("Count") or 0,
+            }
+            for row in blueprint_rows
+        ]
+        exam = build_exam(blueprint, int(num_variants), int(exam_seed))
+        st.session_state.exam = exam if exam["questions"] else None
+        if not exam["questions"]:
+            st.error("No saved questions match this exam.")
+
+    exam = st.session_state.exam
+    if exam:
+        st.success(f"Exam of {len(exam['questions'])} questions in {len(exam['variants'])} variants (seed {exam['seed']}).")
+        variant_number = st.selectbox("Variant:", range(1, len(exam["variants"]) + 1), key="exam_variant_selector")
+        variant = exam["variants"][variant_number - 1]
+        col_exam3, col_exam4 = st.columns(2)
+        with col_exam3:
+            if st.button("Start Quiz", key="start_exam_btn"):
+                st.session_state.quiz = Quiz(variant, label=f"Exam {exam['seed']}, variant {variant_number}")
+                st.rerun()
+        with col_exam4:
+            if st.button("Use as Current Questions", key="use_exam_btn"):
+                st.session_state.current_mcqs = variant
+                st.success(f"Variant {variant_number} is now the current question list (see the Export tab).")
+        exam_title = st.text_input("Title printed on the exams:", key="exam_title")
+        # Built only when clicked: every variant and its answer key, rendered in parallel into one ZIP
+        st.download_button(
+            label=f"Download All {len(exam['variants'])} Variants and Answer Keys (ZIP)",
+            data=lambda: exam_variants_zip(exam, exam_title or "Exam"),
+            file_name=f"exam_{exam['seed']}_variants.zip",
+            mime="application/zip",
+            key="download_exam_zip"
+        )
+
+@st.fragment
+def take_quiz_tab():
     st.header("Take a Quiz")
     st.write("Select a question set and test your knowledge!")
 
-    if not st.session_state.current_quiz_questions:
-        available_sets = get_all_sets()
+    if st.session_state.quiz is None:
+        available_sets = {s["name"]: s["question_count"] for s in list_sets()}
         if available_sets:
             set_names = list(available_sets.keys())
             selected_set_name = st.selectbox("Choose a question set for the quiz:", ["-- Select a Set --"] + set_names, key="quiz_set_selector")
 
             if selected_set_name != "-- Select a Set --":
-                questions_for_quiz = available_sets[selected_set_name]
-                st.info(f"Selected set '{selected_set_name}' with {len(questions_for_quiz)} questions.")
+                st.info(f"Selected set '{selected_set_name}' with {available_sets[selected_set_name]} questions.")
                 if st.button("Start Quiz", key="start_quiz_btn"):
-                    st.session_state.current_quiz_questions = questions_for_quiz
-                    st.session_state.quiz_answers = {q['question']: None for q in questions_for_quiz}
-                    st.session_state.quiz_submitted = False
-                    st.session_state.quiz_score = 0
-                    st.success("Quiz started!")
-                    st.experimental_rerun()
+                    questions_for_quiz = load_set(selected_set_name)
+                    if questions_for_quiz:
+                        st.session_state.quiz = Quiz(questions_for_quiz, label=selected_set_name)
+                        st.success("Quiz started!")
+                        st.rerun()
+            with st.expander("Build an exam from all saved sets"):
+                exam_builder_section()
         else:
             st.info("No saved question sets available. Generate or manually create questions and save them first!")
-    
-    if st.session_state.current_quiz_questions:
-        st.markdown("---")
-        st.subheader("Active Quiz")
-        
+        # Computed only on request: the statistics cover every attempt ever recorded
+        if st.toggle("Show quiz statistics", key="show_quiz_stats"):
+            with st.container(border=True):
+                quiz_statistics_section()
+
+    quiz = st.session_state.quiz
+    if quiz is None:
+        return
+    st.markdown("---")
+    st.subheader("Active Quiz")
+
+    if not quiz.submitted:
+        # Only the current page is rendered, so a page costs the same in a set of any size
+        st.write(f"Page {quiz.page + 1} of {quiz.num_pages} · {quiz.answered} of {len(quiz)} questions answered")
         with st.form("quiz_form"):
-            for i, q in enumerate(st.session_state.current_quiz_questions):
-                st.markdown(f"<div class='quiz-question'>", unsafe_allow_html=True)
+            for i in quiz.page_indexes():
+                q = quiz.questions[i]
                 st.markdown(f"**Question {i+1}: {q['question']}**")
-                
-                current_selection = st.session_state.quiz_answers.get(q['question'])
-                try:
-                    default_index = q['options'].index(current_selection) if current_selection else 0
-                except ValueError:
-                    default_index = 0
-
-                selected_option = st.radio(
+                st.radio(
                     "Select your answer:",
-                    options=q['options'],
+                    options=range(len(q['options'])),
+                    format_func=lambda opt_idx, options=q['options']: options[opt_idx],
                     key=f"quiz_q_{i}",
-                    index=default_index
+                    index=quiz.selected(i)
                 )
-                st.session_state.quiz_answers[q['question']] = selected_option
-                st.markdown(f"</div>", unsafe_allow_html=True)
 
-            quiz_submit_button = st.form_submit_button("Submit Quiz")
-
-        if quiz_submit_button or st.session_state.quiz_submitted:
-            st.session_state.quiz_submitted = True
-            st.markdown("---")
-            st.subheader("Quiz Results")
-            score = 0
-            total_questions = len(st.session_state.current_quiz_questions)
-
-            for i, q in enumerate(st.session_state.current_quiz_questions):
-                user_answer = st.session_state.quiz_answers.get(q['question'])
-                is_correct = (user_answer == q['correct_answer'])
-
-                if is_correct:
-                    score += 1
-                    st.success(f"✅ Question {i+1}: Correct! Your answer: '{user_answer}'")
-                else:
-                    st.error(f"❌ Question {i+1}: Incorrect. Your answer: '{user_answer}'. Correct answer: '{q['correct_answer']}'")
-                st.markdown(f"**Question:** {q['question']}")
-                st.markdown(f"**Options:** {', '.join(q['options'])}")
-                st.markdown(f"**Your Answer:** {user_answer if user_answer else 'No answer'}")
-                st.markdown(f"**Correct Answer:** {q['correct_answer']}")
-                st.markdown("---")
-            
-            st.metric(label="Your Score", value=f"{score}/{total_questions}", delta=f"{round((score/total_questions)*100, 2) if total_questions > 0 else 0}%")
-            
-            if st.button("End Quiz", key="end_quiz_btn"):
-                st.session_state.current_quiz_questions = []
-                st.session_state.quiz_answers = {}
-                st.session_state.quiz_submitted = False
-                st.session_state.quiz_score = 0
-                st.experimental_rerun()
-
-with tab5:
+            col_quiz1, col_quiz2, col_quiz3 = st.columns([1, 1, 2])
+            with col_quiz1:
+                st.form_submit_button("Previous", disabled=quiz.page == 0, on_click=turn_quiz_page, args=(quiz, -1))
+            with col_quiz2:
+                st.form_submit_button("Next", disabled=quiz.page == quiz.num_pages - 1, on_click=turn_quiz_page, args=(quiz, 1))
+            with col_quiz3:
+                st.form_submit_button("Submit Quiz", type="primary", on_click=submit_quiz, args=(quiz,))
+        return
+
+    # Graded in one pass by submit_quiz; the review is a single table rather than widgets per question
+    result = quiz.result
+    st.subheader("Quiz Results")
+    st.metric(label="Your Score", value=f"{result['score']}/{result['total']}", delta=f"{result['percent']}%")
+    if result["answered"] < result["total"]:
+        st.warning(f"{result['total'] - result['answered']} questions were left unanswered.")
+    review_rows = result["rows"]
+    if st.checkbox("Show only questions I got wrong", key="quiz_review_incorrect"):
+        review_rows = [row for row, is_correct in zip(review_rows, result["correct"].tolist()) if not is_correct]
+    st.dataframe(review_rows, hide_index=True)
+
+    if st.button("End Quiz", key="end_quiz_btn"):
+        st.session_state.quiz = None
+        st.rerun()
+
+@st.fragment
+def manage_sets_tab():
     st.header("Manage Saved Question Sets")
     st.write("Save the currently displayed questions or load/delete existing sets.")
 
+    # A widget's value can only be changed before it is created, so a save clears it on the next run
+    if st.session_state.pop("clear_new_set_name", False):
+        st.session_state.new_set_name = ""
     st.text_input("Enter a name to save current questions as a new set:", key="new_set_name", placeholder="e.g., 'Biology Chapter 5 Questions'")
     if st.button("Save Current Questions", key="save_current_btn"):
         if st.session_state.current_mcqs:
-            save_set(st.session_state.new_set_name, st.session_state.current_mcqs)
+            duplicates = save_set(st.session_state.new_set_name, st.session_state.current_mcqs)
             st.success(f"Set '{st.session_state.new_set_name}' saved!")
-            st.session_state.new_set_name = ""
-            st.experimental_rerun()
+            if duplicates:
+                # A toast stays visible across the rerun below
+                st.toast(f"{len(duplicates)} questions look like near-duplicates of questions already saved "
+                         "and were flagged. Use 'Show questions' to review them.")
+            st.session_state.clear_new_set_name = True
+            st.rerun()
         else:
             st.warning("No questions in current session to save.")
 
     st.markdown("---")
     st.subheader("Your Saved Question Sets")
-    saved_sets = get_all_sets()
-    if saved_sets:
-        for set_name, questions in saved_sets.items():
-            st.expander(f"**{set_name}** ({len(questions)} questions)").write(questions)
-            col_set1, col_set2 = st.columns(2)
+
+    # Filters reset the listing to its first page
+    def reset_manage_sets_page():
+        st.session_state.manage_sets_page = 1
+
+    col_filter1, col_filter2, col_filter3 = st.columns([2, 1, 1])
+    with col_filter1:
+        set_search = st.text_input("Search sets by name:", key="manage_sets_search", on_change=reset_manage_sets_page)
+    with col_filter2:
+        set_category = st.selectbox("Category:", ["All"] + list_categories(), key="manage_sets_category", on_change=reset_manage_sets_page)
+    with col_filter3:
+        set_difficulty = st.selectbox("Difficulty:", ["All", "Easy", "Medium", "Hard"], key="manage_sets_difficulty", on_change=reset_manage_sets_page)
+
+    set_filters = {
+        "search": set_search or None,
+        "category": None if set_category == "All" else set_category,
+        "difficulty": None if set_difficulty == "All" else set_difficulty,
+    }
+    total_sets = count_sets(**set_filters)
+    if total_sets:
+        total_pages = (total_sets + SETS_PER_PAGE - 1) // SETS_PER_PAGE
+        if 'manage_sets_page' not in st.session_state:
+            st.session_state.manage_sets_page = 1
+        st.session_state.manage_sets_page = min(st.session_state.manage_sets_page, total_pages)
+        page = st.session_state.manage_sets_page
+
+        # Only the summaries of the current page are read; questions load on demand
+        for summary in list_sets(offset=(page - 1) * SETS_PER_PAGE, limit=SETS_PER_PAGE, **set_filters):
+            set_name = summary["name"]
+            updated = datetime.fromtimestamp(summary["updated_at"]).strftime("%Y-%m-%d %H:%M") if summary["updated_at"] else "-"
+            st.markdown(f"**{set_name}** ({summary['question_count']} questions)")
+            st.caption(f"Categories: {', '.join(summary['categories']) or '-'} | Updated: {updated}")
+
+            expanded = st.session_state.get("manage_sets_expanded") == set_name
+            col_set1, col_set2, col_set3 = st.columns(3)
             with col_set1:
+                if st.button("Hide questions" if expanded else "Show questions", key=f"toggle_set_{set_name}"):
+                    st.session_state.manage_sets_expanded = None if expanded else set_name
+                    st.rerun()
+            with col_set2:
                 if st.button(f"Load '{set_name}'", key=f"load_set_{set_name}"):
                     st.session_state.current_mcqs = load_set(set_name)
                     st.success(f"Set '{set_name}' loaded into current session.")
-                    st.experimental_rerun()
-            with col_set2:
+                    st.rerun()
+            with col_set3:
                 if st.button(f"Delete '{set_name}'", key=f"delete_set_{set_name}"):
                     delete_set(set_name)
                     st.success(f"Set '{set_name}' deleted.")
-                    st.experimental_rerun()
+                    st.rerun()
+            if expanded:
+                for i, q in enumerate(load_set(set_name)):
+                    render_mcq(i + 1, q)
             st.markdown("---")
+
+        col_page1, col_page2, col_page3 = st.columns([1, 2, 1])
+        with col_page1:
+            if st.button("Previous", key="manage_sets_prev", disabled=page <= 1):
+                st.session_state.manage_sets_page = page - 1
+                st.rerun()
+        with col_page2:
+            st.write(f"Page {page} of {total_pages} ({total_sets} sets)")
+        with col_page3:
+            if st.button("Next", key="manage_sets_next", disabled=page >= total_pages):
+                st.session_state.manage_sets_page = page + 1
+                st.rerun()
+    elif any(set_filters.values()):
+        st.info("No question sets match these filters.")
     else:
         st.info("No question sets saved yet.")
 
-with tab6:
+    with st.expander("Import or export the whole question bank"):
+        bank_file = st.file_uploader("Import questions from a JSONL or QuizGenius bank (.qgb) file:",
+                                     type=["jsonl", "qgb", "gz"], key="bank_import_file")
+        replace_sets = st.checkbox("Replace saved sets that have the same names", value=True, key="bank_import_replace")
+        if st.button("Import Questions", key="bank_import_btn", disabled=bank_file is None):
+            with st.spinner("Importing questions..."):
+                try:
+                    imported = import_bank(bank_file, replace=replace_sets)
+                except (ValueError, OSError) as e:
+                    st.error(f"Could not import '{bank_file.name}': {e}")
+                else:
+                    st.success(f"Imported {imported['questions']} questions into {imported['sets']} sets.")
+
+        bank_format = st.selectbox("Export format:", ["JSONL", "QuizGenius bank (.qgb, compact)"], key="bank_export_format")
+        bank_extension = "jsonl" if bank_format == "JSONL" else "qgb"
+        # Streamed from the store only when the download is clicked
+        st.download_button(
+            label="Download All Saved Questions",
+            data=lambda: bank_export(bank_extension),
+            file_name=f"quizgenius_bank.{bank_extension}",
+            mime="application/octet-stream",
+            key="bank_export_btn"
+        )
+
+@st.fragment
+def export_tab():
     st.header("Export Questions")
     st.write("Export the currently displayed questions to various formats.")
 
@@ -309,30 +697,56 @@ with tab6:
 
         export_format = st.selectbox("Select Export Format:", ["JSON", "PDF"], key="export_format_selector")
 
+        # Exports are built only when a download is clicked (deferred data), and memoized
+        # on the content hash so unchanged questions are never rebuilt
+        questions_to_export = list(st.session_state.current_mcqs)
         if export_format == "JSON":
-            json_data = export_to_json(st.session_state.current_mcqs)
             st.download_button(
                 label="Download Questions as JSON",
-                data=json_data,
+                data=lambda: get_export(questions_to_export, "json"),
                 file_name="mcq_questions.json",
                 mime="application/json"
             )
         elif export_format == "PDF":
-            #st.warning("PDF export functionality is under development. Please choose JSON for now.")
-            # Add the download button for PDF
-            pdf_bytes = export_to_pdf(st.session_state.current_mcqs)
-            if pdf_bytes:
-                st.download_button(
-                    label="Download Questions as PDF",
-                    data=pdf_bytes,
-                    file_name="mcq_questions.pdf",
-                    mime="application/pdf"
-                )
-            else:
-                st.error("Failed to generate PDF. Please try again.")
+            st.download_button(
+                label="Download Questions as PDF",
+                data=lambda: get_export(questions_to_export, "pdf"),
+                file_name="mcq_questions.pdf",
+                mime="application/pdf"
+            )
     else:
         st.info("No questions available in the current session to export. Generate or create some first!")
 
+# --- Simplified Streamlit UI ---
+
+st.title("QuizGenius - AI MCQ Generator")
+st.write("Create, manage, and take multiple-choice quizzes effortlessly.")
+
+# Main navigation tabs. Only the open tab's section runs on each rerun (switching tabs
+# reruns the app), and each section is a fragment, so interacting with a widget reruns
+# just that section instead of the whole page
+# Generation runs in background jobs: deliver the finished ones, and keep an eye on
+# the ones started in a tab that is not open
+deliver_finished_jobs()
+open_tab = st.session_state.get("main_tab") or "AI Generator"
+elsewhere = [job_id for tab_name, job_id in st.session_state.generation_jobs.items() if tab_name != open_tab]
+if any(job and not job.is_finished for job in map(job_queue.get, elsewhere)):
+    background_jobs_status(elsewhere)
+
+main_tabs = st.tabs(
+    ["AI Generator", "Manual Entry", "Upload Doc", "Take Quiz", "Manage Sets", "Export"],
+    key="main_tab", on_change="rerun"
+)
+tab_sections = [ai_generator_tab, manual_entry_tab, upload_doc_tab, take_quiz_tab, manage_sets_tab, export_tab]
+for tab, render_section in zip(main_tabs, tab_sections):
+    with tab:
+        if tab.open:
+            render_section()
+
+if ADMIN_PANEL:
+    with st.sidebar:
+        admin_panel()
+
 # Simple Footer
 st.markdown("---")
 st.markdown("<p style='text-align: center; color: #c89f93;'>&copy; 2024 QuizGenius. All rights reserved.</p>", unsafe_allow_html=True)
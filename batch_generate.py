@@ -0,0 +1,267 @@
+# batch_generate.py
+"""
+Generates question banks for a whole directory of documents, without Streamlit.
+
+Every PDF, DOCX and TXT file under the directory is extracted in a process pool, at
+most --concurrency documents are generated at once, and the questions are appended to
+a JSONL file (one question per line, with its "source" file) as each document
+finishes. Completed documents are recorded in a checkpoint file next to the output, so
+rerunning the same command after a crash or interruption skips them.
+
+Usage:
+    python batch_generate.py COURSE_DIR [--output questions.jsonl] [--questions 10] [--concurrency 4]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from utils.ai_generator import BULK_THRESHOLD, GEMINI_API_KEY, generate_mcqs, generate_mcqs_bulk
+from utils.file_parser import iter_docx_sections, iter_pdf_pages, iter_txt_chunks
+from utils.metrics import metrics, start_metrics_file_writer
+from utils.notify import capture_messages
+
+DOCUMENT_EXTENSIONS = (".pdf", ".docx", ".txt")
+
+
+def find_documents(directory: str) -> list:
+    """Returns the paths of the supported documents under a directory, relative to it, in a stable order."""
+    found = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(DOCUMENT_EXTENSIONS) and not name.startswith("~$"): # Skip Office lock files
+                found.append(os.path.relpath(os.path.join(root, name), directory))
+    return found
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def extract_document(path: str, page_range: str = None) -> tuple:
+    """
+    Extracts the text of one document inside a worker process.
+    Returns (text, error, seconds); PDFs are read serially since the document itself runs in a pool.
+    Metrics recorded in the worker would be lost, so the caller records the time taken.
+    """
+    started = time.perf_counter()
+    try:
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".pdf":
+            text = "".join(page_text + "\n" for _, page_text in iter_pdf_pages(path, page_range, parallel=False))
+        elif extension == ".docx":
+            text = "".join(iter_docx_sections(path))
+        else:
+            text = "".join(iter_txt_chunks(path))
+        return text, None, time.perf_counter() - started
+    except Exception as e:
+        return "", f"{type(e).__name__}: {e}", time.perf_counter() - started
+
+
+def load_checkpoint(checkpoint_path: str) -> dict:
+    """Returns {source: sha1} for the documents already completed."""
+    done = {}
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue # A line cut short by a crash
+                done[entry["source"]] = entry["sha1"]
+    return done
+
+
+def drop_incomplete_output(output_path: str, done: dict, regenerating: set = frozenset()):
+    """
+    Removes questions of documents that never reached the checkpoint (and a last line
+    cut short by a crash), so resuming does not write them twice. The questions of
+    documents in `regenerating` (changed since they were completed) are removed too,
+    since they are about to be replaced.
+    """
+    if not os.path.exists(output_path):
+        return
+    kept = []
+    dropped = 0
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                source = json.loads(line).get("source")
+            except json.JSONDecodeError:
+                source = None
+            if source in done and source not in regenerating:
+                kept.append(line)
+            else:
+                dropped += 1
+    if dropped:
+        temp_path = output_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.writelines(kept)
+        os.replace(temp_path, output_path)
+        print(f"Dropped {dropped} lines left by an unfinished run or by documents that changed.", file=sys.stderr)
+
+
+def generate_for_document(source: str, text: str, args, llm_override) -> tuple:
+    """Generates the questions for one document's text. Returns (mcqs, messages)."""
+    messages = []
+
+    def collect(level, message):
+        messages.append((level, message))
+        print(f"{level.upper()} [{source}]: {message}", file=sys.stderr)
+
+    with capture_messages(collect):
+        if args.questions > BULK_THRESHOLD:
+            mcqs = generate_mcqs_bulk(text, args.questions, args.difficulty, args.category,
+                                      llm_override=llm_override, use_cache=not args.no_cache)
+        else:
+            mcqs = generate_mcqs(text, args.questions, args.difficulty, args.category,
+                                 llm_override=llm_override, use_cache=not args.no_cache)
+    return mcqs, messages
+
+
+def run(args) -> dict:
+    """Processes the directory and returns a summary of the run."""
+    directory = os.path.abspath(args.directory)
+    checkpoint_path = args.output + ".checkpoint"
+    if args.restart:
+        for path in (args.output, checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
+    done = load_checkpoint(checkpoint_path)
+
+    llm_override = None
+    if args.fake_llm:
+        from utils.fake_llm import FakeMCQChatModel
+        from utils.llm_client import scheduled
+        llm_override = scheduled(FakeMCQChatModel(latency=args.fake_latency))
+
+    pending = []
+    skipped = 0
+    for source in find_documents(directory):
+        digest = file_digest(os.path.join(directory, source))
+        if done.get(source) == digest:
+            skipped += 1
+        else:
+            pending.append((source, digest))
+    # A document that changed since it was completed is generated again; its old questions go
+    drop_incomplete_output(args.output, done, {source for source, _ in pending if source in done})
+
+    summary = {"documents": len(pending) + skipped, "skipped": skipped, "completed": 0,
+               "failed": [], "questions": 0}
+    started = time.perf_counter()
+    # Extract at most this many documents ahead of generation, so texts do not pile up in memory
+    window = args.extract_workers + 2 * args.concurrency
+    with open(args.output, "a", encoding="utf-8") as output, \
+            open(checkpoint_path, "a", encoding="utf-8") as checkpoint, \
+            ProcessPoolExecutor(max_workers=args.extract_workers) as extractors, \
+            ThreadPoolExecutor(max_workers=args.concurrency) as generators:
+        tasks = {} # future -> (stage, source, digest)
+        next_document = 0
+
+        def fill_window():
+            nonlocal next_document
+            while next_document < len(pending) and len(tasks) < window:
+                source, digest = pending[next_document]
+                future = extractors.submit(extract_document, os.path.join(directory, source), args.page_range)
+                tasks[future] = ("extract", source, digest)
+                next_document += 1
+
+        fill_window()
+        while tasks:
+            finished, _ = wait(tasks, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, source, digest = tasks.pop(future)
+                if stage == "extract":
+                    text, error, seconds = future.result()
+                    file_format = os.path.splitext(source)[1].lower().lstrip(".")
+                    metrics.observe("stage_seconds", seconds, stage="extract", format=file_format)
+                    if error:
+                        metrics.error("extract", format=file_format)
+                    else:
+                        metrics.count("bytes_total", os.path.getsize(os.path.join(directory, source)),
+                                      stage="extract", direction="in", format=file_format)
+                        metrics.count("bytes_total", len(text.encode("utf-8")),
+                                      stage="extract", direction="out", format=file_format)
+                    if not text.strip():
+                        summary["failed"].append({"source": source, "error": error or "No text could be extracted."})
+                        print(f"FAILED [{source}]: {error or 'no text could be extracted'}", file=sys.stderr)
+                        continue
+                    tasks[generators.submit(generate_for_document, source, text, args, llm_override)] = \
+                        ("generate", source, digest)
+                    continue
+
+                try:
+                    mcqs, messages = future.result()
+                except Exception as e:
+                    mcqs, messages = [], [("error", str(e))]
+                if not mcqs:
+                    errors = [message for level, message in messages if level == "error"]
+                    summary["failed"].append({"source": source, "error": errors[0] if errors else "No questions generated."})
+                    print(f"FAILED [{source}]: no questions generated", file=sys.stderr)
+                    continue
+                for mcq in mcqs:
+                    output.write(json.dumps(dict(mcq, source=source), ensure_ascii=False) + "\n")
+                output.flush()
+                os.fsync(output.fileno()) # The questions must be on disk before the checkpoint says so
+                checkpoint.write(json.dumps({"source": source, "sha1": digest, "questions": len(mcqs)}) + "\n")
+                checkpoint.flush()
+                os.fsync(checkpoint.fileno())
+                summary["completed"] += 1
+                summary["questions"] += len(mcqs)
+                print(f"Done [{source}]: {len(mcqs)} questions "
+                      f"({summary['completed'] + len(summary['failed'])}/{len(pending)})", file=sys.stderr)
+            fill_window()
+
+    summary["elapsed_s"] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("directory", help="Directory to search for PDF, DOCX and TXT files")
+    parser.add_argument("--output", default="questions.jsonl", help="JSONL file the questions are appended to")
+    parser.add_argument("--questions", type=int, default=10, help="Questions per document")
+    parser.add_argument("--difficulty", default="Medium", choices=["Easy", "Medium", "Hard"])
+    parser.add_argument("--category", default="", help="Category for every question (inferred if empty)")
+    parser.add_argument("--page-range", help="Pages to use from each PDF, e.g. '1-20, 35'")
+    parser.add_argument("--concurrency", type=int, default=4, help="Documents generated at once")
+    parser.add_argument("--extract-workers", type=int, default=min(4, os.cpu_count() or 1),
+                        help="Processes extracting document text")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached results and generate fresh questions")
+    parser.add_argument("--restart", action="store_true", help="Discard the output and checkpoint and start over")
+    parser.add_argument("--fake-llm", action="store_true", help="Use the offline fake model instead of Gemini")
+    parser.add_argument("--fake-latency", type=float, default=0.5, help="Seconds per call of the fake model")
+    parser.add_argument("--metrics-file", help="Write stage timings, token counts and cache stats to this file "
+                                               "(JSON if it ends in .json, else Prometheus text)")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        parser.error(f"Not a directory: {args.directory}")
+    if not args.fake_llm and not GEMINI_API_KEY:
+        parser.error("Gemini API Key not found. Please set GEMINI_API_KEY in your .env file or environment.")
+    args.concurrency = max(1, args.concurrency)
+    args.extract_workers = max(1, args.extract_workers)
+
+    if args.metrics_file:
+        start_metrics_file_writer(args.metrics_file)
+    summary = run(args)
+    if args.metrics_file:
+        metrics.write(args.metrics_file) # The final totals, whatever the writer's last tick was
+    print(json.dumps(summary, indent=2))
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# benchmarks/bench_app_rerun.py
+"""
+Rerun latency of the whole app, per open tab, with a large session driven headlessly.
+
+The session holds --questions current questions and an active quiz of --quiz-questions
+questions, and the question store holds --sets saved sets. For each tab the app is
+opened on that tab and then rerun, once plainly and once through a typical widget
+interaction in that tab. AppTest always reruns the full script, so the numbers are an
+upper bound for fragment reruns in a live session, which skip the page header too.
+
+To compare with an older revision, check its app.py out to a file inside the repository
+(it loads assets relative to the working directory) and pass it with --app.
+
+Usage:
+    python benchmarks/bench_app_rerun.py [--questions 1000] [--sets 500] [--reruns 10] [--output results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-placeholder")
+os.environ.setdefault("QUIZGENIUS_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.sqlite3"))
+
+from utils.quiz_engine import Quiz
+from utils.session_manager import save_sets
+
+TABS = ["AI Generator", "Manual Entry", "Upload Doc", "Take Quiz", "Manage Sets", "Export"]
+CATEGORIES = ["Biology", "Chemistry", "Physics", "History", "Geography"]
+
+
+def make_questions(n: int, prefix: str = "Question") -> list:
+    return [
+        {
+            "question": f"{prefix} {i}: which process converts light energy into chemical energy?",
+            "options": ["Photosynthesis", "Respiration", "Fermentation", "Transpiration"],
+            "correct_answer": "Photosynthesis",
+            "difficulty": ["Easy", "Medium", "Hard"][i % 3],
+            "category": CATEGORIES[i % len(CATEGORIES)],
+        }
+        for i in range(n)
+    ]
+
+
+def summarize(samples: list) -> dict:
+    samples = sorted(samples)
+    return {
+        "runs": len(samples),
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "p95_ms": round(samples[int(0.95 * (len(samples) - 1))] * 1000, 3),
+        "max_ms": round(samples[-1] * 1000, 3),
+    }
+
+
+def timed(action) -> float:
+    start = time.perf_counter()
+    action()
+    return time.perf_counter() - start
+
+
+# One representative interaction per tab; each returns the pending AppTest run
+INTERACTIONS = {
+    "AI Generator": lambda at, i: at.text_area(key="ai_text_input").input(f"Some notes {i}"),
+    "Manual Entry": lambda at, i: at.text_input[0].input(f"Question {i}?"),
+    "Upload Doc": lambda at, i: at.checkbox(key="fresh_doc_gen").set_value(i % 2 == 0),
+    "Take Quiz": lambda at, i: next(b for b in at.button if b.label == ("Next" if i % 2 == 0 else "Previous")).click(),
+    "Manage Sets": lambda at, i: at.button(key="manage_sets_next" if i % 2 == 0 else "manage_sets_prev").click(),
+    "Export": lambda at, i: at.selectbox(key="export_format_selector").select(["JSON", "PDF"][i % 2]),
+}
+
+
+def bench_tab(app_path: str, tab: str, questions: list, quiz: list, reruns: int) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(app_path, default_timeout=300)
+    at.session_state["current_mcqs"] = questions
+    at.session_state["quiz"] = Quiz(quiz)
+    at.session_state["main_tab"] = tab
+    first = timed(at.run)
+    if at.exception:
+        raise RuntimeError(f"App raised while rendering '{tab}': {at.exception[0].message}")
+    rerun = [timed(at.run) for _ in range(reruns)]
+    interaction = [timed(INTERACTIONS[tab](at, i).run) for i in range(reruns)]
+    return {
+        "first_run_ms": round(first * 1000, 3),
+        "rerun": summarize(rerun),
+        "interaction": summarize(interaction),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--questions", type=int, default=1000, help="Questions in the current session")
+    parser.add_argument("--quiz-questions", type=int, default=200, help="Questions in the active quiz")
+    parser.add_argument("--sets", type=int, default=500, help="Saved sets in the question store")
+    parser.add_argument("--set-size", type=int, default=20, help="Questions per saved set")
+    parser.add_argument("--reruns", type=int, default=10)
+    parser.add_argument("--app", default=os.path.join(ROOT, "app.py"), help="App script to benchmark")
+    parser.add_argument("--tabs", nargs="*", default=TABS, help="Only benchmark these tabs")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    os.chdir(ROOT) # The app loads assets/styles.css relative to the working directory
+    save_sets({f"Set {i:05d}": make_questions(args.set_size, f"Set {i} question") for i in range(args.sets)})
+    questions = make_questions(args.questions)
+    quiz = make_questions(args.quiz_questions, "Quiz question")
+
+    results = {
+        "benchmark": "app_rerun",
+        "app": os.path.relpath(os.path.abspath(args.app), ROOT),
+        "questions": args.questions,
+        "quiz_questions": args.quiz_questions,
+        "saved_sets": args.sets,
+        "tabs": {tab: bench_tab(os.path.abspath(args.app), tab, questions, quiz, args.reruns) for tab in args.tabs},
+    }
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# benchmarks/bench_bank_io.py
+"""
+Size, throughput and peak memory of bank export/import: pretty JSON vs JSONL vs QGB.
+
+A bank of --questions synthetic questions in --sets sets is bulk-loaded into a fresh
+SQLite store. Each format is then exported from the store to a file and read back
+(and, for the streaming formats, imported into a second store). The baseline is
+what the app offers today: loading every set and json.dumps(..., indent=4) through
+export_to_json, read back with json.load. Peak memory is the largest amount Python
+allocated during the operation (tracemalloc, measured in a separate run because it
+slows everything down); the streaming formats stay flat as the bank grows.
+
+Usage:
+    python benchmarks/bench_bank_io.py [--questions 100000] [--sets 100] [--output results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp()
+os.environ.setdefault("QUIZGENIUS_DB_PATH", os.path.join(WORKDIR, "bench.sqlite3"))
+
+from synthetic import make_questions
+from utils import session_manager
+from utils.bank_io import export_bank, import_bank, read_jsonl, read_qgb
+from utils.exporter import export_to_json
+from utils.question_store import SQLiteQuestionStore
+
+
+def timed(action) -> tuple:
+    start = time.perf_counter()
+    result = action()
+    return time.perf_counter() - start, result
+
+
+def peak_mb(action) -> float:
+    tracemalloc.start()
+    try:
+        action()
+        return round(tracemalloc.get_traced_memory()[1] / 1e6, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def export_pretty_json(path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(export_to_json([dict(q, set=name) for name, questions in session_manager.get_all_sets().items()
+                                for q in questions]))
+
+
+def read_pretty_json(path: str) -> int:
+    with open(path, encoding="utf-8") as f:
+        return len(json.load(f))
+
+
+def drain(records) -> int:
+    return sum(1 for _ in records)
+
+
+def import_fresh(path: str, store_path: str) -> dict:
+    """Imports into an empty store, then switches back to the benchmark bank."""
+    bank = session_manager.get_store()
+    session_manager.set_store(SQLiteQuestionStore(store_path))
+    try:
+        return import_bank(path)
+    finally:
+        session_manager.set_store(bank)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--questions", type=int, default=100000, help="Questions in the bank")
+    parser.add_argument("--sets", type=int, default=100, help="Sets the questions are spread over")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the (slow) peak memory runs")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    print(f"Loading a bank of {args.questions} questions...", file=sys.stderr)
+    per_set = -(-args.questions // args.sets)
+    questions = make_questions(args.questions)
+    session_manager.append_sets({f"Set {i:04d}": questions[i * per_set:(i + 1) * per_set] for i in range(args.sets)})
+    del questions
+
+    cases = {
+        "pretty_json": ("bank.json", export_pretty_json, read_pretty_json),
+        "jsonl": ("bank.jsonl", export_bank, lambda path: drain(read_jsonl(path))),
+        "jsonl_gz": ("bank.jsonl.gz", export_bank, lambda path: drain(read_jsonl(path))),
+        "qgb": ("bank.qgb", export_bank, lambda path: drain(read_qgb(path))),
+        "qgb_gz": ("bank.qgb.gz", export_bank, lambda path: drain(read_qgb(path))),
+    }
+    results = {"benchmark": "bank_io", "questions": args.questions, "sets": args.sets, "formats": {}}
+    for name, (file_name, export, read) in cases.items():
+        print(f"Running {name}...", file=sys.stderr)
+        path = os.path.join(WORKDIR, file_name)
+        export_seconds, _ = timed(lambda: export(path))
+        read_seconds, count = timed(lambda: read(path))
+        if count != args.questions:
+            raise RuntimeError(f"{name}: read back {count} of {args.questions} questions")
+        case = {
+            "bytes": os.path.getsize(path),
+            "bytes_per_question": round(os.path.getsize(path) / args.questions, 1),
+            "export_s": round(export_seconds, 3),
+            "export_questions_per_s": round(args.questions / export_seconds),
+            "read_s": round(read_seconds, 3),
+            "read_questions_per_s": round(args.questions / read_seconds),
+        }
+        if name != "pretty_json": # There is no import for it; its read is json.load alone
+            store_path = os.path.join(WORKDIR, f"import_{name}.sqlite3")
+            import_seconds, imported = timed(lambda: import_fresh(path, store_path))
+            case["import_s"] = round(import_seconds, 3)
+            case["import_questions_per_s"] = round(imported["questions"] / import_seconds)
+        if not args.no_memory:
+            case["export_peak_mb"] = peak_mb(lambda: export(path))
+            case["read_peak_mb"] = peak_mb(lambda: read(path))
+        results["formats"][name] = case
+    baseline = results["formats"]["pretty_json"]["bytes"]
+    for case in results["formats"].values():
+        case["size_vs_pretty_json"] = round(case["bytes"] / baseline, 3)
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# benchmarks/bench_export_rerun.py
+"""
+Rerun latency of the Export tab with a large question set, before and after memoization.
+
+"before" rebuilds the JSON/PDF artifact on every rerun, as the Export tab used to.
+"after" is the current behaviour: nothing is built on a rerun, and a download builds
+the artifact through the memoized get_export (rebuilt only when the content changes).
+The full app is also rerun headlessly with Streamlit's AppTest.
+
+Usage:
+    python benchmarks/bench_export_rerun.py [--questions 1000] [--reruns 20] [--output results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-placeholder")
+os.environ.setdefault("QUIZGENIUS_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.sqlite3"))
+
+from utils.exporter import export_to_json, export_to_pdf, get_export, export_cache
+
+
+def make_questions(n: int) -> list:
+    return [
+        {
+            "question": f"Question {i}: which process converts light energy into chemical energy?",
+            "options": ["Photosynthesis", "Respiration", "Fermentation", "Transpiration"],
+            "correct_answer": "Photosynthesis",
+            "difficulty": ["Easy", "Medium", "Hard"][i % 3],
+            "category": "Biology",
+        }
+        for i in range(n)
+    ]
+
+
+def summarize(samples: list) -> dict:
+    samples = sorted(samples)
+    return {
+        "runs": len(samples),
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "p95_ms": round(samples[int(0.95 * (len(samples) - 1))] * 1000, 3),
+        "max_ms": round(samples[-1] * 1000, 3),
+    }
+
+
+def time_reruns(body, reruns: int) -> list:
+    samples = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        body()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_export_body(questions: list, reruns: int) -> dict:
+    results = {}
+    for export_format, exporter in (("json", export_to_json), ("pdf", export_to_pdf)):
+        before = time_reruns(lambda: exporter(questions), reruns)
+        export_cache.clear()
+        # One download per rerun is the worst case for the memoized path
+        after_download = time_reruns(lambda: get_export(questions, export_format), reruns)
+        after_rerun = time_reruns(lambda: list(questions), reruns) # Snapshot taken for the deferred button
+        results[export_format] = {
+            "before_rerun": summarize(before),
+            "after_rerun": summarize(after_rerun),
+            "after_download": summarize(after_download),
+        }
+    return results
+
+
+def bench_app_rerun(questions: list, reruns: int) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    app_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+    at = AppTest.from_file(app_path, default_timeout=120)
+    at.session_state["current_mcqs"] = questions
+    at.session_state["main_tab"] = "Export"
+    at.run()
+    at.selectbox(key="export_format_selector").select("PDF").run()
+    return summarize(time_reruns(at.run, reruns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--questions", type=int, default=1000)
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--skip-app", action="store_true", help="Only time the export step, not the full app")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    questions = make_questions(args.questions)
+    results = {
+        "benchmark": "export_rerun",
+        "questions": args.questions,
+        "export": bench_export_body(questions, args.reruns),
+    }
+    if not args.skip_app:
+        results["app_rerun_pdf_selected"] = bench_app_rerun(questions, args.reruns)
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# benchmarks/bench_import_time.py
+"""
+Cold-start guard: time to import everything app.py imports, in fresh interpreters.
+
+The imports are read from app.py itself, so the check follows the app. Every run
+starts a new `python -X importtime` process; the median wall time must stay within
+--budget-ms, and none of LAZY_MODULES (langchain, PyPDF2, python-docx, fpdf)
+may be loaded by the imports alone, since they are only needed once a user generates,
+uploads or exports. The slowest top-level imports of the last run are listed, and
+the cost deferred to the first generation (building the Gemini model and chain) is
+measured separately.
+
+Exits with status 1 when the budget is exceeded or a lazy module is imported eagerly,
+so it can run as a check in CI.
+
+Usage:
+    python benchmarks/bench_import_time.py [--runs 5] [--budget-ms 1500] [--output results.json]
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_MODULES = ["langchain", "langchain_core", "langchain_google_genai", "PyPDF2", "docx", "fpdf"]
+
+CHILD = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+{setup}
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+loaded = sorted({{name.split(".")[0] for name in sys.modules}} & set({lazy!r}))
+print(json.dumps({{"seconds": elapsed, "lazy_loaded": loaded}}))
+"""
+
+
+def app_imports(app_path: str) -> list:
+    """The module-level import statements of app.py, as source lines."""
+    with open(app_path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def parse_importtime(stderr: str, top: int) -> list:
+    """The `top` slowest top-level imports from -X importtime output, by cumulative time."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "): # Indented names were imported by another module
+            rows.append({"module": name.strip(), "cumulative_ms": round(int(cumulative) / 1000, 1)})
+    return sorted(rows, key=lambda row: -row["cumulative_ms"])[:top]
+
+
+def run_child(code: str, env: dict, workdir: str, setup: str = "") -> tuple:
+    """Times the code (after the untimed setup) in a fresh interpreter. Returns (result, importtime stderr)."""
+    script = CHILD.format(root=ROOT, setup=setup, code=code, lazy=LAZY_MODULES)
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", script], cwd=workdir, env=env,
+                             capture_output=True, text=True)
+    if process.returncode:
+        raise RuntimeError(f"The import run failed:\n{process.stderr[-2000:]}")
+    return json.loads(process.stdout.strip().splitlines()[-1]), process.stderr
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5, help="Timed fresh-interpreter runs (after one warm-up)")
+    parser.add_argument("--budget-ms", type=float, default=1500, help="Allowed median import time of the app")
+    parser.add_argument("--top", type=int, default=10, help="Slowest top-level imports to list")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ,
+               QUIZGENIUS_CACHE_PATH=os.path.join(workdir, "cache.sqlite3"),
+               QUIZGENIUS_DB_PATH=os.path.join(workdir, "bench.sqlite3"))
+    env.pop("GEMINI_API_KEY", None) # Importing must not need the key either
+    imports = app_imports(os.path.join(ROOT, "app.py"))
+    code = "\n".join(imports)
+
+    run_child(code, env, workdir) # Warm-up: fills the OS file cache and writes bytecode
+    samples = []
+    lazy_loaded = set()
+    for _ in range(max(1, args.runs)):
+        result, stderr = run_child(code, env, workdir)
+        samples.append(result["seconds"])
+        lazy_loaded.update(result["lazy_loaded"])
+
+    # What the lazy loading moved to the first generation
+    deferred, _ = run_child("ai_generator.get_chain()", dict(env, GEMINI_API_KEY="benchmark-placeholder"), workdir,
+                            setup="import utils.ai_generator as ai_generator")
+
+    median_ms = statistics.median(samples) * 1000
+    results = {
+        "benchmark": "import_time",
+        "imports": imports,
+        "runs": len(samples),
+        "median_ms": round(median_ms, 1),
+        "min_ms": round(min(samples) * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1),
+        "budget_ms": args.budget_ms,
+        "lazy_modules_loaded": sorted(lazy_loaded),
+        "slowest_imports": parse_importtime(stderr, args.top),
+        "deferred_first_generation_ms": round(deferred["seconds"] * 1000, 1),
+    }
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+    failures = []
+    if median_ms > args.budget_ms:
+        failures.append(f"median import time {median_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    if lazy_loaded:
+        failures.append(f"imported eagerly: {', '.join(sorted(lazy_loaded))}")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# benchmarks/bench_llm_client.py
+"""
+Shared LLM client under load, against the local fake model injecting latency and 429s.
+
+The fake rejects every --rate-limit-every-th call and any call arriving while
+--server-concurrency calls are already running, like an API over its quota. One "bulk"
+session fires --bulk-requests calls at once while --sessions interactive sessions make
+--interactive-requests calls each, one after another. This runs three times:
+
+- direct: calls go straight to the model, so every 429 reaches the caller;
+- fifo: through the scheduler, but every call queued under one session;
+- fair: through the scheduler with per-session round-robin queuing.
+
+A bulk generation through the async path and a timeout check are also run.
+
+Usage:
+    python benchmarks/bench_llm_client.py [--sessions 4] [--bulk-requests 32] [--latency 0.2] [--output results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-placeholder")
+os.environ.setdefault("QUIZGENIUS_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "cache.sqlite3"))
+
+from utils.ai_generator import generate_mcqs_bulk, prompt
+from utils.fake_llm import FakeMCQChatModel
+from utils.llm_client import LLMScheduler, scheduled, session_scope
+
+TEXT = ("Photosynthesis converts light energy into chemical energy stored in glucose. "
+        "Chlorophyll absorbs mostly blue and red light, and oxygen is released as a by-product. ") * 20
+
+
+def render_prompt(num_questions: int = 3) -> str:
+    return prompt.format(text=TEXT, num_questions=num_questions, difficulty="Medium",
+                         category="Biology", existing_questions="[]")
+
+
+def percentiles(samples: list) -> dict:
+    if not samples:
+        return {}
+    samples = sorted(samples)
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 1),
+        "p95_ms": round(samples[int(0.95 * (len(samples) - 1))] * 1000, 1),
+        "max_ms": round(samples[-1] * 1000, 1),
+    }
+
+
+def make_fake(args, **overrides) -> FakeMCQChatModel:
+    settings = dict(latency=args.latency, rate_limit_every=args.rate_limit_every,
+                    max_concurrent=args.server_concurrency)
+    settings.update(overrides)
+    return FakeMCQChatModel(**settings)
+
+
+def make_scheduler(args, **overrides) -> LLMScheduler:
+    settings = dict(requests_per_minute=0, tokens_per_minute=0, max_concurrent=args.server_concurrency,
+                    timeout=10, max_retries=args.retries, backoff_base=args.latency / 2, backoff_max=2)
+    settings.update(overrides)
+    return LLMScheduler(**settings)
+
+
+def run_mode(args, mode: str) -> dict:
+    """Runs the mixed bulk + interactive load once and reports what the callers saw."""
+    fake = make_fake(args)
+    client = make_scheduler(args) if mode != "direct" else None
+    model = scheduled(fake, client) if client else fake
+    text = render_prompt()
+    latencies = {"bulk": [], "interactive": []}
+    failures = {"bulk": 0, "interactive": 0}
+    lock = threading.Lock()
+
+    def request(kind: str, session: str):
+        start = time.perf_counter()
+        try:
+            with session_scope(session if mode == "fair" else "shared"):
+                model.invoke(text)
+        except Exception:
+            with lock:
+                failures[kind] += 1
+            return
+        with lock:
+            latencies[kind].append(time.perf_counter() - start)
+
+    def interactive(i: int):
+        time.sleep(args.latency / 2) # Arrive just after the bulk burst is queued
+        for _ in range(args.interactive_requests):
+            request("interactive", f"interactive-{i}")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.bulk_requests + args.sessions) as executor:
+        for _ in range(args.bulk_requests):
+            executor.submit(request, "bulk", "bulk")
+        for i in range(args.sessions):
+            executor.submit(interactive, i)
+    makespan = time.perf_counter() - start
+
+    total = args.bulk_requests + args.sessions * args.interactive_requests
+    result = {
+        "requests": total,
+        "succeeded": total - sum(failures.values()),
+        "failed_bulk": failures["bulk"],
+        "failed_interactive": failures["interactive"],
+        "makespan_s": round(makespan, 3),
+        "bulk_latency": percentiles(latencies["bulk"]),
+        "interactive_latency": percentiles(latencies["interactive"]),
+        "max_concurrent_calls_seen_by_api": fake.max_running,
+    }
+    if client:
+        stats = client.stats.snapshot()
+        result["client"] = {name: round(value, 3) for name, value in stats.items()}
+    return result
+
+
+def run_bulk_generation(args) -> dict:
+    """A bulk question bank through the async path (LLMChain.arun) with 429s injected."""
+    fake = make_fake(args, latency=args.latency / 2)
+    client = make_scheduler(args)
+    start = time.perf_counter()
+    mcqs = generate_mcqs_bulk(TEXT, args.bulk_questions, "Medium", "Biology",
+                              llm_override=scheduled(fake, client), use_cache=False)
+    return {
+        "questions_requested": args.bulk_questions,
+        "questions_generated": len(mcqs),
+        "elapsed_s": round(time.perf_counter() - start, 3),
+        "max_concurrent_calls_seen_by_api": fake.max_running,
+        "client": {name: round(value, 3) for name, value in client.stats.snapshot().items()},
+    }
+
+
+def run_timeout_check(args) -> dict:
+    """A call slower than the timeout is abandoned and retried, then reported as a TimeoutError."""
+    client = make_scheduler(args, timeout=args.latency, max_retries=1)
+    model = scheduled(make_fake(args, latency=args.latency * 5, rate_limit_every=0), client)
+    start = time.perf_counter()
+    try:
+        model.invoke(render_prompt())
+        error = None
+    except Exception as e:
+        error = type(e).__name__
+    return {
+        "error": error,
+        "elapsed_s": round(time.perf_counter() - start, 3),
+        "client": {name: round(value, 3) for name, value in client.stats.snapshot().items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=4, help="Interactive sessions")
+    parser.add_argument("--interactive-requests", type=int, default=3, help="Sequential calls per interactive session")
+    parser.add_argument("--bulk-requests", type=int, default=32, help="Calls fired at once by the bulk session")
+    parser.add_argument("--bulk-questions", type=int, default=100, help="Questions in the bulk generation run")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds the fake takes per call")
+    parser.add_argument("--server-concurrency", type=int, default=4, help="Calls the fake accepts at once")
+    parser.add_argument("--rate-limit-every", type=int, default=10, help="The fake rejects every n-th call")
+    parser.add_argument("--retries", type=int, default=4)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {
+        "benchmark": "llm_client",
+        "latency_s": args.latency,
+        "server_concurrency": args.server_concurrency,
+        "rate_limit_every": args.rate_limit_every,
+        "modes": {mode: run_mode(args, mode) for mode in ("direct", "fifo", "fair")},
+        "bulk_generation": run_bulk_generation(args),
+        "timeout": run_timeout_check(args),
+    }
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# benchmarks/bench_near_duplicates.py
+"""
+Near-duplicate detection over a large question bank.
+
+Times signature computation, building the index, single and batched lookups, saving a
+new set into the full bank (with the near-duplicate check) and reloading the index from
+the stored signatures. Paraphrased copies of stored questions are planted to report recall.
+
+Usage:
+    python benchmarks/bench_near_duplicates.py [--questions 100000] [--queries 1000] [--output results.json]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QUIZGENIUS_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.sqlite3"))
+
+from utils import session_manager
+from utils.near_duplicates import NearDuplicateIndex, find_near_duplicates, minhash_signatures
+from utils.question_store import create_store
+
+SET_SIZE = 20
+
+
+def make_bank(n: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 10)))
+                  for _ in range(30000)]
+    questions = []
+    for i in range(n):
+        options = [" ".join(rng.choice(vocabulary) for _ in range(rng.randint(1, 4))) for _ in range(4)]
+        questions.append({
+            "question": " ".join(rng.choice(vocabulary) for _ in range(rng.randint(8, 16))) + "?",
+            "options": options,
+            "correct_answer": options[0],
+            "difficulty": ["Easy", "Medium", "Hard"][i % 3],
+            "category": "Synthetic",
+        })
+    return questions
+
+
+def paraphrase(q: dict, rng: random.Random) -> dict:
+    """Rewords a question slightly: one word replaced, options shuffled, different case."""
+    words = q["question"].split()
+    words[rng.randrange(len(words))] = "which"
+    options = list(q["options"])
+    rng.shuffle(options)
+    return dict(q, question=" ".join(words).capitalize(), options=options)
+
+
+def timed(action):
+    start = time.perf_counter()
+    result = action()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--questions", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    bank = make_bank(args.questions)
+    planted = rng.sample(range(len(bank)), args.queries)
+    paraphrases = [paraphrase(bank[i], rng) for i in planted]
+    fresh = make_bank(args.queries, seed=99)
+
+    signature_time, signatures = timed(lambda: minhash_signatures(bank))
+    index = NearDuplicateIndex()
+    build_time, _ = timed(lambda: index.add_signatures(list(range(len(bank))), signatures))
+
+    single = []
+    for q in paraphrases[:200]:
+        elapsed, _ = timed(lambda: index.query(q))
+        single.append(elapsed)
+    batch_time, matches = timed(lambda: find_near_duplicates(paraphrases, index))
+    found = sum(1 for i, match in zip(planted, matches) if match is not None and match[0] == i)
+    _, false_matches = timed(lambda: find_near_duplicates(fresh, index))
+
+    sets = {f"Set {i:06d}": bank[start:start + SET_SIZE] for i, start in enumerate(range(0, len(bank), SET_SIZE))}
+    bulk_save_time, _ = timed(lambda: session_manager.save_sets(sets, duplicate_action="off"))
+    session_manager.set_store(create_store())
+    reload_time, _ = timed(session_manager.get_duplicate_index)
+    save_time, duplicates = timed(lambda: session_manager.save_set("New set", paraphrases[:10] + fresh[:10]))
+
+    results = {
+        "benchmark": "near_duplicates",
+        "questions": args.questions,
+        "signatures_s": round(signature_time, 3),
+        "signatures_per_s": round(len(bank) / signature_time),
+        "index_build_s": round(build_time, 3),
+        "single_query_median_ms": round(statistics.median(single) * 1000, 3),
+        "batch_query_ms_per_question": round(batch_time / len(paraphrases) * 1000, 4),
+        "paraphrase_recall": round(found / len(paraphrases), 4),
+        "false_matches": sum(match is not None for match in false_matches),
+        "bulk_save_s": round(bulk_save_time, 3),
+        "index_reload_from_store_s": round(reload_time, 3),
+        "save_set_20_questions_ms": round(save_time * 1000, 3),
+        "save_set_duplicates_flagged": len(duplicates),
+    }
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+# benchmarks/bench_pipeline.py
+"""
+Benchmark suite for every stage of the generation pipeline, with a local fake LLM.
+
+Stages:
+- extraction: text extraction from synthetic PDF, DOCX and TXT files of --pages pages;
+- prompt: prompt rendering and chunking of texts of the same sizes;
+- parsing: parsing and validating model outputs, clean, malformed and canned;
+- export: JSON and PDF export of --export-sizes questions, PDF export of non-latin-1
+  text, and the bulk ZIP export of --variants exam variants with answer keys;
+- end_to_end: generate_mcqs (single-shot, chunked, repaired), generate_mcqs_stream and
+  generate_mcqs_bulk against FakeMCQChatModel with --latency seconds per call.
+
+Every case reports latency percentiles (and throughput where it has a natural unit).
+The JSON output records the git commit, so runs can be compared across commits with
+--compare, which flags cases whose median got slower than --threshold.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--stages extraction export] [--runs 5] [--output results.json]
+    python benchmarks/bench_pipeline.py --compare baseline.json [--fail-on-regression]
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-placeholder")
+os.environ.setdefault("QUIZGENIUS_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "cache.sqlite3"))
+
+from synthetic import make_questions, make_text, write_document
+from utils import ai_generator
+from utils.exam_builder import shuffle_variants
+from utils.exporter import MAX_EXPORT_WORKERS, export_to_json, export_to_pdf, export_variants_zip
+from utils.fake_llm import FakeMCQChatModel
+from utils.file_parser import extract_text_from_docx, extract_text_from_pdf, extract_text_from_txt
+from utils.notify import capture_messages
+
+STAGES = ["extraction", "prompt", "parsing", "export", "end_to_end"]
+EXTRACTORS = {"pdf": extract_text_from_pdf, "docx": extract_text_from_docx, "txt": extract_text_from_txt}
+
+
+def percentile(samples: list, q: float) -> float:
+    """Linear-interpolated percentile of sorted samples (q between 0 and 1)."""
+    position = (len(samples) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(samples) - 1)
+    return samples[low] + (samples[high] - samples[low]) * (position - low)
+
+
+def summarize(samples: list, units: float = None, unit_name: str = None) -> dict:
+    """Latency percentiles in milliseconds, plus `unit_name`/s at the median when units are given."""
+    samples = sorted(samples)
+    result = {"runs": len(samples), "mean_ms": round(sum(samples) / len(samples) * 1000, 3)}
+    for name, q in (("p50", 0.5), ("p90", 0.9), ("p95", 0.95), ("p99", 0.99)):
+        result[f"{name}_ms"] = round(percentile(samples, q) * 1000, 3)
+    result["max_ms"] = round(samples[-1] * 1000, 3)
+    if units:
+        result[f"{unit_name}_per_s"] = round(units / max(percentile(samples, 0.5), 1e-9), 1)
+    return result
+
+
+def measure(action, runs: int, warmup: int = 1) -> list:
+    for _ in range(warmup):
+        action()
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        action()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_extraction(args, workdir: str) -> dict:
+    results = {}
+    for pages in args.pages:
+        for file_format, extract in EXTRACTORS.items():
+            path = write_document(workdir, file_format, pages)
+            megabytes = os.path.getsize(path) / 1e6
+            text = extract(path)
+            case = summarize(measure(lambda: extract(path), args.runs), pages, "pages")
+            case["mb_per_s"] = round(megabytes / (case["p50_ms"] / 1000), 2)
+            case["chars"] = len(text)
+            results[f"{file_format}_{pages}p"] = case
+    return results
+
+
+def bench_prompt(args) -> dict:
+    results = {}
+    for pages in args.pages:
+        text = make_text(pages)
+        variables = dict(text=text, num_questions=10, difficulty="Medium", category="Biology", existing_questions="[]")
+        results[f"render_{pages}p"] = summarize(measure(lambda: ai_generator.prompt.format(**variables), args.runs * 20))
+        chunks = ai_generator.split_text_into_chunks(text)
+        case = summarize(measure(lambda: ai_generator._distribute_questions(
+            10, ai_generator.split_text_into_chunks(text)), args.runs * 5), len(text) / 1e6, "mchars")
+        case["chunks"] = len(chunks)
+        results[f"chunking_{pages}p"] = case
+    return results
+
+
+def parsing_cases(num_questions: int) -> dict:
+    """Raw model outputs: the fake's clean and malformed replies plus canned ones real models produce."""
+    prompt_text = ai_generator.prompt.format(text=make_text(2), num_questions=num_questions, difficulty="Medium",
+                                             category="Biology", existing_questions="[]")
+    clean = FakeMCQChatModel(fenced=False).respond(prompt_text)
+    return {
+        "clean_fenced": FakeMCQChatModel().respond(prompt_text),
+        "clean_unfenced": clean,
+        "invalid_items": FakeMCQChatModel(invalid_every=4).respond(prompt_text),
+        "truncated": FakeMCQChatModel(truncate_at=0.7).respond(prompt_text),
+        "canned_prose_wrapped": f"Here are the questions you asked for:\n{clean}\nLet me know if you need more!",
+        "canned_trailing_commas": clean.replace("}\n", "},\n").replace("]\n", ",]\n"),
+    }
+
+
+def bench_parsing(args) -> dict:
+    results = {}
+    for name, output in parsing_cases(args.parse_questions).items():
+        def parse():
+            try:
+                return ai_generator._validate_mcqs(ai_generator._parse_mcq_output(output))
+            except json.JSONDecodeError:
+                return []
+
+        kept = len(parse())
+        case = summarize(measure(parse, args.runs * 20), kept or None, "questions")
+        case["questions_kept"] = kept
+        case["output_chars"] = len(output)
+        results[name] = case
+    return results
+
+
+def bench_export(args) -> dict:
+    results = {}
+    for size in args.export_sizes:
+        questions = make_questions(size)
+        results[f"json_{size}q"] = summarize(measure(lambda: export_to_json(questions), args.runs), size, "questions")
+        results[f"pdf_{size}q"] = summarize(measure(lambda: export_to_pdf(questions), args.runs), size, "questions")
+    # Text outside latin-1 takes the fallback layout
+    unicode_questions = [dict(q, question=f"{q['question']} \u2014 \u03b1\u03b2\u03b3") for q in make_questions(100)]
+    results["pdf_unicode_100q"] = summarize(measure(lambda: export_to_pdf(unicode_questions), args.runs), 100, "questions")
+    variants = shuffle_variants(make_questions(40), args.variants, seed=0)
+    case = summarize(measure(lambda: export_variants_zip(variants, io.BytesIO()), args.runs), args.variants, "variants")
+    case["workers"] = MAX_EXPORT_WORKERS
+    results[f"variants_zip_{args.variants}x40q"] = case
+    return results
+
+
+def bench_end_to_end(args) -> dict:
+    short_text = make_text(2)
+    long_text = make_text(max(args.pages))
+    fake = lambda **settings: FakeMCQChatModel(latency=args.latency, **settings)
+    results = {}
+
+    def case(name, action, questions):
+        produced = []
+        samples = measure(lambda: produced.append(len(action())), args.e2e_runs, warmup=0)
+        results[name] = summarize(samples, questions, "questions")
+        results[name]["questions_generated_min"] = min(produced)
+
+    case("single_10q", lambda: ai_generator.generate_mcqs(
+        short_text, 10, "Medium", "Biology", llm_override=fake(), use_cache=False, chunked=False), 10)
+    case("repaired_10q", lambda: ai_generator.generate_mcqs(
+        short_text, 10, "Medium", "Biology", llm_override=fake(truncate_at=0.7, invalid_every=5),
+        use_cache=False, chunked=False), 10)
+    case(f"chunked_20q_{max(args.pages)}p", lambda: ai_generator.generate_mcqs(
+        long_text, 20, "Medium", "Biology", llm_override=fake(), use_cache=False, chunked=True), 20)
+    case("bulk_100q", lambda: ai_generator.generate_mcqs_bulk(
+        long_text, 100, "Medium", "Biology", llm_override=fake(), use_cache=False), 100)
+
+    # Streaming: time to the first question matters as much as the total
+    first, total = [], []
+    for _ in range(args.e2e_runs):
+        start = time.perf_counter()
+        stream = ai_generator.generate_mcqs_stream(short_text, 10, "Medium", "Biology",
+                                                   llm_override=fake(), use_cache=False, chunked=False)
+        next(stream)
+        first.append(time.perf_counter() - start)
+        for _ in stream:
+            pass
+        total.append(time.perf_counter() - start)
+    results["stream_10q_first_question"] = summarize(first)
+    results["stream_10q_total"] = summarize(total, 10, "questions")
+    return results
+
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Prints the median change of every case present in both runs and returns the regressions."""
+    regressions = []
+    print(f"Comparing {results['meta']['commit']} with baseline {baseline['meta']['commit']}:", file=sys.stderr)
+    for stage, cases in results["stages"].items():
+        for name, case in cases.items():
+            old = baseline.get("stages", {}).get(stage, {}).get(name)
+            if not old or not old.get("p50_ms"):
+                continue
+            ratio = case["p50_ms"] / old["p50_ms"]
+            flag = ""
+            if ratio > 1 + threshold:
+                flag = "  REGRESSION"
+                regressions.append(f"{stage}/{name}")
+            elif ratio < 1 - threshold:
+                flag = "  faster"
+            print(f"  {stage}/{name}: {old['p50_ms']} -> {case['p50_ms']} ms ({ratio:.2f}x){flag}", file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--stages", nargs="*", default=STAGES, choices=STAGES)
+    parser.add_argument("--runs", type=int, default=5, help="Timed runs per case (more for the fast stages)")
+    parser.add_argument("--e2e-runs", type=int, default=3, help="Timed runs per end-to-end case")
+    parser.add_argument("--pages", type=int, nargs="*", default=[2, 20, 100], help="Synthetic document sizes")
+    parser.add_argument("--export-sizes", type=int, nargs="*", default=[10, 100, 1000])
+    parser.add_argument("--variants", type=int, default=20, help="Exam variants in the bulk ZIP export case")
+    parser.add_argument("--parse-questions", type=int, default=20, help="Questions per parsed model output")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per call of the fake model")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline results JSON to compare the medians with")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Relative slowdown reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on a regression")
+    args = parser.parse_args()
+
+    benches = {
+        "extraction": lambda: bench_extraction(args, workdir),
+        "prompt": lambda: bench_prompt(args),
+        "parsing": lambda: bench_parsing(args),
+        "export": lambda: bench_export(args),
+        "end_to_end": lambda: bench_end_to_end(args),
+    }
+    workdir = tempfile.mkdtemp()
+    results = {
+        "benchmark": "pipeline",
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {name: value for name, value in vars(args).items() if name not in ("output", "compare")},
+        },
+        "stages": {},
+    }
+    warnings = []
+    # Skipped-question warnings are expected for the malformed cases; count them instead of showing them
+    with capture_messages(lambda level, message: warnings.append(level)):
+        for stage in args.stages:
+            print(f"Running {stage}...", file=sys.stderr)
+            results["stages"][stage] = benches[stage]()
+    results["meta"]["messages_captured"] = len(warnings)
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
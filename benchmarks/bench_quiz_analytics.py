@@ -0,0 +1,149 @@
+# benchmarks/bench_quiz_analytics.py
+"""
+Speed of the quiz statistics over a large attempt history.
+
+--attempts simulated quizzes of --length questions, drawn from a bank of --bank
+synthetic questions, are recorded into a fresh history. Each simulated student has an
+ability and each question a difficulty; the chance of a correct answer follows the
+logistic of their difference, wrong answers pick a random distractor, and some
+questions are skipped. The benchmark times recording, loading the answers as columns
+(cold from the database, then incrementally after more attempts), analyze() and the
+difficulty suggestions. The baseline is the straightforward alternative: a Python
+loop over every answer building per-question and per-category tallies in dicts.
+
+Usage:
+    python benchmarks/bench_quiz_analytics.py [--attempts 50000] [--length 20] [--bank 2000] [--output results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import make_questions
+from utils.attempt_history import AttemptHistory
+from utils.quiz_analytics import analyze, suggest_difficulties
+from utils.quiz_engine import UNANSWERED
+
+RECORD_BATCH = 1000
+SKIP_RATE = 0.05
+
+
+def timed(action) -> tuple:
+    start = time.perf_counter()
+    result = action()
+    return time.perf_counter() - start, result
+
+
+def simulate(bank: list, num_attempts: int, length: int, seed: int = 0):
+    """Yields (questions, chosen, seconds, label) attempts with IRT-like answers."""
+    rng = np.random.default_rng(seed)
+    item_difficulty = rng.normal(0, 1.2, len(bank))
+    answer_key = np.array([q["options"].index(q["correct_answer"]) for q in bank])
+    num_options = np.array([len(q["options"]) for q in bank])
+    for _ in range(num_attempts):
+        picks = rng.choice(len(bank), size=length, replace=False)
+        ability = rng.normal()
+        p_correct = 1 / (1 + np.exp(item_difficulty[picks] - ability))
+        correct = rng.random(length) < p_correct
+        # A wrong answer is one of the other options, uniformly
+        wrong = (answer_key[picks] + rng.integers(1, num_options[picks])) % num_options[picks]
+        chosen = np.where(correct, answer_key[picks], wrong)
+        chosen[rng.random(length) < SKIP_RATE] = UNANSWERED
+        seconds = rng.gamma(2.0, 10.0, length)
+        yield [bank[i] for i in picks.tolist()], chosen, seconds, "Simulated"
+
+
+def loop_baseline(columns: dict, catalog: dict) -> tuple:
+    """Per-question p-values and per-category mastery with a Python loop over the answers."""
+    responses = {}
+    correct_counts = {}
+    category_totals = {}
+    for key, is_correct in zip(columns["question"].tolist(), columns["correct"].tolist()):
+        responses[key] = responses.get(key, 0) + 1
+        correct_counts[key] = correct_counts.get(key, 0) + is_correct
+        category = catalog[key]["category"]
+        total, right = category_totals.get(category, (0, 0))
+        category_totals[category] = (total + 1, right + is_correct)
+    p_values = {key: correct_counts[key] / count for key, count in responses.items()}
+    return p_values, {category: right / total for category, (total, right) in category_totals.items()}
+
+
+def record(history: AttemptHistory, attempts) -> int:
+    recorded = 0
+    batch = []
+    for attempt in attempts:
+        batch.append(attempt)
+        if len(batch) == RECORD_BATCH:
+            recorded += history.record_many(batch)
+            batch = []
+    if batch:
+        recorded += history.record_many(batch)
+    return recorded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--attempts", type=int, default=50000, help="Simulated quiz attempts")
+    parser.add_argument("--length", type=int, default=20, help="Questions per attempt")
+    parser.add_argument("--bank", type=int, default=2000, help="Questions the attempts are drawn from")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "history.sqlite3")
+    bank = make_questions(args.bank)
+    extra = max(1, args.attempts // 100)
+
+    print(f"Recording {args.attempts} attempts...", file=sys.stderr)
+    history = AttemptHistory(path)
+    record_seconds, _ = timed(lambda: record(history, simulate(bank, args.attempts, args.length)))
+    answers = args.attempts * args.length
+
+    # A fresh instance reads everything from the database; the next call only the new attempts
+    history = AttemptHistory(path)
+    cold_seconds, columns = timed(history.columns)
+    catalog_seconds, catalog = timed(history.catalog)
+    record(history, simulate(bank, extra, args.length, seed=1))
+    incremental_seconds, columns = timed(history.columns)
+
+    analyze_seconds, stats = timed(lambda: analyze(columns, catalog))
+    suggest_seconds, suggestions = timed(lambda: suggest_difficulties(stats, catalog))
+    baseline_seconds, (p_values, _) = timed(lambda: loop_baseline(columns, catalog))
+    keys = stats["questions"]["key"].tolist()
+    if not np.allclose(stats["questions"]["p_value"], [p_values[key] for key in keys]):
+        raise RuntimeError("analyze() and the baseline disagree on the p-values")
+
+    results = {
+        "benchmark": "quiz_analytics",
+        "attempts": args.attempts + extra,
+        "answers": len(columns["question"]),
+        "questions": len(keys),
+        "database_bytes": os.path.getsize(path),
+        "bytes_per_answer": round(os.path.getsize(path) / len(columns["question"]), 1),
+        "record_s": round(record_seconds, 3),
+        "record_answers_per_s": round(answers / record_seconds),
+        "load_columns_cold_s": round(cold_seconds, 3),
+        "load_catalog_s": round(catalog_seconds, 3),
+        f"load_columns_after_{extra}_more_s": round(incremental_seconds, 4),
+        "analyze_s": round(analyze_seconds, 3),
+        "suggest_s": round(suggest_seconds, 4),
+        "suggestions": len(suggestions),
+        "baseline_loop_s": round(baseline_seconds, 3),
+        "speedup_vs_loop": round(baseline_seconds / analyze_seconds, 1),
+    }
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
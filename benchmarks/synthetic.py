@@ -0,0 +1,100 @@
+# benchmarks/synthetic.py
+"""
+Deterministic synthetic inputs for the benchmarks: course-like text, PDF/DOCX/TXT
+documents of a given number of pages, and question sets.
+"""
+import os
+import random
+
+WORDS_PER_PAGE = 450
+TOPICS = ["Biology", "Chemistry", "Physics", "History", "Geography"]
+_COMMON = ("the of and to in is that for as with by on are this from which energy cell process "
+           "system reaction force period region change structure function example important").split()
+
+
+def _vocabulary(rng: random.Random, size: int = 3000) -> list:
+    return ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 11)))
+            for _ in range(size)]
+
+
+def make_paragraphs(pages: int, seed: int = 1) -> list:
+    """Returns paragraphs totalling about `pages` pages of text."""
+    rng = random.Random(seed)
+    vocabulary = _vocabulary(rng)
+    paragraphs = []
+    words = 0
+    while words < pages * WORDS_PER_PAGE:
+        sentences = []
+        for _ in range(rng.randint(3, 7)):
+            sentence = [rng.choice(_COMMON) if rng.random() < 0.4 else rng.choice(vocabulary)
+                        for _ in range(rng.randint(8, 22))]
+            sentences.append(" ".join(sentence).capitalize() + ".")
+            words += len(sentence)
+        paragraphs.append(" ".join(sentences))
+    return paragraphs
+
+
+def make_text(pages: int, seed: int = 1) -> str:
+    return "\n\n".join(make_paragraphs(pages, seed))
+
+
+def write_txt(path: str, pages: int, seed: int = 1) -> str:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(make_text(pages, seed))
+    return path
+
+
+def write_docx(path: str, pages: int, seed: int = 1) -> str:
+    from docx import Document
+
+    document = Document()
+    for i, paragraph in enumerate(make_paragraphs(pages, seed)):
+        if i % 12 == 0:
+            document.add_heading(f"Section {i // 12 + 1}", level=2)
+        document.add_paragraph(paragraph)
+        if i % 25 == 24: # An occasional table, as lecture notes have
+            table = document.add_table(rows=3, cols=3)
+            for r, row in enumerate(table.rows):
+                for c, cell in enumerate(row.cells):
+                    cell.text = f"Item {r}.{c}"
+    document.save(path)
+    return path
+
+
+def write_pdf(path: str, pages: int, seed: int = 1) -> str:
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    pdf.set_font("Arial", size=10)
+    for paragraph in make_paragraphs(pages, seed):
+        pdf.multi_cell(0, 5, paragraph)
+        pdf.ln(2)
+    pdf.output(path)
+    return path
+
+
+WRITERS = {"txt": write_txt, "docx": write_docx, "pdf": write_pdf}
+
+
+def write_document(directory: str, file_format: str, pages: int, seed: int = 1) -> str:
+    """Writes a synthetic document of about `pages` pages and returns its path."""
+    path = os.path.join(directory, f"synthetic_{pages}p.{file_format}")
+    return WRITERS[file_format](path, pages, seed)
+
+
+def make_questions(n: int, prefix: str = "Question", seed: int = 3) -> list:
+    rng = random.Random(seed)
+    vocabulary = _vocabulary(rng, 2000)
+    questions = []
+    for i in range(n):
+        options = [" ".join(rng.choice(vocabulary) for _ in range(rng.randint(1, 4))) for _ in range(4)]
+        questions.append({
+            "question": f"{prefix} {i}: " + " ".join(rng.choice(vocabulary) for _ in range(rng.randint(8, 16))) + "?",
+            "options": options,
+            "correct_answer": options[i % 4],
+            "difficulty": ["Easy", "Medium", "Hard"][i % 3],
+            "category": TOPICS[i % len(TOPICS)],
+        })
+    return questions
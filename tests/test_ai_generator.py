@@ -0,0 +1,127 @@
+# tests/test_ai_generator.py
+import pytest
+
+from utils import ai_generator
+from utils.ai_generator import (MAX_REPAIR_CALLS, _make_chain, _RepairSession, _top_up_merged, generate_mcqs,
+                                generate_mcqs_chunked, generate_mcqs_stream, get_prompt, repair_stats,
+                                split_text_into_chunks)
+from utils.fake_llm import FakeMCQChatModel
+from utils.mcq_cache import MCQCache
+
+TEXT = "\n\n".join(
+    f"Section {i}. Photosynthesis in {topic} converts light energy into chemical energy stored as glucose. "
+    f"Chlorophyll absorbs {colour} light, and the {process} reactions take place in the chloroplasts."
+    for i, (topic, colour, process) in enumerate([
+        ("plants", "blue", "light-dependent"), ("algae", "red", "light-independent"),
+        ("cyanobacteria", "violet", "Calvin cycle"), ("mosses", "orange", "carbon fixation"),
+        ("ferns", "indigo", "electron transport"), ("grasses", "yellow", "photolysis"),
+    ] * 4)
+)
+
+
+def make_mcq(i: int, **overrides) -> dict:
+    mcq = {"question": f"Question number {i} about photosynthesis topic {i * 7919}?",
+           "options": [f"Answer {i}", f"Wrong {i} a", f"Wrong {i} b", f"Wrong {i} c"],
+           "correct_answer": f"Answer {i}", "category": "Biology", "difficulty": "Easy"}
+    mcq.update(overrides)
+    return mcq
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(ai_generator, "mcq_cache", MCQCache(str(tmp_path / "cache.sqlite3")))
+    repair_stats.reset()
+
+
+def test_repair_session_accepts_only_new_valid_questions():
+    session = _RepairSession(4)
+    accepted = session.add([
+        make_mcq(1),
+        make_mcq(2, correct_answer="Not an option"),
+        make_mcq(1, question="  QUESTION number 1 about photosynthesis topic 7919? "), # Same text, other spacing
+        make_mcq(3, options=["Only", "three", "options"]),
+        make_mcq(4),
+    ])
+
+    assert [mcq["question"] for mcq in accepted] == [make_mcq(1)["question"], make_mcq(4)["question"]]
+    assert session.shortfall == 2
+
+
+def test_repair_session_drops_paraphrases():
+    session = _RepairSession(3)
+    original = make_mcq(1, question="Which organelle of a plant cell carries out photosynthesis using sunlight?")
+    paraphrase = dict(original, question="Which organelle of a plant cell carries out photosynthesis using the sunlight?")
+
+    assert session.add([original, paraphrase]) == [original]
+    assert repair_stats.snapshot()["near_duplicates_dropped"] == 1
+
+
+def test_repair_session_tops_up_only_the_shortfall_a_limited_number_of_times():
+    session = _RepairSession(5)
+    session.add([make_mcq(1), make_mcq(2)])
+
+    requests = []
+    while (count := session.next_topup()):
+        requests.append(count)
+    assert requests == [3] * MAX_REPAIR_CALLS
+
+    session.add([make_mcq(i) for i in range(3, 9)])
+    assert len(session.finish()) == 5
+    assert session.shortfall == 0
+
+
+def test_repair_session_prefill_counts_towards_the_target():
+    session = _RepairSession(3)
+    session.prefill([make_mcq(1), make_mcq(2)])
+
+    assert session.add([make_mcq(1), make_mcq(3), make_mcq(4)]) == [make_mcq(3)]
+    assert session.next_topup() == 0
+
+
+def test_chunked_generation_tops_up_invalid_questions():
+    chain = _make_chain(FakeMCQChatModel(invalid_every=3), get_prompt())
+    errors = []
+    mcqs = generate_mcqs_chunked(TEXT, 12, "Medium", "Biology", chain, max_tokens=400, overlap_tokens=20,
+                                 errors=errors)
+
+    assert len(split_text_into_chunks(TEXT, 400, 20)) > 1
+    assert len(mcqs) == 12
+    assert len({mcq["question"] for mcq in mcqs}) == 12
+    assert all(mcq["correct_answer"] in mcq["options"] for mcq in mcqs)
+    assert errors == []
+    assert repair_stats.snapshot()["topup_calls"] > 0
+
+
+def test_questions_lost_in_the_merge_are_topped_up():
+    chain = _make_chain(FakeMCQChatModel(), get_prompt())
+    chunks = split_text_into_chunks(TEXT, 200, 20)
+    kept = generate_mcqs_chunked(TEXT, 3, "Easy", "Biology", chain, max_tokens=200, overlap_tokens=20)
+
+    mcqs = _top_up_merged(chain, chunks, kept, 7, "Easy", "Biology")
+
+    assert mcqs[:3] == kept
+    assert len(mcqs) == 7
+    assert len({mcq["question"] for mcq in mcqs}) == 7
+
+
+def test_truncated_responses_are_salvaged_and_topped_up(monkeypatch):
+    fake = FakeMCQChatModel(truncate_at=0.8) # Every response is cut off, so its last question is lost
+    with monkeypatch.context() as patch:
+        patch.setattr(ai_generator, "MAX_REPAIR_CALLS", 0)
+        salvaged = generate_mcqs(TEXT, 6, "Hard", "Biology", llm_override=fake, chunked=False, use_cache=False)
+    repaired = generate_mcqs(TEXT, 6, "Hard", "Biology", llm_override=fake, chunked=False, use_cache=False)
+
+    assert 0 < len(salvaged) < len(repaired) <= 6
+    assert repaired[:len(salvaged)] == salvaged
+    assert repair_stats.snapshot()["responses_salvaged"] >= 2
+
+
+def test_streamed_chunked_generation_delivers_every_question_and_caches_it():
+    fake = FakeMCQChatModel(invalid_every=4)
+    streamed = list(generate_mcqs_stream(TEXT, 10, "Medium", "Biology", llm_override=fake, chunked=True))
+
+    assert len(streamed) == 10
+    assert len({mcq["question"] for mcq in streamed}) == 10
+    # A complete result is cached, so the next request does not call the model
+    cached = list(generate_mcqs_stream(TEXT, 10, "Medium", "Biology", llm_override=FakeMCQChatModel(canned_output="")))
+    assert cached == streamed
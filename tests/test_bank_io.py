@@ -0,0 +1,68 @@
+# tests/test_bank_io.py
+import io
+
+import pytest
+
+from utils import session_manager
+from utils.bank_io import _QUESTION, MAGIC, _text, _varint, export_bank, import_bank, read_jsonl, read_qgb
+from utils.question_store import InMemoryQuestionStore
+
+SETS = {
+    "Biology": [
+        {"question": "What do plants release during photosynthesis?", "options": ["Oxygen", "Nitrogen", "Helium", "Argon"],
+         "correct_answer": "Oxygen", "difficulty": "Easy", "category": "Biology", "explanation": "Ça — α"},
+        {"question": "Where is chlorophyll found?", "options": ["Chloroplasts", "Nucleus", "Ribosomes", "Vacuole"],
+         "correct_answer": "Chloroplasts", "difficulty": "Medium", "category": None},
+    ],
+    "Physics": [
+        {"question": "What is the unit of force?", "options": ["Newton", "Joule", "Watt", "Pascal"],
+         "correct_answer": "Newton", "difficulty": "Easy", "category": "Physics"},
+    ],
+}
+
+
+@pytest.fixture
+def bank():
+    previous = session_manager.get_store()
+    session_manager.set_store(InMemoryQuestionStore({name: list(questions) for name, questions in SETS.items()}))
+    yield session_manager.get_store()
+    session_manager.set_store(previous)
+
+
+@pytest.mark.parametrize("file_name", ["bank.jsonl", "bank.jsonl.gz", "bank.qgb", "bank.qgb.gz"])
+def test_round_trip(bank, tmp_path, file_name):
+    path = tmp_path / file_name
+    assert export_bank(str(path)) == 3
+
+    session_manager.set_store(InMemoryQuestionStore())
+    assert import_bank(str(path)) == {"questions": 3, "sets": 2, "skipped": 0}
+    assert session_manager.get_all_sets() == SETS
+
+
+def test_jsonl_record_that_is_not_an_object_is_rejected():
+    source = io.BytesIO(b'{"set": "A", "question": "Q?"}\n[1, 2]\n')
+    with pytest.raises(ValueError, match="Line 2"):
+        list(read_jsonl(source))
+
+
+@pytest.mark.parametrize("payload", [
+    bytes((_QUESTION,)) + _varint(7), # Refers to an interned string that was never defined
+    bytes((_QUESTION, 0, 0, 0)) + _text("Q?") + _varint(2) + _text("A") + _text("B") + _varint(5) + _text(""), # Correct option out of range
+    bytes((_QUESTION, 0, 0, 0, 0x85)), # Varint cut short
+    bytes((_QUESTION, 0, 0, 0)) + _varint(2) + b"\xff\xfe", # Text that is not UTF-8
+])
+def test_damaged_qgb_record_raises_value_error(payload):
+    source = io.BytesIO(MAGIC + _varint(len(payload)) + payload)
+    with pytest.raises(ValueError, match="damaged"):
+        list(read_qgb(source))
+
+
+def test_failed_import_leaves_replaced_sets_untouched(bank, tmp_path):
+    path = tmp_path / "bank.jsonl"
+    export_bank(str(path))
+    lines = path.read_text(encoding="utf-8").splitlines()
+    path.write_text("\n".join(lines[:2] + ["{broken"] + lines[2:]) + "\n", encoding="utf-8")
+
+    with pytest.raises(ValueError, match="Line 3"):
+        import_bank(str(path), batch_size=1)
+    assert session_manager.get_all_sets() == SETS
@@ -0,0 +1,27 @@
+# tests/test_file_parser.py
+import pytest
+
+from utils.file_parser import PageRangeError, parse_page_range
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("", [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]),
+    ("1-3, 5", [0, 1, 2, 4]),
+    ("8-", [7, 8, 9]),
+    ("-2", [0, 1]),
+    ("3, 1-3, 3-3", [0, 1, 2]),
+    ("9-20", [8, 9]), # Pages past the end are ignored
+])
+def test_parse_page_range(spec, expected):
+    assert parse_page_range(spec, 10) == expected
+
+
+@pytest.mark.parametrize("spec, message", [
+    ("5-3", "runs backwards"),
+    ("two", "is not a page number"),
+    ("1, 2-x", "is not a page number"),
+    ("11-20", "selects none"),
+])
+def test_invalid_page_ranges_are_rejected(spec, message):
+    with pytest.raises(PageRangeError, match=message):
+        parse_page_range(spec, 10)
@@ -0,0 +1,52 @@
+# tests/test_json_stream.py
+import json
+
+import pytest
+
+from utils.json_stream import IncrementalJSONArrayParser, salvage_json_objects
+
+ITEMS = [
+    {"question": "Which bracket closes an array: ] or }?", "options": ["]", "}", ")", ">"]},
+    {"question": 'A "quoted" word and an escaped backslash \\', "options": ["{", "[", "\\\"", "x"]},
+    {"question": "Nested", "meta": {"tags": ["a", {"b": [1, 2]}]}},
+]
+TEXT = json.dumps(ITEMS, indent=2)
+
+
+def test_salvages_every_object_of_a_valid_array():
+    assert salvage_json_objects(f"```json\n{TEXT}\n```") == ITEMS
+
+
+@pytest.mark.parametrize("cut", [0.3, 0.6, 0.9, 0.99])
+def test_salvages_the_complete_objects_of_a_truncated_array(cut):
+    truncated = TEXT[:int(len(TEXT) * cut)]
+    # The first k items end where the array of just those items would close
+    complete = max(k for k in range(len(ITEMS) + 1) if len(json.dumps(ITEMS[:k], indent=2)) - 2 <= len(truncated))
+
+    assert salvage_json_objects(truncated) == ITEMS[:complete]
+
+
+def test_skips_broken_objects_and_repairs_trailing_commas():
+    text = '[{"question": "ok", "n": 1}, {"question": broken}, {"question": "comma", "options": ["a", "b",],}, {"q": 3}]'
+    parser = IncrementalJSONArrayParser()
+
+    objects = parser.feed(text)
+
+    assert objects == [{"question": "ok", "n": 1}, {"question": "comma", "options": ["a", "b"]}, {"q": 3}]
+    assert parser.repaired == 1
+    assert parser.errors == ['{"question": broken}']
+    assert parser.finished
+
+
+def test_objects_split_across_fragments_are_decoded_once_complete():
+    for size in (1, 3, 7):
+        parser = IncrementalJSONArrayParser()
+        objects = []
+        for start in range(0, len(TEXT), size):
+            objects.extend(parser.feed(TEXT[start:start + size]))
+        assert objects == ITEMS
+        assert parser.found_array and parser.finished
+
+
+def test_text_without_an_array_yields_nothing():
+    assert salvage_json_objects("I could not generate questions from this text.") == []
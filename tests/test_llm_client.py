@@ -0,0 +1,112 @@
+# tests/test_llm_client.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.fake_llm import FakeMCQChatModel, FakeRateLimitError
+from utils.llm_client import LLMScheduler, scheduled, session_scope
+
+PROMPT = ("Text to generate questions from:\nPhotosynthesis converts light energy into chemical energy.\n"
+          "Number of questions to generate: 2\nDesired Difficulty: Easy\nDesired Category: Biology\n")
+
+
+def make_scheduler(**overrides) -> LLMScheduler:
+    settings = dict(requests_per_minute=0, tokens_per_minute=0, max_concurrent=4, timeout=5,
+                    max_retries=3, backoff_base=0.01, backoff_max=0.05)
+    settings.update(overrides)
+    return LLMScheduler(**settings)
+
+
+def wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for the scheduler")
+        time.sleep(0.005)
+
+
+def test_rate_limited_calls_are_retried_to_success():
+    fake = FakeMCQChatModel(rate_limit_every=2)
+    with pytest.raises(FakeRateLimitError):
+        for _ in range(2):
+            fake.invoke(PROMPT)
+
+    client = make_scheduler()
+    model = scheduled(FakeMCQChatModel(rate_limit_every=2), client)
+    replies = [model.invoke(PROMPT) for _ in range(4)]
+
+    assert all('"question"' in reply.content for reply in replies)
+    stats = client.stats.snapshot()
+    assert stats["rate_limited"] >= 2
+    assert stats["retries"] == stats["rate_limited"]
+    assert stats["failures"] == 0
+
+
+def test_concurrency_never_exceeds_the_limit():
+    fake = FakeMCQChatModel(latency=0.05, max_concurrent=2) # Answers 429 beyond 2 calls at once
+    client = make_scheduler(max_concurrent=2, max_retries=0)
+    model = scheduled(fake, client)
+
+    with ThreadPoolExecutor(max_workers=12) as executor:
+        replies = list(executor.map(lambda _: model.invoke(PROMPT), range(12)))
+
+    assert len(replies) == 12
+    assert fake.max_running == 2
+    assert client.stats.snapshot()["rate_limited"] == 0
+
+
+def test_call_slower_than_the_timeout_raises_timeout_error():
+    client = make_scheduler(timeout=0.05, max_retries=1)
+    model = scheduled(FakeMCQChatModel(latency=0.5), client)
+
+    started = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        model.invoke(PROMPT)
+
+    assert time.perf_counter() - started < 0.5 # Abandoned, not waited out
+    stats = client.stats.snapshot()
+    assert stats["timeouts"] == 2 # The first attempt and its retry
+    assert stats["failures"] == 1
+
+
+def test_fair_mode_interleaves_sessions():
+    client = make_scheduler(max_concurrent=1)
+    release = threading.Event()
+    order = []
+
+    def queue_call(session: str, name: str):
+        def call():
+            order.append(name)
+        with session_scope(session):
+            client.call(call)
+
+    def queued() -> int:
+        return sum(client.slots.snapshot()["queued"].values())
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        # Hold the only slot so every following call queues up, in a known order
+        executor.submit(lambda: client.call(release.wait, session="blocker"))
+        wait_until(lambda: client.slots.snapshot()["running"] == 1)
+        calls = [("bulk", f"bulk-{i}") for i in range(4)] + [("interactive", f"interactive-{i}") for i in range(2)]
+        for n, (session, name) in enumerate(calls, start=1):
+            executor.submit(queue_call, session, name)
+            wait_until(lambda: queued() == n)
+        release.set()
+
+    assert order == ["bulk-0", "interactive-0", "bulk-1", "interactive-1", "bulk-2", "bulk-3"]
+
+
+def test_timed_out_calls_keep_their_slot_until_they_finish():
+    fake = FakeMCQChatModel(latency=0.3, stream_chunk_size=100000) # One streamed chunk, after the whole latency
+    client = make_scheduler(max_concurrent=1, timeout=0.05, max_retries=2)
+    model = scheduled(fake, client)
+
+    with pytest.raises(TimeoutError):
+        model.invoke(PROMPT)
+    with pytest.raises(TimeoutError):
+        list(model.stream(PROMPT))
+
+    wait_until(lambda: client.slots.snapshot()["running"] == 0)
+    assert fake.max_running <= 1
@@ -0,0 +1,67 @@
+# tests/test_near_duplicates.py
+import hashlib
+
+from utils.near_duplicates import NearDuplicateIndex, find_near_duplicates, minhash_signatures
+
+TOPICS = ["mitochondria", "photosynthesis", "osmosis", "enzymes", "ribosomes", "meiosis", "glycolysis", "diffusion"]
+
+
+def make_question(i: int) -> dict:
+    """A distinct question per i: every question has its own words, not just its own number."""
+    words = [f"{TOPICS[(i + k) % len(TOPICS)]} {hashlib.sha1(f'{i}-{k}'.encode()).hexdigest()[:6]}" for k in range(6)]
+    return {"question": f"How does {' '.join(words)} affect the cell?",
+            "options": [f"{word} option" for word in words[:4]], "correct_answer": f"{words[0]} option"}
+
+
+def paraphrase(q: dict) -> dict:
+    return dict(q, question=q["question"].replace("affect the cell", "affect a cell"), options=q["options"][::-1])
+
+
+def test_finds_paraphrases_but_not_different_questions():
+    index = NearDuplicateIndex()
+    index.add_many([(i, make_question(i)) for i in range(50)])
+
+    matches = index.query(paraphrase(make_question(7)))
+    assert matches and matches[0][0] == 7 and matches[0][1] >= index.threshold
+    assert index.query(make_question(500)) == []
+
+
+def test_removed_and_replaced_questions_are_no_longer_matched():
+    index = NearDuplicateIndex()
+    index.add_many([(i, make_question(i)) for i in range(10)])
+
+    index.remove(3)
+    index.add(4, make_question(400)) # Same key, new question
+    assert 3 not in index and len(index) == 9
+    assert index.query(make_question(3)) == []
+    assert index.query(make_question(4)) == []
+    assert index.query(make_question(400))[0][0] == 4
+
+
+def test_matches_survive_reindexing_and_compaction():
+    index = NearDuplicateIndex()
+    questions = [make_question(i) for i in range(3000)]
+    # Added in batches, so rows end up both in the sorted index and in the unsorted tail
+    for start in range(0, len(questions), 500):
+        index.add_signatures(list(range(start, start + 500)), minhash_signatures(questions[start:start + 500]))
+    for key in range(0, 2500):
+        index.remove(key) # Enough removals to compact the arrays
+
+    probes = minhash_signatures([paraphrase(questions[i]) for i in (10, 2600, 2999)])
+    best = index.query_signatures(probes)
+    assert best[0] is None
+    assert [match[0] for match in best[1:]] == [2600, 2999]
+    assert len(index) == 500
+
+
+def test_find_near_duplicates_checks_the_index_and_the_batch_itself():
+    index = NearDuplicateIndex()
+    index.add_many([("stored", make_question(1))])
+    batch = [make_question(2), paraphrase(make_question(1)), paraphrase(make_question(2)), make_question(3)]
+
+    matches = find_near_duplicates(batch, index, keys=["a", "b", "c", "d"])
+
+    assert matches[0] is None and matches[3] is None
+    assert matches[1][0] == "stored"
+    assert matches[2][0] == "a"
+    assert len(index) == 1 # The index is not modified
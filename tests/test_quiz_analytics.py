@@ -0,0 +1,77 @@
+# tests/test_quiz_analytics.py
+import numpy as np
+import pytest
+
+from utils.attempt_history import AttemptHistory, question_key
+from utils.quiz_analytics import analyze, question_rows, suggest_difficulties
+from utils.quiz_engine import UNANSWERED
+
+EASY = {"question": "What gas do plants absorb?", "options": ["Oxygen", "Carbon dioxide", "Helium", "Neon"],
+        "correct_answer": "Carbon dioxide", "category": "Biology", "difficulty": "Hard"}
+HARD = {"question": "What is the SI unit of inductance?", "options": ["Henry", "Tesla", "Weber", "Farad"],
+        "correct_answer": "Henry", "category": "Physics", "difficulty": "Hard"}
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = AttemptHistory(str(tmp_path / "history.sqlite3"))
+    # 10 attempts: everyone gets EASY right; only the two best students get HARD right,
+    # the others pick "Tesla" or skip it
+    attempts = []
+    for student in range(10):
+        hard_choice = 0 if student >= 8 else (1 if student % 2 else UNANSWERED)
+        attempts.append(([EASY, HARD], [1, hard_choice], [5.0, 20.0 + student], "Test"))
+    history.record_many(attempts)
+    return history
+
+
+def test_item_statistics(history):
+    stats = analyze(history.columns(), history.catalog())
+    questions = stats["questions"]
+    row = {key: i for i, key in enumerate(questions["key"].tolist())}
+    easy, hard = row[question_key(EASY)], row[question_key(HARD)]
+
+    assert stats["attempts"] == 10 and stats["answers"] == 20
+    assert questions["responses"].tolist() == [10, 10]
+    assert questions["p_value"][easy] == 1.0
+    assert questions["p_value"][hard] == pytest.approx(0.2)
+    assert questions["unanswered_rate"][hard] == pytest.approx(0.4)
+    assert questions["mean_seconds"][hard] == pytest.approx(24.5)
+    # The top group (3 of the 10 attempts) includes both right answers to HARD, the bottom group none
+    assert questions["discrimination"][hard] == pytest.approx(2 / 3)
+    assert questions["discrimination"][easy] == 0.0
+    # Choice rates follow the canonical (sorted) option order: Farad, Henry, Tesla, Weber
+    assert np.allclose(questions["distractor_rates"][hard], [0.0, 0.2, 0.4, 0.0])
+    assert {row["category"]: row["mastery"] for row in stats["categories"]} == {"Biology": 1.0, "Physics": 0.2}
+
+
+def test_difficulties_are_only_suggested_when_they_changed(history):
+    catalog = history.catalog()
+    stats = analyze(history.columns(), catalog)
+
+    assert suggest_difficulties(stats, catalog, min_responses=11) == []
+    suggestions = suggest_difficulties(stats, catalog, min_responses=10)
+    assert [(row["question"], row["current"], row["suggested"]) for row in suggestions] == [
+        (EASY["question"], "Hard", "Easy")
+    ]
+
+    history.set_difficulties({row["key"]: row["suggested"] for row in suggestions})
+    catalog = history.catalog()
+    assert suggest_difficulties(analyze(history.columns(), catalog), catalog, min_responses=10) == []
+
+
+def test_new_attempts_are_added_to_the_loaded_columns(history):
+    before = history.columns()
+    history.record([HARD], [0], [3.0])
+
+    after = history.columns()
+    assert len(after["attempt_ids"]) == len(before["attempt_ids"]) + 1
+    assert len(after["question"]) == len(before["question"]) + 1
+    assert after["correct"][-1]
+
+
+def test_question_rows_mark_the_correct_option(history):
+    catalog = history.catalog()
+    rows = {row["Question"]: row for row in question_rows(analyze(history.columns(), catalog), catalog)}
+
+    assert rows[HARD["question"]]["Choices"] == "Farad: 0% | ✓ Henry: 20% | Tesla: 40% | Weber: 0%"
@@ -1,23 +1,32 @@
 # utils/ai_generator.py
 import os
 import json
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from dotenv import load_dotenv
 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import PromptTemplate
-from langchain.chains import LLMChain
-import streamlit as st # For st.error and st.warning
+from utils.json_stream import IncrementalJSONArrayParser, salvage_json_objects
+from utils.llm_client import current_session, scheduled, session_scope
+from utils import notify
+from utils.mcq_cache import mcq_cache, make_cache_key
+from utils.metrics import metrics
+from utils.near_duplicates import NEAR_DUPLICATE_THRESHOLD, NearDuplicateIndex, find_near_duplicates, minhash_signatures
+from utils.passage_selector import select_passages
 
 # Load the Gemini key from .env file
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-# Initialize Gemini LLM
-llm = ChatGoogleGenerativeAI(
-    model="gemini-1.5-flash", # Using gemini-1.5-flash for efficiency
-    google_api_key=GEMINI_API_KEY,
-    temperature=0.2 # Slightly increased temperature for more varied questions
-)
+MODEL_NAME = "gemini-1.5-flash" # Using gemini-1.5-flash for efficiency
+
+# The Gemini model, prompts and chain are built on first use (see get_llm), so importing
+# this module does not load langchain; pages that never generate start faster.
+_lazy_objects = {}
+_lazy_lock = threading.RLock()
 
 # Prompt template for MCQ generation
 template = """
@@ -50,73 +59,933 @@ Text to generate questions from:
 Number of questions to generate: {num_questions}
 Desired Difficulty: {difficulty}
 Desired Category: {category} (If 'None' or empty, infer a relevant category from the text.)
+Questions already generated (do not repeat them): {existing_questions}
 """
+# existing_questions is "[]" except for shortfall top-ups, which list the questions already accepted
+
+PROMPT_VARIABLES = ["text", "num_questions", "difficulty", "category", "existing_questions"]
+
+
+def _get_or_build(name: str, build):
+    """Returns a process-wide object, building it on first use (once, even with concurrent callers)."""
+    obj = _lazy_objects.get(name)
+    if obj is None:
+        with _lazy_lock:
+            obj = _lazy_objects.get(name)
+            if obj is None:
+                obj = _lazy_objects[name] = build()
+    return obj
+
+
+def _build_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    # Every call goes through the process-wide scheduler in utils.llm_client
+    # (rate limits, fair queuing, timeouts and retries)
+    return scheduled(ChatGoogleGenerativeAI(
+        model=MODEL_NAME,
+        google_api_key=GEMINI_API_KEY,
+        temperature=0.2, # Slightly increased temperature for more varied questions
+        max_retries=1 # A single attempt; the scheduler does the retrying
+    ))
+
+
+def _make_prompt(template_text: str, input_variables: list):
+    from langchain_core.prompts import PromptTemplate
+
+    return PromptTemplate(input_variables=input_variables, template=template_text)
+
+
+def _make_chain(model, prompt_to_use):
+    from langchain.chains import LLMChain
+
+    return LLMChain(llm=model, prompt=prompt_to_use)
+
+
+def get_llm():
+    """Returns the Gemini chat model, created on first use and shared by the whole process."""
+    return _get_or_build("llm", _build_llm)
+
+
+def get_prompt():
+    """Returns the MCQ generation PromptTemplate."""
+    return _get_or_build("prompt", lambda: _make_prompt(template, PROMPT_VARIABLES))
+
+
+def get_chain():
+    """Returns the LLMChain of the Gemini model and the MCQ prompt."""
+    return _get_or_build("chain", lambda: _make_chain(get_llm(), get_prompt()))
+
+# --- Chunked generation settings ---
+# Texts estimated above CHUNK_TOKEN_LIMIT tokens are split into overlapping chunks,
+# the requested questions are spread across them, and the chunk calls run concurrently.
+CHARS_PER_TOKEN = 4 # Rough average for English text; avoids a tokenizer dependency
+CHUNK_TOKEN_LIMIT = 6000
+CHUNK_OVERLAP_TOKENS = 200
+MAX_CONCURRENT_CHUNKS = 4
+
+# --- Bulk generation settings ---
+# Requests above BULK_THRESHOLD questions are fanned out into batches of BULK_BATCH_SIZE,
+# each with its own focus hint, running at most MAX_CONCURRENT_BATCHES at a time.
+# Batches keep being issued until the target is met or BULK_CALL_FACTOR times the
+# initial number of batches has been spent.
+BULK_THRESHOLD = 20
+BULK_BATCH_SIZE = 10
+MAX_CONCURRENT_BATCHES = 4
+BULK_CALL_FACTOR = 2
+BULK_EXISTING_LIMIT = 60 # Most recent questions of a section listed in a batch prompt
+STOP_POLL_INTERVAL = 0.25 # Seconds between checks of a bulk run's should_stop callback
+FOCUS_HINTS = [
+    "key definitions and terminology",
+    "causes and effects",
+    "processes, steps and sequences",
+    "comparisons and contrasts",
+    "applications and worked examples",
+    "important facts, figures and dates",
+    "common misconceptions",
+    "reasoning about implications",
+]
+
+# --- Repair settings ---
+# When a response is short of valid questions, only the shortfall is requested again,
+# at most MAX_REPAIR_CALLS times per call unit (a whole text or a single chunk).
+MAX_REPAIR_CALLS = 2
+
+
+def estimate_tokens(text: str) -> int:
+    """Returns a cheap approximation of the number of tokens in a text."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def split_text_into_chunks(text: str, max_tokens: int = CHUNK_TOKEN_LIMIT,
+                           overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> list:
+    """
+    Splits a text into token-bounded chunks that overlap by roughly `overlap_tokens`.
+
+    Chunk ends are moved back to the nearest paragraph, sentence or word boundary
+    when one is available, so questions are not built around cut-off sentences.
+
+    Args:
+        text (str): The text to split.
+        max_tokens (int): Upper bound on the (estimated) tokens per chunk.
+        overlap_tokens (int): How many tokens each chunk repeats from the previous one.
+
+    Returns:
+        list: The chunks, in document order.
+    """
+    max_chars = max(1, max_tokens * CHARS_PER_TOKEN)
+    overlap_chars = min(max(0, overlap_tokens * CHARS_PER_TOKEN), max_chars // 2)
+
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            # Prefer to break on a boundary in the last quarter of the window
+            floor = start + (max_chars * 3) // 4
+            for separator in ("\n\n", ". ", "\n", " "):
+                cut = text.rfind(separator, floor, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap_chars, start + 1)
+    return chunks
+
+
+def _distribute_questions(num_questions: int, chunks: list) -> list:
+    """
+    Spreads the requested number of questions across chunks.
+
+    Questions are allocated in proportion to chunk length (largest remainder). When
+    there are fewer questions than chunks, evenly spaced chunks get one question each
+    so the whole document is still covered.
+    """
+    if not chunks or num_questions <= 0:
+        return [0] * len(chunks)
+
+    if num_questions < len(chunks):
+        allocation = [0] * len(chunks)
+        step = len(chunks) / num_questions
+        for i in range(num_questions):
+            allocation[int((i + 0.5) * step)] = 1
+        return allocation
+
+    total_chars = sum(len(c) for c in chunks)
+    shares = [num_questions * len(c) / total_chars for c in chunks]
+    allocation = [max(1, int(share)) for share in shares]
+    # Hand out (or take back) the remainder by largest fractional part
+    by_remainder = sorted(range(len(chunks)), key=lambda i: shares[i] - int(shares[i]), reverse=True)
+    i = 0
+    while sum(allocation) < num_questions:
+        allocation[by_remainder[i % len(chunks)]] += 1
+        i += 1
+    for idx in reversed(by_remainder):
+        if sum(allocation) <= num_questions:
+            break
+        if allocation[idx] > 1:
+            allocation[idx] -= 1
+    return allocation
+
+
+class RepairStats:
+    """Process-wide counters describing what salvage parsing and shortfall top-ups saved."""
+
+    FIELDS = (
+        "responses_salvaged",  # Malformed responses that still yielded questions
+        "items_salvaged",  # Questions recovered from malformed responses
+        "elements_repaired",  # Streamed elements decoded after fixing small defects
+        "elements_dropped",  # Streamed elements that could not be decoded
+        "topup_calls",  # Extra calls made to request only the shortfall
+        "topup_questions",  # Questions requested by those calls
+        "full_retries_avoided",  # Requests completed by repair instead of a full regeneration
+        "output_tokens_saved",  # Estimated output tokens not regenerated thanks to repair
+        "near_duplicates_dropped",  # Generated questions dropped as paraphrases of accepted ones
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def record(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                self._counts[name] += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self):
+        with self._lock:
+            self._counts = dict.fromkeys(self.FIELDS, 0)
 
-prompt = PromptTemplate(
-    input_variables=["text", "num_questions", "difficulty", "category"],
-    template=template
-)
 
-# LLM Chain
-chain = LLMChain(llm=llm, prompt=prompt)
+repair_stats = RepairStats()
+metrics.register_source("repair", repair_stats.snapshot)
+
+
+def _record_tokens(mode: str, prompt_to_use, variables: dict, output: str):
+    """Records the estimated prompt and response tokens of one model call."""
+    prompt_chars = len(prompt_to_use.template) + sum(len(str(value)) for value in variables.values())
+    metrics.observe("llm_call_tokens", prompt_chars // CHARS_PER_TOKEN, direction="input", mode=mode)
+    metrics.observe("llm_call_tokens", estimate_tokens(output), direction="output", mode=mode)
+
+
+def _metered_call(chain_to_use, mode: str, **variables) -> str:
+    """Runs one chain call under the model_call timer and records its token counts."""
+    with metrics.timer("model_call", mode=mode):
+        output = chain_to_use.run(**variables)
+    _record_tokens(mode, chain_to_use.prompt, variables, output)
+    return output
+
+
+async def _ametered_call(chain_to_use, mode: str, **variables) -> str:
+    """Async version of _metered_call."""
+    with metrics.timer("model_call", mode=mode):
+        output = await chain_to_use.arun(**variables)
+    _record_tokens(mode, chain_to_use.prompt, variables, output)
+    return output
+
+
+def _parse_mcq_output(output: str) -> list:
+    """
+    Strips Markdown code fences from the raw model output and decodes the JSON array.
+
+    Malformed or truncated output is salvaged object by object; the decode error is
+    only raised when nothing at all can be recovered.
+    """
+    with metrics.timer("parse"):
+        # --- FIX: Remove Markdown code block fences ---
+        if output.strip().startswith("```json") and output.strip().endswith("```"):
+            output = output.strip()[len("```json"):].strip()[:-len("```")].strip()
+        # --- END FIX ---
+        try:
+            mcqs = json.loads(output)
+            return mcqs if isinstance(mcqs, list) else [mcqs]
+        except json.JSONDecodeError:
+            salvaged = salvage_json_objects(output)
+            if not salvaged:
+                raise
+            repair_stats.record(responses_salvaged=1, items_salvaged=len(salvaged))
+            metrics.observe("salvaged_objects", len(salvaged))
+            return salvaged
+
+
+def _validate_mcq(mcq) -> bool:
+    """Checks a single MCQ against the expected schema, warning about the reason it fails."""
+    # Check for required keys and correct types
+    if isinstance(mcq, dict) \
+       and all(k in mcq and isinstance(mcq[k], str) for k in ["question", "correct_answer", "category", "difficulty"]) \
+       and "options" in mcq and isinstance(mcq["options"], list) and len(mcq["options"]) == 4:
+
+        if mcq["correct_answer"] in mcq["options"]:
+            return True
+        notify.warning(f"AI generated an MCQ with correct answer not in options. Skipping: {mcq.get('question', 'N/A')}")
+    else:
+        notify.warning(f"AI generated an invalid MCQ format. Skipping: {mcq}")
+    return False
+
+
+def _validate_mcqs(mcqs: list) -> list:
+    """Keeps only the MCQs that match the expected schema."""
+    return [mcq for mcq in mcqs if _validate_mcq(mcq)]
+
+
+def _question_key(mcq: dict) -> str:
+    """Normalized question text used to spot repeated questions."""
+    return " ".join(mcq["question"].lower().split())
+
+
+class _RepairSession:
+    """
+    Collects the unique, valid MCQs for one call unit and works out the shortfall.
+    Exact repeats and near-duplicates (paraphrases) of accepted questions are dropped,
+    so they count towards the shortfall.
+
+    Instead of discarding a response that is malformed or short of valid questions,
+    the caller asks `next_topup()` how many questions are still missing and requests
+    only those, so the user gets the full count with the fewest extra tokens.
+    """
+
+    def __init__(self, num_questions: int, seen_questions: set = None):
+        self.num_questions = num_questions
+        self.mcqs = []
+        self.seen_questions = seen_questions if seen_questions is not None else set()
+        self.similar_questions = NearDuplicateIndex(NEAR_DUPLICATE_THRESHOLD)
+        self.topups = 0
+        self.topup_questions = 0
+        self._first_shortfall = None
+
+    @property
+    def shortfall(self) -> int:
+        return max(0, self.num_questions - len(self.mcqs))
+
+    def add(self, candidates) -> list:
+        """Validates and de-duplicates candidate objects, returning the ones accepted."""
+        accepted = []
+        for mcq in candidates:
+            if not self.shortfall:
+                break
+            if not _validate_mcq(mcq):
+                outcome = "invalid"
+            elif _question_key(mcq) in self.seen_questions:
+                outcome = "duplicate"
+            elif self._is_near_duplicate(mcq):
+                outcome = "near_duplicate"
+            else:
+                outcome = "accepted"
+                self.seen_questions.add(_question_key(mcq))
+                self.mcqs.append(mcq)
+                accepted.append(mcq)
+            metrics.count("questions_total", outcome=outcome)
+        return accepted
+
+    def prefill(self, mcqs: list):
+        """Takes MCQs that were already validated and de-duplicated (e.g. merged chunk results)."""
+        self.seen_questions.update(_question_key(mcq) for mcq in mcqs)
+        if mcqs:
+            self.similar_questions.add_signatures(range(len(self.mcqs), len(self.mcqs) + len(mcqs)),
+                                                  minhash_signatures(mcqs))
+        self.mcqs.extend(mcqs)
+
+    def _is_near_duplicate(self, mcq: dict) -> bool:
+        """Checks a candidate against the accepted questions, indexing it if it is new."""
+        signature = minhash_signatures([mcq])
+        if self.similar_questions.query_signatures(signature)[0] is not None:
+            repair_stats.record(near_duplicates_dropped=1)
+            return True
+        self.similar_questions.add_signatures([len(self.mcqs)], signature)
+        return False
+
+    def existing_questions(self) -> str:
+        """JSON list of the accepted question texts, so top-ups ask for new questions."""
+        return json.dumps([mcq["question"] for mcq in self.mcqs])
+
+    def end_response(self):
+        """Marks the end of a model response; the first one sets the baseline for the stats."""
+        if self._first_shortfall is None:
+            self._first_shortfall = self.shortfall
+
+    def next_topup(self) -> int:
+        """Returns how many questions to request next, or 0 when no top-up should be made."""
+        self.end_response()
+        if not self.shortfall or self.topups >= MAX_REPAIR_CALLS:
+            return 0
+        self.topups += 1
+        self.topup_questions += self.shortfall
+        return self.shortfall
+
+    def finish(self) -> list:
+        """Records what the repair saved and returns the collected MCQs."""
+        self.end_response()
+        if self.topups:
+            kept_before_topup = self.num_questions - self._first_shortfall
+            tokens_per_question = estimate_tokens(json.dumps(self.mcqs)) / max(1, len(self.mcqs))
+            repair_stats.record(
+                topup_calls=self.topups,
+                topup_questions=self.topup_questions,
+                full_retries_avoided=0 if self.shortfall else 1,
+                output_tokens_saved=int(kept_before_topup * tokens_per_question),
+            )
+        return self.mcqs
+
+
+async def _agenerate_chunk(chain_to_use, semaphore, chunk: str, num_questions: int,
+                           difficulty: str, category: str) -> list:
+    """
+    Generates and validates the MCQs for a single chunk, waiting for a concurrency slot.
+    A short or malformed response is topped up with a request for just the shortfall.
+    """
+    session = _RepairSession(num_questions)
+    request_count = num_questions
+    while request_count:
+        async with semaphore:
+            output = await _ametered_call(
+                chain_to_use, "chunk",
+                text=chunk,
+                num_questions=request_count,
+                difficulty=difficulty,
+                category=category,
+                existing_questions=session.existing_questions()
+            )
+        try:
+            session.add(_parse_mcq_output(output))
+        except json.JSONDecodeError:
+            if not session.topups:
+                raise # Nothing usable from the first response: report it like before
+        request_count = session.next_topup()
+    return session.finish()
+
+
+async def _agenerate_chunked(chain_to_use, chunks: list, allocation: list, difficulty: str,
+                             category: str, max_concurrency: int) -> list:
+    """Runs the per-chunk calls concurrently and returns one result (or exception) per call."""
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    tasks = [
+        _agenerate_chunk(chain_to_use, semaphore, chunk, count, difficulty, category)
+        for chunk, count in zip(chunks, allocation) if count > 0
+    ]
+    return await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _merge_chunk_results(results: list, num_questions: int) -> list:
+    """Concatenates per-chunk MCQs in document order, dropping repeats caused by chunk overlap."""
+    merged = []
+    for result in results:
+        if isinstance(result, Exception):
+            if isinstance(result, json.JSONDecodeError):
+                notify.warning(f"Skipping a document section: the AI response was not valid JSON ({result}).")
+            else:
+                notify.warning(f"Skipping a document section after an error: {result}")
+            print(f"Chunk generation failed: {result}") # For developer debugging
+            continue
+        merged.extend(result)
+    # Overlapping chunks can yield the same question in different words
+    matches = find_near_duplicates(merged)
+    dropped = sum(match is not None for match in matches)
+    if dropped:
+        repair_stats.record(near_duplicates_dropped=dropped)
+    return [mcq for mcq, match in zip(merged, matches) if match is None][:num_questions]
+
+
+def generate_mcqs_chunked(text: str, num_questions: int, difficulty: str, category: str,
+                          chain_to_use=None, max_tokens: int = CHUNK_TOKEN_LIMIT,
+                          overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                          max_concurrency: int = MAX_CONCURRENT_CHUNKS, errors: list = None) -> list:
+    """
+    Generates MCQs from a long text with a concurrent map-reduce over its chunks.
+
+    The text is split into overlapping, token-bounded chunks, the questions are spread
+    across them, at most `max_concurrency` chunk calls run at once, and the validated
+    results are merged in document order. A failing chunk only loses its own questions,
+    and its exception is appended to `errors` if a list is given.
+
+    Returns:
+        list: A list of dictionaries, each representing an MCQ.
+    """
+    chain_to_use = chain_to_use or get_chain()
+    chunks = split_text_into_chunks(text, max_tokens, overlap_tokens)
+    allocation = _distribute_questions(num_questions, chunks)
+    results = asyncio.run(
+        _agenerate_chunked(chain_to_use, chunks, allocation, difficulty, category, max_concurrency)
+    )
+    if errors is not None:
+        errors.extend(result for result in results if isinstance(result, Exception))
+    mcqs = _merge_chunk_results(results, num_questions)
+    return _top_up_merged(chain_to_use, chunks, mcqs, num_questions, difficulty, category)
+
+
+def _top_up_merged(chain_to_use, chunks: list, mcqs: list, num_questions: int, difficulty: str,
+                   category: str) -> list:
+    """
+    Requests the questions lost in the merge (failed chunks, near-duplicates across
+    chunks), one chunk at a time and asking for questions unlike those already kept.
+    """
+    session = _RepairSession(num_questions)
+    session.prefill(mcqs)
+    request_count = session.next_topup()
+    while request_count:
+        chunk = chunks[(session.topups - 1) % len(chunks)]
+        try:
+            output = _metered_call(
+                chain_to_use, "chunk",
+                text=chunk,
+                num_questions=request_count,
+                difficulty=difficulty,
+                category=category,
+                existing_questions=session.existing_questions()
+            )
+            session.add(_parse_mcq_output(output))
+        except json.JSONDecodeError as e:
+            print(f"Chunk top-up returned invalid JSON: {e}") # For developer debugging
+        except Exception as e:
+            print(f"Chunk top-up failed: {e}") # For developer debugging
+            break
+        request_count = session.next_topup()
+    mcqs = session.finish()
+    if len(mcqs) < num_questions:
+        notify.warning(f"Generated {len(mcqs)} of {num_questions} questions: the rest were repeats or "
+                       "came from document sections that failed.")
+    return mcqs
+
+
+def _fit_to_budget(text: str, token_budget: int, category: str) -> str:
+    """Optional pre-stage: keeps only the highest-value passages that fit the prompt budget."""
+    if not token_budget or estimate_tokens(text) <= token_budget:
+        return text
+    selected_text, report = select_passages(text, token_budget, focus=category or "")
+    metrics.observe("passage_kept_fraction", report["kept_fraction"])
+    return selected_text
+
+
+def _cache_key(text: str, num_questions: int, difficulty: str, category_for_prompt: str, llm_override=None,
+               prompt_template: str = template) -> str:
+    """Cache key for a generation request, including the prompt template and the model in use."""
+    if llm_override is None:
+        model_name = MODEL_NAME
+    else:
+        model_name = getattr(llm_override, "model", None) or llm_override._llm_type
+    return make_cache_key(text, num_questions, difficulty, category_for_prompt, prompt_template, model_name)
+
 
 # Function to call Gemini and get MCQs - RENAMED TO generate_mcqs
-def generate_mcqs(text: str, num_questions: int, difficulty: str, category: str) -> list:
+def generate_mcqs(text: str, num_questions: int, difficulty: str, category: str,
+                  llm_override=None, chunked: bool = None, use_cache: bool = True,
+                  token_budget: int = None) -> list:
     """
     Generates MCQs from a given text using the AI model.
 
+    Results are cached on disk, keyed on the normalized text, the parameters, the
+    prompt template and the model name, so regenerating unchanged input is free.
+
     Args:
         text (str): The input text to generate questions from.
         num_questions (int): The number of questions to generate.
         difficulty (str): The desired difficulty level (Easy, Medium, Hard).
         category (str): The desired category.
+        llm_override: Optional chat model to use instead of Gemini (e.g. utils.fake_llm.FakeMCQChatModel).
+            It is called directly; wrap it with utils.llm_client.scheduled to share Gemini's limits.
+        chunked (bool): Force (True) or disable (False) chunked generation. By default it is
+            used when the text is estimated to exceed CHUNK_TOKEN_LIMIT tokens.
+        use_cache (bool): Set to False to skip the cache lookup and get fresh questions.
+            The fresh result still replaces the cached one.
+        token_budget (int): If set, only the most relevant passages that fit in this many
+            tokens are sent to the model (see utils.passage_selector.select_passages).
 
     Returns:
         list: A list of dictionaries, each representing an MCQ.
     """
-    if not GEMINI_API_KEY:
-        st.error("Gemini API Key not found. Please set it in your .env file.")
+    if llm_override is None and not GEMINI_API_KEY:
+        notify.error("Gemini API Key not found. Please set it in your .env file.")
         return []
 
+    # Ensure category is not None, convert to empty string if so for prompt
+    category_for_prompt = category if category else "General" # Default to "General" if empty
+    text = _fit_to_budget(text, token_budget, category)
+
+    cache_key = _cache_key(text, num_questions, difficulty, category_for_prompt, llm_override)
+    if use_cache:
+        cached_mcqs = mcq_cache.get(cache_key)
+        if cached_mcqs:
+            return cached_mcqs
+
+    chain_to_use = _make_chain(llm_override, get_prompt()) if llm_override is not None else get_chain()
+    errors = []
+    mcqs = _run_generation(chain_to_use, text, num_questions, difficulty, category_for_prompt, chunked, errors)
+    # Only a complete result is cached, so a transient failure is not served again for the cache's lifetime
+    if len(mcqs) == num_questions and not errors:
+        mcq_cache.set(cache_key, mcqs)
+    return mcqs
+
+
+def _run_generation(chain_to_use, text: str, num_questions: int, difficulty: str,
+                    category_for_prompt: str, chunked: bool = None, errors: list = None) -> list:
+    """Calls the model (single-shot or chunked) and returns the validated MCQs; failed chunks go to `errors`."""
+    output = ""
+    if chunked is None:
+        chunked = estimate_tokens(text) > CHUNK_TOKEN_LIMIT
     try:
-        # Ensure category is not None, convert to empty string if so for prompt
-        category_for_prompt = category if category else "General" # Default to "General" if empty
-
-        output = chain.run(
-            text=text,
-            num_questions=num_questions,
-            difficulty=difficulty,
-            category=category_for_prompt
-        )
-        
-        # --- FIX: Remove Markdown code block fences ---
-        if output.strip().startswith("```json") and output.strip().endswith("```"):
-            output = output.strip()[len("```json"):].strip()[:-len("```")].strip()
-        # --- END FIX ---
+        with metrics.timer("generate", mode="chunked" if chunked else "single"):
+            if chunked:
+                return generate_mcqs_chunked(text, num_questions, difficulty, category_for_prompt, chain_to_use,
+                                             errors=errors)
 
-        # Attempt to parse the JSON output
-        mcqs = json.loads(output)
-        
-        # Basic validation of the generated MCQs
-        validated_mcqs = []
-        for mcq in mcqs:
-            # Check for required keys and correct types
-            if all(k in mcq and isinstance(mcq[k], str) for k in ["question", "correct_answer", "category", "difficulty"]) \
-               and "options" in mcq and isinstance(mcq["options"], list) and len(mcq["options"]) == 4:
-                
-                if mcq["correct_answer"] in mcq["options"]:
-                    validated_mcqs.append(mcq)
-                else:
-                    st.warning(f"AI generated an MCQ with correct answer not in options. Skipping: {mcq.get('question', 'N/A')}")
-            else:
-                st.warning(f"AI generated an invalid MCQ format. Skipping: {mcq}")
-        
-        return validated_mcqs
+            session = _RepairSession(num_questions)
+            request_count = num_questions
+            while request_count:
+                output = _metered_call(
+                    chain_to_use, "single",
+                    text=text,
+                    num_questions=request_count,
+                    difficulty=difficulty,
+                    category=category_for_prompt,
+                    existing_questions=session.existing_questions()
+                )
+                # Attempt to parse the JSON output and validate the generated MCQs
+                try:
+                    session.add(_parse_mcq_output(output))
+                except json.JSONDecodeError:
+                    if not session.topups:
+                        raise
+                request_count = session.next_topup()
+            return session.finish()
     except json.JSONDecodeError as e:
-        st.error(f"Error decoding JSON from AI response. This might be due to an invalid API key or a malformed response from the model. Details: {e}. Raw AI Output: '{output}'") # Added raw output print
+        notify.error(f"Error decoding JSON from AI response. This might be due to an invalid API key or a malformed response from the model. Details: {e}. Raw AI Output: '{output}'") # Added raw output print
         print(f"AI Output (problematic): {output}") # For developer debugging
         return []
     except Exception as e:
-        st.error(f"An unexpected error occurred during MCQ generation: {e}. Please check your API key and try again.")
+        notify.error(f"An unexpected error occurred during MCQ generation: {e}. Please check your API key and try again.")
         print(f"An unexpected error occurred during MCQ generation: {e}") # For developer debugging
         return []
+
+
+def _stream_mcq_objects(model, text: str, num_questions: int, difficulty: str, category: str,
+                        existing_questions: str = "[]", stop: threading.Event = None):
+    """
+    Streams one model call and yields each MCQ object as soon as it is complete.
+    Once `stop` is set, the call is abandoned at the next streamed token.
+    """
+    parser = IncrementalJSONArrayParser()
+    variables = {"text": text, "num_questions": num_questions, "difficulty": difficulty,
+                 "category": category, "existing_questions": existing_questions}
+    found_objects = False
+    output = []
+    started = time.perf_counter()
+    try:
+        for message_chunk in (get_prompt() | model).stream(variables):
+            if stop is not None and stop.is_set():
+                return
+            output.append(message_chunk.content)
+            for mcq in parser.feed(message_chunk.content):
+                if not found_objects:
+                    metrics.observe("stage_seconds", time.perf_counter() - started, stage="first_question", mode="stream")
+                found_objects = True
+                yield mcq
+    except Exception:
+        metrics.error("model_call", mode="stream")
+        raise
+    finally:
+        # Also reached when the consumer stops reading early, e.g. once a top-up is satisfied
+        metrics.observe("stage_seconds", time.perf_counter() - started, stage="model_call", mode="stream")
+        _record_tokens("stream", get_prompt(), variables, "".join(output))
+        repair_stats.record(elements_repaired=parser.repaired, elements_dropped=len(parser.errors))
+    if not found_objects and not parser.found_array:
+        raise ValueError("The AI response did not contain a JSON array of questions.")
+
+
+_CHUNK_DONE = object() # Sentinel a chunk worker puts on the queue when it finishes
+
+
+def _stream_chunked_mcq_objects(model, text: str, num_questions: int, difficulty: str, category: str,
+                                existing_questions: str = "[]", errors: list = None):
+    """
+    Streams the chunk calls of a long text concurrently, yielding MCQ objects from
+    whichever chunk completes one first. Failed chunks are reported and appended to
+    `errors` if a list is given.
+    """
+    chunks = split_text_into_chunks(text)
+    allocation = _distribute_questions(num_questions, chunks)
+    results = queue.Queue()
+    session = current_session() # Worker threads queue their calls under the caller's session
+    stop = threading.Event() # Set when the consumer stops reading, so running chunks end their calls
+
+    def stream_chunk(chunk, count):
+        try:
+            if stop.is_set():
+                return
+            with session_scope(session):
+                for mcq in _stream_mcq_objects(model, chunk, count, difficulty, category, existing_questions, stop):
+                    results.put(mcq)
+        except Exception as e:
+            results.put(e)
+        finally:
+            results.put(_CHUNK_DONE)
+
+    executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CHUNKS)
+    try:
+        running = 0
+        for chunk, count in zip(chunks, allocation):
+            if count > 0:
+                executor.submit(stream_chunk, chunk, count)
+                running += 1
+        while running:
+            item = results.get()
+            if item is _CHUNK_DONE:
+                running -= 1
+            elif isinstance(item, Exception):
+                # Messages must stay on the caller's thread and context, so chunk errors are reported here
+                notify.warning(f"Skipping a document section after an error: {item}")
+                print(f"Chunk generation failed: {item}") # For developer debugging
+                if errors is not None:
+                    errors.append(item)
+            else:
+                yield item
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def generate_mcqs_stream(text: str, num_questions: int, difficulty: str, category: str,
+                         llm_override=None, chunked: bool = None, use_cache: bool = True,
+                         token_budget: int = None):
+    """
+    Generates MCQs like generate_mcqs, but yields each validated MCQ as soon as the
+    model has finished writing it instead of waiting for the whole response.
+
+    Takes the same arguments as generate_mcqs. Cached results are yielded straight
+    away; a stream that delivered every question without errors is written back to
+    the cache.
+
+    Yields:
+        dict: One validated MCQ at a time.
+    """
+    if llm_override is None and not GEMINI_API_KEY:
+        notify.error("Gemini API Key not found. Please set it in your .env file.")
+        return
+
+    # Ensure category is not None, convert to empty string if so for prompt
+    category_for_prompt = category if category else "General" # Default to "General" if empty
+    text = _fit_to_budget(text, token_budget, category)
+
+    cache_key = _cache_key(text, num_questions, difficulty, category_for_prompt, llm_override)
+    if use_cache:
+        cached_mcqs = mcq_cache.get(cache_key)
+        if cached_mcqs:
+            yield from cached_mcqs
+            return
+
+    model = llm_override if llm_override is not None else get_llm()
+    if chunked is None:
+        chunked = estimate_tokens(text) > CHUNK_TOKEN_LIMIT
+    errors = []
+    stream_objects = partial(_stream_chunked_mcq_objects, errors=errors) if chunked else _stream_mcq_objects
+
+    # A short or partly malformed stream is topped up with requests for just the shortfall
+    session = _RepairSession(num_questions)
+    request_count = num_questions
+    try:
+        while request_count:
+            try:
+                for candidate in stream_objects(model, text, request_count, difficulty, category_for_prompt,
+                                                session.existing_questions()):
+                    yield from session.add([candidate])
+                    if not session.shortfall:
+                        break
+            except ValueError:
+                if not session.topups:
+                    raise
+            request_count = session.next_topup()
+    except Exception as e:
+        notify.error(f"An unexpected error occurred during MCQ generation: {e}. Please check your API key and try again.")
+        print(f"An unexpected error occurred during MCQ generation: {e}") # For developer debugging
+        errors.append(e)
+
+    generated = session.finish()
+    if len(generated) == num_questions and not errors:
+        mcq_cache.set(cache_key, generated)
+
+
+# Bulk batches use the same prompt with a per-batch focus hint, so parallel batches
+# over the same text ask for different questions
+bulk_template = template + "Focus for this batch (batch {batch_number}): {focus}\n"
+
+
+def get_bulk_prompt():
+    """Returns the PromptTemplate of bulk batches."""
+    return _get_or_build("bulk_prompt", lambda: _make_prompt(bulk_template, PROMPT_VARIABLES + ["batch_number", "focus"]))
+
+
+class _BulkPlan:
+    """
+    Decides which document section each bulk batch is drawn from.
+
+    Sections first get batches in proportion to their length; once that allocation
+    is used up, top-up batches go to the sections that have had the fewest calls.
+    """
+
+    def __init__(self, chunks: list, num_questions: int):
+        self.chunks = chunks
+        self.remaining = _distribute_questions(num_questions, chunks)
+        self.calls = [0] * len(chunks)
+        self.recent_questions = [[] for _ in chunks]
+
+    def next_chunk(self, count: int) -> int:
+        best = max(range(len(self.chunks)), key=lambda i: (self.remaining[i], -i))
+        if self.remaining[best] <= 0:
+            best = min(range(len(self.chunks)), key=lambda i: (self.calls[i], i))
+        self.remaining[best] -= count
+        self.calls[best] += 1
+        return best
+
+    def existing_questions(self, chunk_index: int) -> str:
+        """The latest questions accepted from a section, so its next batch avoids them."""
+        return json.dumps(self.recent_questions[chunk_index][-BULK_EXISTING_LIMIT:])
+
+
+async def _agenerate_bulk(chain_to_use, chunks: list, num_questions: int, difficulty: str, category: str,
+                          batch_size: int, max_concurrency: int, max_calls: int,
+                          progress_callback=None, should_stop=None) -> tuple:
+    """
+    Keeps up to `max_concurrency` batch calls in flight until the target is met,
+    `max_calls` calls have been made or `should_stop()` returns True.
+    Returns (mcqs, failed_batch_errors).
+    """
+    session = _RepairSession(num_questions) # Validates and de-duplicates across every batch
+    plan = _BulkPlan(chunks, num_questions)
+    in_flight = {}
+    requested = 0 # Questions asked for by the calls still in flight
+    calls = 0
+    completed = 0
+    errors = []
+
+    while True:
+        if should_stop is not None and should_stop():
+            break
+        # Only ask for what the calls in flight cannot already cover
+        while len(in_flight) < max_concurrency and calls < max_calls and requested < session.shortfall:
+            count = min(batch_size, session.shortfall - requested)
+            chunk_index = plan.next_chunk(count)
+            task = asyncio.ensure_future(_ametered_call(
+                chain_to_use, "bulk",
+                text=chunks[chunk_index],
+                num_questions=count,
+                difficulty=difficulty,
+                category=category,
+                existing_questions=plan.existing_questions(chunk_index),
+                batch_number=calls + 1,
+                focus=FOCUS_HINTS[calls % len(FOCUS_HINTS)],
+            ))
+            in_flight[task] = (chunk_index, count)
+            requested += count
+            calls += 1
+        if not in_flight:
+            break
+
+        done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED,
+                                     timeout=STOP_POLL_INTERVAL if should_stop else None)
+        for task in done:
+            chunk_index, count = in_flight.pop(task)
+            requested -= count
+            completed += 1
+            try:
+                accepted = session.add(_parse_mcq_output(task.result()))
+                plan.recent_questions[chunk_index].extend(mcq["question"] for mcq in accepted)
+            except Exception as e:
+                errors.append(e)
+                print(f"Bulk batch failed: {e}") # For developer debugging
+            if progress_callback:
+                progress_callback(completed, len(session.mcqs), num_questions)
+
+    for task in in_flight:
+        task.cancel()
+    return session.mcqs, errors
+
+
+def generate_mcqs_bulk(text: str, num_questions: int, difficulty: str, category: str,
+                       llm_override=None, use_cache: bool = True, batch_size: int = BULK_BATCH_SIZE,
+                       max_concurrency: int = MAX_CONCURRENT_BATCHES, max_calls: int = None,
+                       progress_callback=None, should_stop=None) -> list:
+    """
+    Generates a large question bank (hundreds of MCQs) with parallel batch calls.
+
+    The request is fanned out into batches of `batch_size` questions. Each batch is
+    drawn from one section of the text (long texts are chunked as in
+    generate_mcqs_chunked) and gets its own focus hint, so batches running in parallel
+    ask for different questions. Repeats across batches are dropped, and further
+    batches are issued until `num_questions` unique questions are collected or the
+    call budget is spent.
+
+    Args:
+        text (str): The input text to generate questions from.
+        num_questions (int): The size of the question bank to build.
+        difficulty (str): The desired difficulty level (Easy, Medium, Hard).
+        category (str): The desired category.
+        llm_override: Optional chat model to use instead of Gemini.
+        use_cache (bool): Set to False to skip the cache lookup and get fresh questions.
+        batch_size (int): Questions requested per call.
+        max_concurrency (int): Maximum number of calls in flight.
+        max_calls (int): Call budget. Defaults to BULK_CALL_FACTOR times the number of batches.
+        progress_callback: Optional function called as progress_callback(batches_done,
+            questions_collected, num_questions) each time a batch completes.
+        should_stop: Optional function polled while batches run; once it returns True no
+            more batches are issued, the ones in flight are cancelled and the questions
+            collected so far are returned (and not cached).
+
+    Returns:
+        list: A list of dictionaries, each representing an MCQ. It can be shorter than
+        `num_questions` when the budget runs out first.
+    """
+    if llm_override is None and not GEMINI_API_KEY:
+        notify.error("Gemini API Key not found. Please set it in your .env file.")
+        return []
+
+    category_for_prompt = category if category else "General"
+    cache_key = _cache_key(text, num_questions, difficulty, category_for_prompt, llm_override, bulk_template)
+    if use_cache:
+        cached_mcqs = mcq_cache.get(cache_key)
+        if cached_mcqs:
+            if progress_callback:
+                progress_callback(0, len(cached_mcqs), num_questions)
+            return cached_mcqs
+
+    chain_to_use = _make_chain(llm_override if llm_override is not None else get_llm(), get_bulk_prompt())
+    chunks = split_text_into_chunks(text) or [text]
+    batch_size = max(1, batch_size)
+    if max_calls is None:
+        max_calls = BULK_CALL_FACTOR * -(-num_questions // batch_size)
+
+    try:
+        with metrics.timer("generate", mode="bulk"):
+            mcqs, errors = asyncio.run(_agenerate_bulk(
+                chain_to_use, chunks, num_questions, difficulty, category_for_prompt,
+                batch_size, max(1, max_concurrency), max_calls, progress_callback, should_stop
+            ))
+    except Exception as e:
+        notify.error(f"An unexpected error occurred during MCQ generation: {e}. Please check your API key and try again.")
+        print(f"An unexpected error occurred during MCQ generation: {e}") # For developer debugging
+        return []
+
+    if should_stop is not None and should_stop():
+        return mcqs
+    if errors:
+        notify.warning(f"{len(errors)} question batches failed and were skipped (first error: {errors[0]}).")
+    if len(mcqs) < num_questions:
+        notify.warning(f"Generated {len(mcqs)} of {num_questions} questions before the call budget ran out.")
+    if len(mcqs) == num_questions:
+        mcq_cache.set(cache_key, mcqs)
+    return mcqs
+
+
+_LAZY_ATTRIBUTES = {"llm": get_llm, "prompt": get_prompt, "chain": get_chain, "bulk_prompt": get_bulk_prompt}
+
+
+def __getattr__(name):
+    # llm, prompt, chain and bulk_prompt are still available as module attributes, built on first access
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
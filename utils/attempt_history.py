@@ -0,0 +1,217 @@
+# utils/attempt_history.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from utils.metrics import metrics
+from utils.quiz_engine import UNANSWERED
+
+# Every graded quiz is kept here, for the analytics in utils.quiz_analytics
+HISTORY_PATH = os.getenv("QUIZGENIUS_HISTORY_PATH", "quizgenius_history.sqlite3")
+
+
+def canonical_options(q: dict) -> list:
+    """A question's options in a fixed order, so shuffled variants of it line up."""
+    return sorted(q["options"])
+
+
+def question_key(q: dict) -> int:
+    """
+    A stable 63-bit ID for a question: a hash of its text and its options in canonical
+    order. The same question in any set, exam or variant gets the same key.
+    """
+    payload = json.dumps([q["question"], canonical_options(q)], ensure_ascii=False)
+    digest = hashlib.blake2b(payload.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") & (2**63 - 1)
+
+
+class AttemptHistory:
+    """
+    Every quiz attempt, stored column-wise in SQLite.
+
+    An attempt is one row whose per-question columns (question keys, chosen options,
+    correctness, seconds taken) are packed NumPy arrays, so tens of thousands of
+    attempts load with one query and a few np.frombuffer calls. Chosen options are
+    indexes into the canonical option order. A catalog keeps what the analytics need
+    about each question seen: text, canonical options, correct option, category and
+    difficulty.
+    """
+
+    def __init__(self, path: str = HISTORY_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._columns = None # Cached result of columns(), extended with newer attempts only
+        self._catalog = None # Cached result of catalog(), dropped on writes
+        with self._connection() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS attempts (
+                    id INTEGER PRIMARY KEY,
+                    finished_at REAL NOT NULL,
+                    label TEXT,
+                    num_questions INTEGER NOT NULL,
+                    score INTEGER NOT NULL,
+                    question_keys BLOB NOT NULL,
+                    chosen BLOB NOT NULL,
+                    correct BLOB NOT NULL,
+                    seconds BLOB NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS question_catalog (
+                    key INTEGER PRIMARY KEY,
+                    question TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    correct_option INTEGER NOT NULL,
+                    category TEXT,
+                    difficulty TEXT
+                );
+            """)
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread (Streamlit runs each session's script in its own thread)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _question_entry(q: dict) -> tuple:
+        """(catalog row, {option text: canonical index}) of a question."""
+        options = canonical_options(q)
+        correct_option = options.index(q["correct_answer"]) if q["correct_answer"] in options else UNANSWERED
+        row = (question_key(q), q["question"], json.dumps(options, ensure_ascii=False), correct_option,
+               q.get("category"), q.get("difficulty"))
+        return row, {option: i for i, option in enumerate(options)}
+
+    def record_many(self, attempts: list) -> int:
+        """
+        Stores attempts in one transaction.
+
+        Args:
+            attempts (list): (questions, chosen, seconds, label) tuples, where chosen holds
+                the option index picked for each question in its own option order
+                (UNANSWERED for none) and seconds the time spent on each question.
+
+        Returns:
+            int: The number of attempts stored.
+        """
+        now = time.time()
+        entries = {} # Questions shared between attempts (the same dicts) are hashed once
+        catalog = {}
+        rows = []
+        for questions, chosen, seconds, label in attempts:
+            keys = np.empty(len(questions), dtype=np.int64)
+            canonical = np.full(len(questions), UNANSWERED, dtype=np.int8)
+            correct = np.zeros(len(questions), dtype=np.bool_)
+            for i, (q, option) in enumerate(zip(questions, np.asarray(chosen).tolist())):
+                entry = entries.get(id(q))
+                if entry is None:
+                    entry = entries[id(q)] = self._question_entry(q)
+                    catalog[entry[0][0]] = entry[0]
+                row, positions = entry
+                keys[i] = row[0]
+                if option != UNANSWERED:
+                    canonical[i] = positions[q["options"][option]]
+                    correct[i] = canonical[i] == row[3]
+            rows.append((now, label, len(questions), int(correct.sum()), keys.tobytes(), canonical.tobytes(),
+                         correct.tobytes(), np.asarray(seconds, dtype=np.float32).tobytes()))
+        conn = self._connection()
+        with metrics.timer("history", operation="record"), conn:
+            conn.executemany(
+                "INSERT INTO attempts (finished_at, label, num_questions, score, question_keys, chosen, correct, seconds)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            # The latest category and difficulty of a question win
+            conn.executemany(
+                "INSERT INTO question_catalog (key, question, options, correct_option, category, difficulty)"
+                " VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET"
+                " category = excluded.category, difficulty = excluded.difficulty",
+                catalog.values()
+            )
+        self._catalog = None
+        return len(rows)
+
+    def record(self, questions: list, chosen, seconds, label: str = "") -> int:
+        """Stores one graded attempt (see record_many)."""
+        return self.record_many([(questions, chosen, seconds, label)])
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM attempts").fetchone()[0]
+
+    def columns(self) -> dict:
+        """
+        Every recorded answer as parallel arrays: "attempt" (row index into the
+        per-attempt arrays), "question" (keys), "chosen", "correct" and "seconds"; plus
+        per attempt "attempt_ids" and "finished_at". Only attempts recorded since the
+        previous call are read from the database.
+        """
+        with self._lock:
+            cached = self._columns
+            last_id = int(cached["attempt_ids"][-1]) if cached is not None and len(cached["attempt_ids"]) else 0
+            rows = self._connection().execute(
+                "SELECT id, finished_at, question_keys, chosen, correct, seconds FROM attempts WHERE id > ? ORDER BY id",
+                (last_id,)
+            ).fetchall()
+            if cached is not None and not rows:
+                return cached
+            ids = np.array([row[0] for row in rows], dtype=np.int64)
+            counts = np.array([len(row[3]) for row in rows], dtype=np.int64) # One int8 per answer
+            offset = len(cached["attempt_ids"]) if cached is not None else 0
+            new = {
+                "attempt": np.repeat(np.arange(offset, offset + len(rows), dtype=np.int32), counts),
+                "question": np.frombuffer(b"".join(row[2] for row in rows), dtype=np.int64),
+                "chosen": np.frombuffer(b"".join(row[3] for row in rows), dtype=np.int8),
+                "correct": np.frombuffer(b"".join(row[4] for row in rows), dtype=np.bool_),
+                "seconds": np.frombuffer(b"".join(row[5] for row in rows), dtype=np.float32),
+                "attempt_ids": ids,
+                "finished_at": np.array([row[1] for row in rows], dtype=np.float64),
+            }
+            if cached is not None:
+                new = {name: np.concatenate([cached[name], values]) for name, values in new.items()}
+            self._columns = new
+            return new
+
+    def catalog(self) -> dict:
+        """Returns {question key: {"question", "options", "correct_option", "category", "difficulty"}}."""
+        catalog = self._catalog
+        if catalog is None:
+            rows = self._connection().execute(
+                "SELECT key, question, options, correct_option, category, difficulty FROM question_catalog"
+            ).fetchall()
+            catalog = self._catalog = {
+                key: {"question": question, "options": json.loads(options), "correct_option": correct_option,
+                      "category": category, "difficulty": difficulty}
+                for key, question, options, correct_option, category, difficulty in rows
+            }
+        return catalog
+
+    def set_difficulties(self, difficulties: dict):
+        """Updates the difficulty recorded in the catalog, as {question key: difficulty}."""
+        conn = self._connection()
+        with conn:
+            conn.executemany("UPDATE question_catalog SET difficulty = ? WHERE key = ?",
+                             ((difficulty, key) for key, difficulty in difficulties.items()))
+        self._catalog = None
+
+
+# Process-wide history shared by all sessions; created on first use
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_history() -> AttemptHistory:
+    """Returns the process-wide attempt history, opening QUIZGENIUS_HISTORY_PATH on first use."""
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                _history = AttemptHistory(HISTORY_PATH)
+    return _history
@@ -0,0 +1,365 @@
+# utils/bank_io.py
+import gzip
+import json
+import os
+import uuid
+from contextlib import contextmanager
+
+from utils import notify
+from utils.metrics import metrics
+from utils.question_store import STANDARD_FIELDS
+from utils.session_manager import append_sets, delete_set, iter_questions, rename_sets
+
+# Streaming import and export of the whole question bank.
+#
+# Two formats, both written and read one question at a time so memory stays bounded
+# by a batch rather than by the size of the bank:
+#
+# - JSONL: one JSON object per line, the question's fields plus "set" (its set name).
+#   Output of batch_generate.py imports as well; its "source" names the set.
+# - QGB (QuizGenius bank): a compact binary format. Repeated strings (set names,
+#   categories, difficulties) are stored once and referred to by number, and the
+#   correct answer is stored as the index of its option.
+#
+# Paths ending in .gz are gzip-compressed on the fly.
+#
+# QGB layout: the magic b"QGB1", then records, each a varint length followed by that
+# many bytes whose first byte is the record type:
+# - DEFINE (1): the UTF-8 bytes of the next interned string, numbered from 1.
+# - QUESTION (2): varints set, category and difficulty (interned numbers, 0 for none);
+#   the question text; a varint option count and the options; a varint correct option
+#   (index + 1, or 0 followed by the correct answer text when it is not an option);
+#   the other fields as JSON text (empty when there are none). Texts are a varint byte
+#   length followed by UTF-8.
+MAGIC = b"QGB1"
+_DEFINE = 1
+_QUESTION = 2
+
+FORMATS = ("jsonl", "qgb")
+IMPORT_BATCH_SIZE = 2000 # Questions buffered before they are written to the store
+_WRITE_BATCH = 1000 # Records joined per write call
+_READ_CHUNK = 1024 * 1024
+DEFAULT_IMPORT_SET = "Imported questions"
+# Sets being replaced are imported under a temporary name with this prefix, then swapped in
+STAGING_PREFIX = ".importing-"
+
+
+@contextmanager
+def _open_binary(target, mode: str):
+    """
+    Opens a path, or passes an open binary file through (it is left open). Either is
+    gzip-(de)compressed if its name ends in .gz, e.g. an uploaded bank.jsonl.gz.
+    """
+    if isinstance(target, (str, os.PathLike)):
+        opener = gzip.open if os.fspath(target).endswith(".gz") else open
+        with opener(target, mode) as f:
+            yield f
+    elif str(getattr(target, "name", "")).endswith(".gz"):
+        with gzip.GzipFile(fileobj=target, mode=mode) as f:
+            yield f
+    else:
+        yield target
+
+
+def detect_format(source) -> str:
+    """Tells the format of a path by its name, or of an open (seekable) file by its first bytes."""
+    if isinstance(source, (str, os.PathLike)):
+        name = os.fspath(source).removesuffix(".gz")
+        return "qgb" if name.endswith(".qgb") else "jsonl"
+    name = str(getattr(source, "name", ""))
+    if name.removesuffix(".gz").endswith(".qgb"):
+        return "qgb"
+    if name.endswith(".gz"):
+        return "jsonl"
+    position = source.tell()
+    head = source.read(len(MAGIC))
+    source.seek(position)
+    return "qgb" if head == MAGIC else "jsonl"
+
+
+# --- JSONL ---
+
+def write_jsonl(records, output) -> int:
+    """Writes (set_name, question) pairs as JSON lines. Returns the number written."""
+    count = 0
+    with _open_binary(output, "wb") as f:
+        lines = []
+        for set_name, q in records:
+            lines.append(json.dumps({"set": set_name, **q}, ensure_ascii=False))
+            if len(lines) == _WRITE_BATCH:
+                f.write(("\n".join(lines) + "\n").encode("utf-8"))
+                count += len(lines)
+                lines = []
+        if lines:
+            f.write(("\n".join(lines) + "\n").encode("utf-8"))
+            count += len(lines)
+    return count
+
+
+def read_jsonl(source):
+    """Yields (set_name, question) pairs from JSON lines; blank lines are skipped."""
+    with _open_binary(source, "rb") as f:
+        for line_number, line in enumerate(f, start=1): # json.loads decodes the UTF-8 bytes itself
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Line {line_number} is not valid JSON: {e}") from None
+            if not isinstance(record, dict):
+                raise ValueError(f"Line {line_number} is not a JSON object.")
+            set_name = record.pop("set", None) or record.get("source")
+            if set_name is not None and not isinstance(set_name, str):
+                raise ValueError(f"Line {line_number} has a set name that is not a string.")
+            yield set_name, record
+
+
+# --- QGB ---
+
+def _varint(value: int) -> bytes:
+    if value < 0x80:
+        return bytes((value,))
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _text(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return _varint(len(data)) + data
+
+
+def _read_varint(data: bytes, pos: int) -> tuple:
+    byte = data[pos]
+    if byte < 0x80:
+        return byte, pos + 1
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _read_text(data: bytes, pos: int) -> tuple:
+    length, pos = _read_varint(data, pos)
+    return data[pos:pos + length].decode("utf-8"), pos + length
+
+
+def write_qgb(records, output) -> int:
+    """Writes (set_name, question) pairs in the QGB format. Returns the number written."""
+    interned = {}
+    count = 0
+
+    def ref(value, out: list) -> int:
+        if not value:
+            return 0
+        number = interned.get(value)
+        if number is None:
+            number = interned[value] = len(interned) + 1
+            data = value.encode("utf-8")
+            out.append(_varint(len(data) + 1) + bytes((_DEFINE,)) + data)
+        return number
+
+    with _open_binary(output, "wb") as f:
+        f.write(MAGIC)
+        chunks = []
+        for set_name, q in records:
+            options = q.get("options") or []
+            try:
+                correct = options.index(q.get("correct_answer")) + 1
+            except ValueError:
+                correct = 0
+            extra = {k: v for k, v in q.items() if k not in STANDARD_FIELDS}
+            payload = b"".join([
+                bytes((_QUESTION,)),
+                _varint(ref(set_name, chunks)),
+                _varint(ref(q.get("category"), chunks)),
+                _varint(ref(q.get("difficulty"), chunks)),
+                _text(q.get("question", "")),
+                _varint(len(options)),
+                *map(_text, options),
+                _varint(correct),
+                b"" if correct else _text(q.get("correct_answer") or ""),
+                _text(json.dumps(extra, ensure_ascii=False) if extra else ""),
+            ])
+            chunks.append(_varint(len(payload)) + payload)
+            count += 1
+            if len(chunks) >= _WRITE_BATCH:
+                f.write(b"".join(chunks))
+                chunks = []
+        f.write(b"".join(chunks))
+    return count
+
+
+def _decode_question(payload: bytes, strings: list) -> tuple:
+    set_ref, pos = _read_varint(payload, 1)
+    category_ref, pos = _read_varint(payload, pos)
+    difficulty_ref, pos = _read_varint(payload, pos)
+    question, pos = _read_text(payload, pos)
+    num_options, pos = _read_varint(payload, pos)
+    options = []
+    for _ in range(num_options):
+        option, pos = _read_text(payload, pos)
+        options.append(option)
+    correct, pos = _read_varint(payload, pos)
+    if correct:
+        correct_answer = options[correct - 1]
+    else:
+        correct_answer, pos = _read_text(payload, pos)
+    extra, pos = _read_text(payload, pos)
+    q = {
+        "question": question,
+        "options": options,
+        "correct_answer": correct_answer,
+        "difficulty": strings[difficulty_ref],
+        "category": strings[category_ref],
+    }
+    if extra:
+        q.update(json.loads(extra))
+    return strings[set_ref], q
+
+
+def read_qgb(source):
+    """
+    Yields (set_name, question) pairs from a QGB file, reading it in chunks. A damaged
+    file raises ValueError.
+    """
+    strings = [None] # Interned strings by number; 0 stands for none
+    records = 0
+    with _open_binary(source, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Not a QuizGenius bank file (QGB1).")
+        buffer = b""
+        pos = 0
+        at_end = False
+        while True:
+            # Each record is decoded only once all of it is in the buffer
+            try:
+                length, start = _read_varint(buffer, pos)
+                complete = start + length <= len(buffer)
+            except IndexError:
+                complete = False
+            if not complete:
+                if at_end:
+                    if pos < len(buffer):
+                        raise ValueError("The bank file ends in the middle of a record.")
+                    return
+                chunk = f.read(_READ_CHUNK)
+                at_end = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            payload = buffer[start:start + length]
+            pos = start + length
+            records += 1
+            try:
+                if payload[0] == _DEFINE:
+                    strings.append(payload[1:].decode("utf-8"))
+                    continue
+                if payload[0] != _QUESTION:
+                    raise ValueError(f"Unknown record type {payload[0]} in the bank file.")
+                record = _decode_question(payload, strings)
+            except (IndexError, TypeError, UnicodeDecodeError, json.JSONDecodeError) as e:
+                raise ValueError(f"Record {records} of the bank file is damaged ({e}).") from None
+            yield record
+
+
+_WRITERS = {"jsonl": write_jsonl, "qgb": write_qgb}
+_READERS = {"jsonl": read_jsonl, "qgb": read_qgb}
+
+
+def _is_valid(q: dict) -> bool:
+    options = q.get("options")
+    return (isinstance(q.get("question"), str) and bool(q["question"].strip()) and isinstance(options, list)
+            and len(options) >= 2 and q.get("correct_answer") in options)
+
+
+def export_bank(output, file_format: str = None) -> int:
+    """
+    Streams every saved question to a file, set by set.
+
+    Args:
+        output: A path (".gz" compresses it) or a writable binary file.
+        file_format (str): "jsonl" or "qgb"; by default taken from the path's name.
+
+    Returns:
+        int: The number of questions written.
+    """
+    if file_format is None:
+        file_format = detect_format(output) if isinstance(output, (str, os.PathLike)) else "jsonl"
+    with metrics.timer("export", format=file_format):
+        count = _WRITERS[file_format](iter_questions(), output)
+    metrics.count("bank_questions_total", count, direction="exported")
+    return count
+
+
+def import_bank(source, file_format: str = None, default_set: str = DEFAULT_IMPORT_SET,
+                replace: bool = True, batch_size: int = IMPORT_BATCH_SIZE) -> dict:
+    """
+    Streams questions from a file straight into the saved sets.
+
+    Questions are written in batches of `batch_size`, each in one transaction, so only a
+    batch is held in memory. They are not screened for near-duplicates (it is a bulk
+    load). Records that are not valid questions are skipped, with a warning.
+
+    With `replace`, the sets are imported under temporary names and only swapped in for
+    the saved sets, in one transaction, once the whole file has been read: if it turns
+    out to be malformed, ValueError is raised and the saved sets are left untouched.
+    When appending, the batches before the error stay imported.
+
+    Args:
+        source: A path (".gz" is decompressed) or a readable binary file.
+        file_format (str): "jsonl" or "qgb"; detected from the name or content by default.
+        default_set (str): Set for questions whose record names none.
+        replace (bool): Replace the sets found in the file (True) or append to them.
+        batch_size (int): Questions buffered between writes.
+
+    Returns:
+        dict: "questions" imported, "sets" touched and "skipped" records.
+    """
+    file_format = file_format or detect_format(source)
+    staging_prefix = f"{STAGING_PREFIX}{uuid.uuid4().hex[:8]}-"
+    staged = {} # Set name -> the name it is imported under
+    pending = {}
+    pending_count = 0
+    imported = 0
+    skipped = 0
+
+    def target(set_name: str) -> str:
+        if set_name not in staged:
+            staged[set_name] = f"{staging_prefix}{set_name}" if replace else set_name
+        return staged[set_name]
+
+    with metrics.timer("import", format=file_format):
+        try:
+            for set_name, q in _READERS[file_format](source):
+                if not _is_valid(q):
+                    skipped += 1
+                    continue
+                pending.setdefault(target(set_name or default_set), []).append(q)
+                pending_count += 1
+                imported += 1
+                if pending_count >= batch_size:
+                    append_sets(pending)
+                    pending.clear()
+                    pending_count = 0
+            if pending:
+                append_sets(pending)
+            if replace:
+                rename_sets({staging_name: set_name for set_name, staging_name in staged.items()})
+        except BaseException:
+            if replace:
+                for staging_name in staged.values():
+                    delete_set(staging_name)
+            raise
+    metrics.count("bank_questions_total", imported, direction="imported")
+    if skipped:
+        notify.warning(f"Skipped {skipped} records that are not complete questions.")
+    return {"questions": imported, "sets": len(staged), "skipped": skipped}
@@ -0,0 +1,100 @@
+# utils/exam_builder.py
+import secrets
+
+import numpy as np
+
+from utils import notify
+from utils.session_manager import find_question_ids, load_questions
+
+MAX_EXAM_VARIANTS = 100
+
+
+def new_seed() -> int:
+    """A random seed small enough to show and type back in."""
+    return secrets.randbelow(2**31)
+
+
+def _stratum_label(category: str, difficulty: str) -> str:
+    return " ".join(part for part in (difficulty or "", category or "") if part) or "any question"
+
+
+def sample_blueprint(blueprint: list, seed: int) -> list:
+    """
+    Draws questions from the whole bank by stratum.
+
+    Each blueprint row ({"category", "difficulty", "count"}; None matches any) is sampled
+    at random, without replacement, from the IDs the store's category/difficulty indexes
+    return, so only the chosen questions are ever loaded. Rows may overlap ("Biology" and
+    "Hard Biology"); a question is used at most once. Rows the bank cannot fill are
+    filled as far as possible, with a warning.
+
+    Returns:
+        list: The questions, grouped by blueprint row. The same seed and bank give the same draw.
+    """
+    rng = np.random.default_rng(seed)
+    chosen = []
+    used = set()
+    for row in blueprint:
+        count = int(row.get("count") or 0)
+        if count <= 0:
+            continue
+        candidates = [question_id for question_id in find_question_ids(row.get("category"), row.get("difficulty"))
+                      if question_id not in used]
+        if len(candidates) < count:
+            notify.warning(f"Only {len(candidates)} questions are available for "
+                           f"{_stratum_label(row.get('category'), row.get('difficulty'))} (asked for {count}).")
+            count = len(candidates)
+        picked = [candidates[i] for i in rng.choice(len(candidates), size=count, replace=False).tolist()]
+        used.update(picked)
+        chosen.extend(picked)
+    return load_questions(chosen)
+
+
+def shuffle_variants(questions: list, num_variants: int, seed: int) -> list:
+    """
+    Builds exam variants: each one reorders the questions and the options of every question.
+
+    Variant k only depends on the seed and k, so any variant can be rebuilt on its own
+    (e.g. to reprint it). The options of all questions are shuffled at once with one
+    argsort over random keys; padding keeps questions with fewer options in place.
+
+    Returns:
+        list: One list of questions per variant; correct_answer still names the right option.
+    """
+    num_questions = len(questions)
+    widths = np.array([len(q["options"]) for q in questions], dtype=np.int64)
+    width = int(widths.max(initial=0))
+    padding = np.arange(width) >= widths[:, None]
+    variants = []
+    for k in range(num_variants):
+        rng = np.random.default_rng([seed, k])
+        question_order = rng.permutation(num_questions).tolist()
+        keys = rng.random((num_questions, width))
+        keys[padding] = np.inf # Padding sorts last, after the real options
+        option_orders = np.argsort(keys, axis=1).tolist()
+        variant = []
+        for i in question_order:
+            q = questions[i]
+            variant.append(dict(q, options=[q["options"][j] for j in option_orders[i][:widths[i]]]))
+        variants.append(variant)
+    return variants
+
+
+def build_exam(blueprint: list, num_variants: int = 1, seed: int = None) -> dict:
+    """
+    Draws an exam from the question bank and shuffles it into variants.
+
+    Args:
+        blueprint (list): Rows of {"category", "difficulty", "count"}, e.g.
+            [{"category": "Biology", "difficulty": "Hard", "count": 20},
+             {"category": "Chemistry", "difficulty": "Medium", "count": 10}].
+        num_variants (int): Shuffled variants to build (at most MAX_EXAM_VARIANTS).
+        seed (int): Makes the exam reproducible; a new one is drawn if omitted.
+
+    Returns:
+        dict: "seed", "questions" (the draw in blueprint order) and "variants".
+    """
+    seed = new_seed() if seed is None else int(seed)
+    questions = sample_blueprint(blueprint, seed)
+    num_variants = min(max(1, num_variants), MAX_EXAM_VARIANTS)
+    return {"seed": seed, "questions": questions, "variants": shuffle_variants(questions, num_variants, seed)}
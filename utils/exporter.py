@@ -1,16 +1,28 @@
 # utils/exporter.py
 import json
 import io
-import streamlit as st # For st.warning/error
+import hashlib
+import itertools
+import os
+import re
+import threading
+import unicodedata
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 
-from fpdf import FPDF # Uncommented for PDF export
+from utils import notify
+from utils.metrics import metrics
 
 def export_to_json(questions: list) -> str:
     """Exports a list of questions to a JSON string."""
     try:
-        return json.dumps(questions, indent=4)
+        with metrics.timer("export", format="json"):
+            data = json.dumps(questions, indent=4)
+        metrics.count("bytes_total", len(data.encode("utf-8")), stage="export", direction="out", format="json")
+        return data
     except Exception as e:
-        st.error(f"Error exporting to JSON: {e}")
+        notify.error(f"Error exporting to JSON: {e}")
         return "{}"
 
 def export_to_pdf(questions: list) -> bytes:
@@ -18,37 +30,300 @@ def export_to_pdf(questions: list) -> bytes:
     Exports a list of questions to a PDF byte stream using FPDF.
     """
     try:
-        pdf = FPDF()
-        # FIX: Change 'auto_page_break' to 'auto'
-        pdf.set_auto_page_break(auto=True, margin=15)
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-
-        pdf.multi_cell(0, 10, "QuizGenius - Generated MCQs", align='C')
-        pdf.ln(10) # Add some space
-
-        for i, q in enumerate(questions):
-            # Question
-            pdf.set_font("Arial", "B", 12) # Bold for question
-            pdf.multi_cell(0, 8, f"{i+1}. {q['question']}")
-            pdf.ln(2)
-
-            # Options
-            pdf.set_font("Arial", size=10) # Regular for options
-            for opt_idx, opt in enumerate(q['options']):
-                pdf.multi_cell(0, 6, f"    {chr(65 + opt_idx)}. {opt}")
-            pdf.ln(2)
+        with metrics.timer("export", format="pdf"):
+            data = _render_pdf(_build_pdf, questions)
+        metrics.count("bytes_total", len(data), stage="export", direction="out", format="pdf")
+        return data
+    except Exception as e:
+        notify.error(f"Error exporting to PDF: {e}")
+        print(f"PDF Export Error: {e}") # For console debugging
+        return b"" # Return empty bytes on error
+
+# --- PDF layout ---
+DEFAULT_PDF_TITLE = "QuizGenius - Generated MCQs"
+# A TrueType font with wide Unicode coverage (e.g. DejaVuSans.ttf) for PDFs with text
+# outside latin-1; without one, such text is transliterated to latin-1
+PDF_UNICODE_FONT = os.getenv("QUIZGENIUS_PDF_FONT")
+
+_LATIN1_REPLACEMENTS = str.maketrans({
+    "\u2018": "'", "\u2019": "'", "\u201a": "'", "\u201b": "'", "\u201c": '"', "\u201d": '"', "\u201e": '"',
+    "\u2013": "-", "\u2014": "-", "\u2212": "-", "\u2026": "...", "\u2022": "*", "\u20ac": "EUR",
+    "\u2122": "(TM)", "\u200b": "",
+})
+
+
+def _to_latin1(text: str) -> str:
+    """
+    The closest latin-1 rendering of text, for the built-in PDF fonts.
+
+    Typographic punctuation gets its ASCII equivalent, accented letters outside
+    latin-1 lose the accent, and anything else becomes "?".
+    """
+    text = str(text).translate(_LATIN1_REPLACEMENTS)
+    if text.isascii():
+        return text
+    chars = []
+    for char in text:
+        if ord(char) < 256:
+            chars.append(char)
+            continue
+        base = "".join(c for c in unicodedata.normalize("NFKD", char) if ord(c) < 256 and not unicodedata.combining(c))
+        chars.append(base or "?")
+    return "".join(chars)
+
+
+def _new_pdf(unicode_font: str = None):
+    """Starts a one-page FPDF document. Returns (pdf, font family)."""
+    from fpdf import FPDF # Imported on first use, so JSON-only sessions never load it
+
+    pdf = FPDF()
+    # FIX: Change 'auto_page_break' to 'auto'
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    if not unicode_font:
+        return pdf, "Arial"
+    for style in ("", "B", "I"):
+        pdf.add_font("Unicode", style, unicode_font, uni=True)
+    return pdf, "Unicode"
+
+
+def _render_pdf(layout, questions: list, *args) -> bytes:
+    """
+    Runs a PDF layout, first with the built-in fonts and the text as is.
+
+    Text outside latin-1 only fails when the finished document is encoded, so latin-1
+    questions pay nothing for the fallback: the layout is redone with PDF_UNICODE_FONT
+    if one is configured, or with the text transliterated to latin-1.
+    """
+    try:
+        return layout(questions, *args)
+    except UnicodeEncodeError:
+        if PDF_UNICODE_FONT and os.path.exists(PDF_UNICODE_FONT):
+            return layout(questions, *args, unicode_font=PDF_UNICODE_FONT)
+        return layout(questions, *args, clean=_to_latin1)
+
+
+def _build_pdf(questions: list, title: str = DEFAULT_PDF_TITLE, show_answers: bool = True,
+               unicode_font: str = None, clean=str) -> bytes:
+    """Lays out the questions with FPDF and returns the PDF bytes; show_answers=False leaves out the answers and details."""
+    pdf, family = _new_pdf(unicode_font)
+    pdf.set_font(family, size=12)
+
+    pdf.multi_cell(0, 10, clean(title), align='C')
+    pdf.ln(10) # Add some space
 
+    for i, q in enumerate(questions):
+        # Question
+        pdf.set_font(family, "B", 12) # Bold for question
+        pdf.multi_cell(0, 8, clean(f"{i+1}. {q['question']}"))
+        pdf.ln(2)
+
+        # Options
+        pdf.set_font(family, size=10) # Regular for options
+        for opt_idx, opt in enumerate(q['options']):
+            pdf.multi_cell(0, 6, clean(f"    {chr(65 + opt_idx)}. {opt}"))
+        pdf.ln(2)
+
+        if show_answers:
             # Correct Answer & Details
-            pdf.set_font("Arial", "I", 10) # Italic for details
-            pdf.multi_cell(0, 6, f"    Correct Answer: {q['correct_answer']}")
-            pdf.multi_cell(0, 6, f"    Difficulty: {q['difficulty']} | Category: {q['category']}")
-            pdf.ln(8) # Space after each question
+            pdf.set_font(family, "I", 10) # Italic for details
+            pdf.multi_cell(0, 6, clean(f"    Correct Answer: {q['correct_answer']}"))
+            pdf.multi_cell(0, 6, clean(f"    Difficulty: {q['difficulty']} | Category: {q['category']}"))
+        pdf.ln(8 if show_answers else 4) # Space after each question
+
+    # Output the PDF as bytes
+    return pdf.output(dest='S').encode('latin-1')
+
+
+def _build_answer_key_pdf(questions: list, title: str, unicode_font: str = None, clean=str) -> bytes:
+    """Lays out the answer key of a question list: the letter and text of each correct option."""
+    pdf, family = _new_pdf(unicode_font)
+    pdf.set_font(family, size=12)
+    pdf.multi_cell(0, 10, clean(f"{title} - Answer Key"), align='C')
+    pdf.ln(6)
+
+    pdf.set_font(family, size=10)
+    for i, q in enumerate(questions):
+        try:
+            letter = chr(65 + q['options'].index(q['correct_answer']))
+        except ValueError:
+            letter = "?"
+        pdf.multi_cell(0, 6, clean(f"{i+1}. {letter}  {q['correct_answer']}"))
+
+    return pdf.output(dest='S').encode('latin-1')
+
+
+# --- Bulk export of exam variants ---
+MAX_EXPORT_WORKERS = min(4, os.cpu_count() or 1)
+PARALLEL_EXPORT_THRESHOLD = 4 # Fewer files than this are rendered in-process
+
+
+def _render_export_file(kind: str, title: str, questions: list) -> bytes:
+    """Renders one file of a bulk export (a variant or its answer key); runs in a worker process."""
+    if kind == "answers":
+        return _render_pdf(_build_answer_key_pdf, questions, title)
+    return _render_pdf(_build_pdf, questions, title, False)
+
 
-        # Output the PDF as bytes
-        return pdf.output(dest='S').encode('latin-1')
+def _file_slug(title: str) -> str:
+    return "_".join(re.findall(r"[a-z0-9]+", title.lower())) or "exam"
+
+
+def export_variants_zip(variants: list, output, title: str = "Exam", answer_keys: bool = True,
+                        max_workers: int = None) -> dict:
+    """
+    Renders every exam variant (and its answer key) to PDF and writes them into a ZIP archive.
+
+    The files are rendered across a process pool and each one is added to the archive
+    as soon as it is done. Only a small window of files is in flight at a time, so
+    memory stays bounded however many variants there are.
+
+    Args:
+        variants (list): One question list per variant (see exam_builder.shuffle_variants).
+        output: A path or a writable binary file for the archive; it need not be seekable.
+        title (str): Printed at the top of every variant and used to name the files.
+        answer_keys (bool): Also render an answer key per variant.
+        max_workers (int): Worker processes (MAX_EXPORT_WORKERS by default); 1 renders in-process.
+
+    Returns:
+        dict: "files" and "bytes" written into the archive, or None if the export failed.
+    """
+    slug = _file_slug(title)
+    tasks = []
+    for k, questions in enumerate(variants, start=1):
+        variant_title = f"{title} - Variant {k}"
+        tasks.append((f"{slug}_variant_{k:03d}.pdf", ("questions", variant_title, questions)))
+        if answer_keys:
+            tasks.append((f"{slug}_variant_{k:03d}_answers.pdf", ("answers", variant_title, questions)))
+    workers = max(1, max_workers or MAX_EXPORT_WORKERS)
+    written = {"files": 0, "bytes": 0}
+
+    def add(archive, name, data):
+        archive.writestr(name, data)
+        written["files"] += 1
+        written["bytes"] += len(data)
+
+    try:
+        with metrics.timer("export", format="zip"):
+            # PDF page streams are already compressed, so the archive only stores them
+            with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_STORED) as archive:
+                if workers == 1 or len(tasks) < PARALLEL_EXPORT_THRESHOLD:
+                    for name, task in tasks:
+                        add(archive, name, _render_export_file(*task))
+                else:
+                    with ProcessPoolExecutor(max_workers=workers) as executor:
+                        pending = iter(tasks)
+                        in_flight = {}
+                        for name, task in itertools.islice(pending, workers * 2):
+                            in_flight[executor.submit(_render_export_file, *task)] = name
+                        while in_flight:
+                            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                            for future in done:
+                                add(archive, in_flight.pop(future), future.result())
+                                for name, task in itertools.islice(pending, 1):
+                                    in_flight[executor.submit(_render_export_file, *task)] = name
+        metrics.count("bytes_total", written["bytes"], stage="export", direction="out", format="zip")
+        return written
     except Exception as e:
-        st.error(f"Error exporting to PDF: {e}")
-        print(f"PDF Export Error: {e}") # For console debugging
-        return b"" # Return empty bytes on error
+        notify.error(f"Error exporting the exam variants: {e}")
+        print(f"Bulk PDF Export Error: {e}") # For console debugging
+        return None
+
+
+# --- Memoized export artifacts ---
+EXPORT_CACHE_MAX_ENTRIES = 32
+EXPORT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+_EXPORTERS = {
+    "json": export_to_json,
+    "pdf": export_to_pdf,
+}
+
+
+def content_hash(questions: list) -> str:
+    """Returns a stable SHA-256 of a question list, used to key export artifacts."""
+    payload = json.dumps(questions, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
+
+class ExportCache:
+    """
+    Bounded LRU cache of built export artifacts, keyed on (content hash, format, options).
+
+    Shared by all sessions of the process; least recently used artifacts are evicted
+    once either the entry count or the total size limit is exceeded.
+    """
+
+    def __init__(self, max_entries: int = EXPORT_CACHE_MAX_ENTRIES, max_bytes: int = EXPORT_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, artifact):
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key))
+            self._entries[key] = artifact
+            self._size += len(artifact)
+            while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters together with the current size of the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
+
+
+export_cache = ExportCache()
+metrics.register_source("export_cache", export_cache.stats)
+
+
+def get_export(questions: list, export_format: str, questions_hash: str = None, **options):
+    """
+    Returns the export artifact for a question list, building it only on a cache miss.
+
+    Args:
+        questions (list): The questions to export.
+        export_format (str): "json" or "pdf".
+        questions_hash (str): Optional precomputed content_hash(questions).
+        **options: Extra keyword arguments for the exporter; they are part of the key.
+
+    Returns:
+        str or bytes: The exported JSON string or PDF bytes.
+    """
+    export_format = export_format.lower()
+    key = (questions_hash or content_hash(questions), export_format, tuple(sorted(options.items())))
+    artifact = export_cache.get(key)
+    if artifact is None:
+        artifact = _EXPORTERS[export_format](questions, **options)
+        if artifact and artifact != "{}":
+            export_cache.put(key, artifact)
+    return artifact
@@ -0,0 +1,172 @@
+# utils/fake_llm.py
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import deque
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+
+class FakeRateLimitError(Exception):
+    """What the fake raises instead of answering, shaped like a 429 from the API."""
+
+    status_code = 429
+
+    def __init__(self, message: str = "429 Resource has been exhausted (e.g. check quota).", retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class FakeMCQChatModel(BaseChatModel):
+    """
+    A local, deterministic stand-in for Gemini that answers the MCQ prompt offline.
+
+    It reads the requested question count and text out of the rendered prompt and
+    replies with a fenced JSON array shaped like the real model's output, after an
+    optional artificial delay. Useful for trying the generation pipeline without an
+    API key. It can also emulate quota limits by failing calls with a 429, to try
+    utils.llm_client against.
+    """
+
+    latency: float = 0.0  # Seconds to wait before answering each call
+    fenced: bool = True  # Wrap the JSON in ```json fences like Gemini usually does
+    stream_chunk_size: int = 40  # Characters per streamed token chunk; `latency` is spread across them
+    invalid_every: int = 0  # Make every n-th question invalid (answer not among the options)
+    truncate_at: float = 1.0  # Fraction of the output to return, simulating a cut-off response
+    canned_output: str = None  # Reply with exactly this text instead of building questions
+    # Quota emulation; a rejected call raises FakeRateLimitError straight away
+    rate_limit_every: int = 0  # Reject every n-th call with a 429
+    max_concurrent: int = 0  # Reject calls arriving while this many are already running
+    requests_per_minute: int = 0  # Reject calls beyond this many in the last 60 seconds
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _calls: int = PrivateAttr(default=0)
+    _running: int = PrivateAttr(default=0)
+    _recent: deque = PrivateAttr(default_factory=deque)
+    _max_running: int = PrivateAttr(default=0)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-mcq"
+
+    @property
+    def max_running(self) -> int:
+        """The most calls that have been running at once."""
+        return self._max_running
+
+    def _admit(self):
+        """Counts a call in, or rejects it like an API whose quota is exceeded."""
+        with self._lock:
+            self._calls += 1
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= 60:
+                self._recent.popleft()
+            if self.rate_limit_every and self._calls % self.rate_limit_every == 0:
+                raise FakeRateLimitError()
+            if self.max_concurrent and self._running >= self.max_concurrent:
+                raise FakeRateLimitError("429 Too many concurrent requests.")
+            if self.requests_per_minute and len(self._recent) >= self.requests_per_minute:
+                raise FakeRateLimitError(retry_after=60 - (now - self._recent[0]))
+            self._recent.append(now)
+            self._running += 1
+            self._max_running = max(self._max_running, self._running)
+
+    def _finish(self):
+        with self._lock:
+            self._running -= 1
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._admit()
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            return self._result(messages)
+        finally:
+            self._finish()
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._admit()
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return self._result(messages)
+        finally:
+            self._finish()
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._admit()
+        try:
+            content = self.respond(self._prompt_text(messages))
+            pieces = [content[i:i + self.stream_chunk_size] for i in range(0, len(content), self.stream_chunk_size)]
+            delay = self.latency / max(1, len(pieces))
+            for piece in pieces:
+                if delay:
+                    time.sleep(delay)
+                yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+        finally:
+            self._finish()
+
+    @staticmethod
+    def _prompt_text(messages) -> str:
+        return "\n".join(str(m.content) for m in messages)
+
+    def _result(self, messages) -> ChatResult:
+        content = self.respond(self._prompt_text(messages))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def respond(self, prompt_text: str) -> str:
+        """Builds the raw model output for a rendered MCQ prompt."""
+        if self.canned_output is not None:
+            return self.canned_output
+        num_match = re.search(r"Number of questions to generate:\s*(\d+)", prompt_text)
+        num_questions = int(num_match.group(1)) if num_match else 5
+        difficulty_match = re.search(r"Desired Difficulty:\s*(\w+)", prompt_text)
+        difficulty = difficulty_match.group(1) if difficulty_match else "Medium"
+        category_match = re.search(r"Desired Category:\s*([^\n(]+)", prompt_text)
+        category = category_match.group(1).strip() if category_match else "General"
+
+        existing_match = re.search(r"Questions already generated \(do not repeat them\):\s*(\[.*\])", prompt_text)
+        existing_questions = set(json.loads(existing_match.group(1))) if existing_match else set()
+
+        # Bulk batches start further along, overlapping half of the previous batch
+        batch_match = re.search(r"Focus for this batch \(batch (\d+)\)", prompt_text)
+        start = (int(batch_match.group(1)) - 1) * num_questions // 2 if batch_match else 0
+
+        text_match = re.search(r"Text to generate questions from:\n(.*)\nNumber of questions", prompt_text, re.S)
+        source = text_match.group(1) if text_match else prompt_text
+        words = re.findall(r"[A-Za-z]{4,}", source) or ["topic"]
+        source_tag = hashlib.sha1(source.encode("utf-8")).hexdigest()[:6] # Keeps questions from different texts distinct
+
+        mcqs = []
+        i = start - 1
+        while len(mcqs) < num_questions:
+            i += 1
+            subject = words[(i * 7) % len(words)]
+            # Per-item code words keep distinct items from looking like paraphrases of each other
+            codes = hashlib.sha1(f"{source_tag}-{i}".encode("utf-8")).hexdigest()
+            detail = " ".join(codes[j:j + 5] for j in range(0, 20, 5))
+            question = f"Which statement about '{subject}' (item {i + 1}, {source_tag}, {detail}) is correct?"
+            if question in existing_questions:
+                continue # Honour the "do not repeat" instruction like a well-behaved model
+            options = [words[(i * 7 + k * 3 + 1) % len(words)] + f" {codes[20 + k * 5:25 + k * 5]}" for k in range(4)]
+            invalid = self.invalid_every and (len(mcqs) + 1) % self.invalid_every == 0
+            mcqs.append({
+                "question": question,
+                "options": options,
+                "correct_answer": "None of these" if invalid else options[i % 4],
+                "category": category,
+                "difficulty": difficulty,
+            })
+
+        output = json.dumps(mcqs, indent=2)
+        if self.truncate_at < 1.0:
+            output = output[:int(len(output) * self.truncate_at)]
+        if self.fenced:
+            output = f"```json\n{output}\n```"
+        return output
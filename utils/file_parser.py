@@ -1,33 +1,309 @@
 # utils/file_parser.py
+import codecs
 import io
-from PyPDF2 import PdfReader
-from docx import Document
-import streamlit as st # For st.error
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 
-def extract_text_from_pdf(file_bytes_io: io.BytesIO) -> str:
+from utils import notify
+from utils.metrics import metrics
+
+# PDFs with more selected pages than this are extracted across a process pool
+PARALLEL_PAGE_THRESHOLD = 40
+PAGES_PER_TASK = 8 # Pages extracted per worker task
+MAX_PDF_WORKERS = min(4, os.cpu_count() or 1)
+TEXT_CHUNK_CHARS = 64 * 1024 # Target size of the chunks yielded for DOCX and TXT files
+
+
+class PageRangeError(ValueError):
+    """Raised when a page selection cannot be read or selects no page of the document."""
+
+
+@contextmanager
+def _open_binary(source):
+    """Yields a readable binary stream over an uploaded file, a file-like object or a path."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            yield f
+    else:
+        source.seek(0)
+        yield source
+
+
+@contextmanager
+def _file_on_disk(source, stream):
+    """Yields a path to the document, copying an in-memory upload to a temporary file if needed."""
+    if isinstance(source, (str, os.PathLike)):
+        yield os.fspath(source)
+        return
+    stream.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as copy:
+        shutil.copyfileobj(stream, copy)
+    try:
+        yield copy.name
+    finally:
+        os.unlink(copy.name)
+
+
+def _source_size(source) -> int:
+    """Returns the size in bytes of an uploaded file, a file-like object or a path, without reading it."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    if hasattr(source, "getbuffer"):
+        return source.getbuffer().nbytes
+    position = source.tell()
+    size = source.seek(0, io.SEEK_END)
+    source.seek(position)
+    return size
+
+
+def _record_extraction(file_format: str, source, text_bytes: int):
+    """Counts the bytes read and the bytes of text extracted by one extraction."""
+    try:
+        metrics.count("bytes_total", _source_size(source), stage="extract", direction="in", format=file_format)
+    except (OSError, ValueError):
+        pass # A closed or unseekable stream; the extraction itself already reported it
+    metrics.count("bytes_total", text_bytes, stage="extract", direction="out", format=file_format)
+
+
+def parse_page_range(spec: str, num_pages: int) -> list:
+    """
+    Turns a page selection such as "1-10, 15, 20-" into sorted 0-based page indexes.
+
+    Pages are 1-based in the spec; open-ended ranges run to the last page and pages
+    outside the document are ignored. An empty spec selects every page.
+
+    Raises:
+        PageRangeError: If a part is not a page number or range, a range runs backwards
+            or no page of the document is selected.
+    """
+    if not spec or not spec.strip():
+        return list(range(num_pages))
+    pages = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            if "-" in part:
+                start, end = part.split("-", 1)
+                start = int(start) if start.strip() else 1
+                end = int(end) if end.strip() else num_pages
+            else:
+                start = end = int(part)
+        except ValueError:
+            raise PageRangeError(f"'{part}' is not a page number or range of pages.") from None
+        if start > end:
+            raise PageRangeError(f"The range '{part}' runs backwards; write it as '{end}-{start}'.")
+        pages.update(range(max(start, 1) - 1, min(end, num_pages)))
+    if not pages:
+        raise PageRangeError(f"'{spec.strip()}' selects none of the document's {num_pages} pages.")
+    return sorted(pages)
+
+
+# --- PDF worker process state ---
+_worker_reader = None
+
+
+def _init_pdf_worker(path: str):
+    """Opens the PDF once per worker process; it stays open for the worker's lifetime."""
+    global _worker_reader
+    from PyPDF2 import PdfReader
+
+    _worker_reader = PdfReader(open(path, "rb"))
+
+
+def _extract_pdf_pages(page_indexes: list) -> list:
+    """Extracts a batch of pages inside a worker process."""
+    return [(i, _worker_reader.pages[i].extract_text() or "") for i in page_indexes]
+
+
+def iter_pdf_pages(source, page_range: str = None, parallel: bool = None):
+    """
+    Yields (page_number, text) for the selected pages of a PDF, in page order.
+
+    Large selections are fanned out across a process pool in batches of
+    PAGES_PER_TASK pages. Only a small window of batches is in flight at a time,
+    so memory stays bounded no matter how long the document is. Workers open the
+    file themselves (an in-memory upload is first copied to a temporary file), so
+    the document is never copied into each worker.
+
+    Args:
+        source: An uploaded file, file-like object or path.
+        page_range (str): Optional 1-based selection, e.g. "1-20, 35".
+        parallel (bool): Force (True) or disable (False) the process pool. By default
+            it is used above PARALLEL_PAGE_THRESHOLD pages.
+
+    Raises:
+        PageRangeError: If `page_range` is invalid (see parse_page_range).
+    """
+    from PyPDF2 import PdfReader # Imported on first use: most app runs never parse a PDF
+
+    with _open_binary(source) as stream:
+        reader = PdfReader(stream) # Reads pages from the stream as they are extracted
+        page_indexes = parse_page_range(page_range, len(reader.pages))
+        if parallel is None:
+            parallel = len(page_indexes) > PARALLEL_PAGE_THRESHOLD and MAX_PDF_WORKERS > 1
+
+        if not parallel:
+            for i in page_indexes:
+                yield i + 1, reader.pages[i].extract_text() or ""
+            return
+
+        batches = [page_indexes[i:i + PAGES_PER_TASK] for i in range(0, len(page_indexes), PAGES_PER_TASK)]
+        with _file_on_disk(source, stream) as path, \
+                ProcessPoolExecutor(max_workers=MAX_PDF_WORKERS, initializer=_init_pdf_worker,
+                                    initargs=(path,)) as executor:
+            window = MAX_PDF_WORKERS * 2
+            in_flight = [executor.submit(_extract_pdf_pages, batch) for batch in batches[:window]]
+            next_batch = len(in_flight)
+            while in_flight:
+                for i, page_text in in_flight.pop(0).result():
+                    yield i + 1, page_text
+                if next_batch < len(batches):
+                    in_flight.append(executor.submit(_extract_pdf_pages, batches[next_batch]))
+                    next_batch += 1
+
+
+def _iter_docx_blocks(document):
+    """Yields the text of paragraphs and tables in the order they appear in the body."""
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+
+    for child in document.element.body.iterchildren():
+        tag = child.tag.rsplit("}", 1)[-1]
+        if tag == "p":
+            yield Paragraph(child, document).text
+        elif tag == "tbl":
+            for row in Table(child, document).rows:
+                cells = []
+                for cell in row.cells:
+                    # Merged cells are repeated by python-docx; keep one copy
+                    if not cells or cell.text != cells[-1]:
+                        cells.append(cell.text)
+                yield " | ".join(cells)
+
+
+def iter_docx_sections(source, chunk_chars: int = TEXT_CHUNK_CHARS):
+    """Yields the text of a DOCX file, including tables, in chunks of about `chunk_chars`."""
+    from docx import Document
+
+    if not isinstance(source, (str, os.PathLike)) and hasattr(source, "seek"):
+        source.seek(0)
+    document = Document(source)
+    parts = []
+    size = 0
+    for block in _iter_docx_blocks(document):
+        parts.append(block + "\n")
+        size += len(block) + 1
+        if size >= chunk_chars:
+            yield "".join(parts)
+            parts = []
+            size = 0
+    if parts:
+        yield "".join(parts)
+
+
+def iter_txt_chunks(source, encoding: str = "utf-8", chunk_chars: int = TEXT_CHUNK_CHARS):
+    """
+    Decodes a text file incrementally and yields it in chunks of about `chunk_chars`.
+
+    Multi-byte characters split across read boundaries are handled by an incremental
+    decoder, a UTF-8 byte order mark is dropped and undecodable bytes are replaced.
+    """
+    if encoding.lower().replace("_", "-") == "utf-8":
+        encoding = "utf-8-sig"
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    if isinstance(source, (str, os.PathLike)):
+        stream = open(source, "rb")
+    else:
+        stream = source
+        stream.seek(0)
+    try:
+        while True:
+            data = stream.read(chunk_chars)
+            if not data:
+                break
+            text = decoder.decode(data)
+            if text:
+                yield text
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+    finally:
+        if stream is not source:
+            stream.close()
+
+
+def iter_document_chunks(source, file_type: str, page_range: str = None):
+    """
+    Yields the text of a PDF, DOCX or TXT document chunk by chunk.
+
+    `file_type` may be a MIME type or a file name/extension. For PDFs each chunk is
+    one page and `page_range` selects the pages; it is ignored for other formats.
+    The extraction is timed and its bytes counted like the extract_text_* functions.
+
+    Raises:
+        PageRangeError: If `page_range` is invalid (see parse_page_range).
+        ValueError: If the file type is not supported.
+    """
+    file_type = (file_type or "").lower()
+    if "pdf" in file_type:
+        file_format = "pdf"
+        chunks = (page_text + "\n" for _, page_text in iter_pdf_pages(source, page_range))
+    elif "docx" in file_type or "wordprocessingml" in file_type:
+        file_format = "docx"
+        chunks = iter_docx_sections(source)
+    elif "text" in file_type or file_type.endswith(".txt") or file_type == "txt":
+        file_format = "txt"
+        chunks = iter_txt_chunks(source)
+    else:
+        raise ValueError(f"Unsupported file type: {file_type}")
+
+    text_bytes = 0
+    with metrics.timer("extract", format=file_format):
+        for chunk in chunks:
+            text_bytes += len(chunk.encode("utf-8"))
+            yield chunk
+    _record_extraction(file_format, source, text_bytes)
+
+
+def extract_text_from_pdf(file_bytes_io: io.BytesIO, page_range: str = None) -> str:
     """Extracts text from a PDF file."""
     text = ""
     try:
-        reader = PdfReader(file_bytes_io)
-        for page in reader.pages:
-            text += page.extract_text() or ""
+        with metrics.timer("extract", format="pdf"):
+            text = "".join(page_text + "\n" for _, page_text in iter_pdf_pages(file_bytes_io, page_range))
+    except PageRangeError as e:
+        notify.error(f"Invalid page selection: {e}")
     except Exception as e:
-        st.error(f"Error reading PDF: {e}")
+        notify.error(f"Error reading PDF: {e}")
         print(f"Error reading PDF: {e}") # For console debugging
+    _record_extraction("pdf", file_bytes_io, len(text.encode("utf-8")))
     return text
 
 def extract_text_from_docx(file_bytes_io: io.BytesIO) -> str:
-    """Extracts text from a DOCX file."""
+    """Extracts text (paragraphs and tables) from a DOCX file."""
     text = ""
     try:
-        document = Document(file_bytes_io)
-        for paragraph in document.paragraphs:
-            text += paragraph.text + "\n"
+        with metrics.timer("extract", format="docx"):
+            text = "".join(iter_docx_sections(file_bytes_io))
     except Exception as e:
-        st.error(f"Error reading DOCX: {e}")
+        notify.error(f"Error reading DOCX: {e}")
         print(f"Error reading DOCX: {e}") # For console debugging
+    _record_extraction("docx", file_bytes_io, len(text.encode("utf-8")))
     return text
 
-# Note: For .txt files, Streamlit's file_uploader.read().decode('utf-8') is often sufficient
-# and can be handled directly in app.py or a simple wrapper function here.
-# For now, it's handled in app.py directly for simplicity.
+def extract_text_from_txt(file_bytes_io: io.BytesIO, encoding: str = "utf-8") -> str:
+    """Extracts text from a TXT file, decoding it incrementally."""
+    text = ""
+    try:
+        with metrics.timer("extract", format="txt"):
+            text = "".join(iter_txt_chunks(file_bytes_io, encoding))
+    except Exception as e:
+        notify.error(f"Error reading TXT: {e}")
+        print(f"Error reading TXT: {e}") # For console debugging
+    _record_extraction("txt", file_bytes_io, len(text.encode("utf-8")))
+    return text
@@ -0,0 +1,197 @@
+# utils/job_queue.py
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.llm_client import current_session, session_scope
+from utils.metrics import metrics
+from utils.notify import capture_messages
+
+# --- Job queue settings ---
+# Generation runs as background jobs on a process-wide worker pool, so a slow call no
+# longer blocks the user's script thread and survives navigating to another tab.
+JOB_WORKERS = int(os.getenv("QUIZGENIUS_JOB_WORKERS", "4"))
+MAX_ACTIVE_JOBS = int(os.getenv("QUIZGENIUS_MAX_JOBS", "16")) # Queued plus running, across every session
+JOB_RETENTION = 3600 # Seconds a finished job is kept for its session to collect
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobQueueFull(RuntimeError):
+    """Raised when a job is submitted while MAX_ACTIVE_JOBS jobs are already queued or running."""
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function (by Job.check_cancelled) to stop a cancelled job early."""
+
+
+class Job:
+    """
+    One background task: its status, progress and result, as seen from any thread.
+
+    The job function receives the Job and uses report() for progress, add_partial()
+    for results worth showing before it finishes, and check_cancelled() or
+    cancel_requested to stop early when the user cancels.
+    """
+
+    def __init__(self, session: str, label: str):
+        self.id = uuid.uuid4().hex
+        self.session = session
+        self.label = label
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = "Waiting for a free worker..."
+        self.result = None
+        self.error = None
+        self.messages = [] # (level, message) pairs raised while the job ran
+        self.partial = [] # Results available before the job finishes
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._future = None
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def report(self, progress: float = None, message: str = None):
+        """Updates the progress (0 to 1) and/or the status message shown to the user."""
+        if progress is not None:
+            self.progress = min(1.0, max(0.0, progress))
+        if message is not None:
+            self.message = message
+
+    def add_partial(self, item):
+        with self._lock:
+            self.partial.append(item)
+
+    def add_message(self, level: str, message: str):
+        with self._lock:
+            self.messages.append((level, message))
+
+    def partial_snapshot(self) -> list:
+        with self._lock:
+            return list(self.partial)
+
+    def messages_snapshot(self) -> list:
+        with self._lock:
+            return list(self.messages)
+
+
+class JobQueue:
+    """
+    A process-wide pool of worker threads running Jobs.
+
+    At most `max_active` jobs may be queued or running at once across all sessions;
+    submitting more raises JobQueueFull. Finished jobs are kept for JOB_RETENTION seconds.
+    """
+
+    def __init__(self, max_workers: int = JOB_WORKERS, max_active: int = MAX_ACTIVE_JOBS):
+        self.max_workers = max(1, max_workers)
+        self.max_active = max(1, max_active)
+        self._executor = None # Created on the first submit
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, label: str, fn, *args, session: str = None, **kwargs) -> Job:
+        """
+        Queues fn(job, *args, **kwargs) to run in the background and returns its Job.
+        The function's return value becomes job.result.
+        """
+        with self._lock:
+            self._prune()
+            active = sum(1 for job in self._jobs.values() if not job.is_finished)
+            if active >= self.max_active:
+                raise JobQueueFull(f"The server is busy with {active} generation jobs. Please try again shortly.")
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="quizgenius-job")
+            job = Job(session or current_session(), label)
+            self._jobs[job.id] = job
+            job._future = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job: Job, fn, args, kwargs):
+        if job.cancel_requested:
+            job.status, job.finished = CANCELLED, time.time()
+            return
+        job.status, job.started = RUNNING, time.time()
+        job.message = "Running..."
+        try:
+            # Model calls are queued under the submitting session; messages are kept on the job
+            with session_scope(job.session), capture_messages(job.add_message):
+                result = fn(job, *args, **kwargs)
+            job.check_cancelled()
+            job.result = result
+            job.progress = 1.0
+            status = DONE
+        except JobCancelled:
+            status = CANCELLED
+        except Exception as e:
+            job.error = str(e)
+            status = FAILED
+            print(f"Job '{job.label}' ({job.id}) failed: {e}") # For developer debugging
+        job.finished = time.time()
+        job.status = status # Set last: other threads treat the job as finished from here on
+
+    def _prune(self):
+        """Forgets finished jobs older than JOB_RETENTION; called with the lock held."""
+        cutoff = time.time() - JOB_RETENTION
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.is_finished and job.finished < cutoff]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Job:
+        """Returns the job with this ID, or None if it is unknown or has been forgotten."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs_for(self, session: str) -> list:
+        """Returns a session's jobs, oldest first."""
+        with self._lock:
+            return sorted((job for job in self._jobs.values() if job.session == session), key=lambda job: job.created)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Asks a job to stop. A queued job is cancelled straight away; a running one stops
+        at its next cancellation check. Returns False if the job is unknown or finished.
+        """
+        job = self.get(job_id)
+        if job is None or job.is_finished:
+            return False
+        job._cancel.set()
+        job.message = "Cancelling..."
+        if job._future is not None and job._future.cancel():
+            job.status, job.finished = CANCELLED, time.time()
+        return True
+
+    def active_count(self) -> int:
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.is_finished)
+
+    def stats(self) -> dict:
+        """Returns the number of jobs kept in each state."""
+        with self._lock:
+            counts = dict.fromkeys((QUEUED, RUNNING) + FINISHED_STATES, 0)
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return counts
+
+
+job_queue = JobQueue()
+metrics.register_source("jobs", job_queue.stats)
@@ -0,0 +1,100 @@
+# utils/json_stream.py
+import json
+import re
+
+# Only these characters can change the parser state; everything else is skipped in bulk
+_STRUCTURAL_CHARS = re.compile(r'[\[\]{}"\\]')
+# Trailing commas before a closing bracket are the most common defect in model-written JSON
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+class IncrementalJSONArrayParser:
+    """
+    Extracts the objects of a JSON array from text that arrives in fragments.
+
+    Feed it the model's output piece by piece; every time an element object of the
+    top-level array is closed it is decoded and returned. Text before the opening
+    bracket (such as a ```json fence) is ignored, and only the currently open object
+    is buffered, so memory stays bounded by the size of one object.
+    """
+
+    def __init__(self):
+        self._pending = ""  # Text of the object currently being received
+        self._depth = 0  # Nesting depth inside the current array element
+        self._in_string = False
+        self._escape_at = -1  # Position (in the pending buffer) of an escaped character
+        self.in_array = False
+        self.found_array = False  # True once the opening '[' has been seen
+        self.finished = False  # True once the closing ']' has been seen
+        self.errors = []  # Raw text of elements that were complete but not valid JSON
+        self.repaired = 0  # Elements that only decoded after repairing small defects
+
+    def feed(self, fragment: str) -> list:
+        """Consumes the next fragment and returns the objects completed by it."""
+        buffer = self._pending + fragment
+        object_start = 0 if self._depth > 0 else None
+        objects = []
+
+        for match in _STRUCTURAL_CHARS.finditer(buffer, len(self._pending)):
+            pos = match.start()
+            if pos == self._escape_at:
+                continue
+            char = match.group()
+
+            if self._in_string:
+                if char == "\\":
+                    self._escape_at = pos + 1
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+                    object_start = pos
+                elif char == "[" and not self.in_array and not self.finished:
+                    self.in_array = True
+                    self.found_array = True
+                elif char == "]" and self.in_array:
+                    self.in_array = False
+                    self.finished = True
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._decode(buffer[object_start:pos + 1], objects)
+                    object_start = None
+
+        if self._depth > 0:
+            self._pending = buffer[object_start:]
+            self._escape_at -= object_start
+        else:
+            self._pending = ""
+            self._escape_at = -1
+        return objects
+
+    def _decode(self, raw: str, objects: list):
+        try:
+            objects.append(json.loads(raw))
+        except json.JSONDecodeError:
+            try:
+                objects.append(json.loads(_TRAILING_COMMA.sub(r"\1", raw), strict=False))
+                self.repaired += 1
+            except json.JSONDecodeError:
+                self.errors.append(raw)
+
+
+def salvage_json_objects(text: str) -> list:
+    """
+    Recovers every well-formed object from a partial or malformed JSON array.
+
+    Complete elements are kept even when the array is truncated, unterminated or
+    contains broken elements; only the broken or cut-off elements are lost.
+    """
+    parser = IncrementalJSONArrayParser()
+    return parser.feed(text)
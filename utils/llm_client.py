@@ -0,0 +1,510 @@
+# utils/llm_client.py
+import asyncio
+import contextvars
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from utils.metrics import metrics
+
+# --- Client settings ---
+# Every Gemini call in the process goes through one scheduler, so many concurrent
+# Streamlit sessions share the quota instead of racing each other into 429s.
+# A limit of 0 disables it.
+REQUESTS_PER_MINUTE = int(os.getenv("QUIZGENIUS_LLM_RPM", "60"))
+TOKENS_PER_MINUTE = int(os.getenv("QUIZGENIUS_LLM_TPM", "1000000"))
+MAX_CONCURRENT_REQUESTS = int(os.getenv("QUIZGENIUS_LLM_CONCURRENCY", "8"))
+REQUEST_TIMEOUT = float(os.getenv("QUIZGENIUS_LLM_TIMEOUT", "120")) # Seconds per call (between chunks when streaming)
+MAX_RETRIES = int(os.getenv("QUIZGENIUS_LLM_RETRIES", "4"))
+BACKOFF_BASE = 1.0 # Seconds; the backoff cap doubles with every attempt
+BACKOFF_MAX = 32.0
+
+CHARS_PER_TOKEN = 4 # Same rough estimate as utils.ai_generator.estimate_tokens
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_ERROR_NAMES = ("ResourceExhausted", "TooManyRequests", "RateLimit", "ServiceUnavailable",
+                         "DeadlineExceeded", "InternalServerError", "Timeout")
+
+
+def _estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def is_retryable(error: Exception) -> bool:
+    """True for errors worth retrying: rate limits, overloaded servers, timeouts and dropped connections."""
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if isinstance(code, int) and code in RETRYABLE_STATUS_CODES:
+        return True
+    if any(name in cls.__name__ for cls in type(error).__mro__ for name in RETRYABLE_ERROR_NAMES):
+        return True
+    # Client wrappers often re-raise the API error as a plain message
+    message = str(error).lower()
+    return "429" in message or "resource has been exhausted" in message or "quota" in message
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket refilled continuously at `per_minute` tokens per minute.
+
+    Callers reserve what they need and sleep for the returned delay. The bucket may go
+    into debt, so reservations are served in the order they were made and a request
+    larger than the bucket still goes through once the debt is paid off.
+    """
+
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Takes `amount` tokens and returns how many seconds to wait before using them."""
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+
+    def charge(self, amount: float):
+        """Takes tokens after the fact, e.g. for output tokens only known once a call returns."""
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+
+
+class _Waiter:
+    """One queued request for a slot, woken either as a thread or as an asyncio future."""
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+        self.granted = False
+
+    def wake(self) -> bool:
+        if self.event is not None:
+            self.event.set()
+            return True
+        try:
+            self.loop.call_soon_threadsafe(self._resolve)
+            return True
+        except RuntimeError: # The waiting event loop has already closed
+            return False
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class FairSlots:
+    """
+    A bounded concurrency limit that hands out free slots round-robin across sessions.
+
+    Each session has its own FIFO queue, and sessions take turns, so one session
+    queueing hundreds of bulk batches cannot starve another session's single request.
+    """
+
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max(1, max_concurrent)
+        self._queues = OrderedDict() # session -> deque of waiters, in round-robin order
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def _enqueue(self, session: str, waiter: _Waiter):
+        with self._lock:
+            self._queues.setdefault(session, deque()).append(waiter)
+            self._dispatch()
+
+    def _dispatch(self):
+        """Grants free slots to the next waiters in turn; called with the lock held."""
+        while self._running < self.max_concurrent and self._queues:
+            session, waiters = next(iter(self._queues.items()))
+            waiter = waiters.popleft()
+            if waiters:
+                self._queues.move_to_end(session) # The session waits for its next turn
+            else:
+                del self._queues[session]
+            if waiter.wake():
+                waiter.granted = True
+                self._running += 1
+
+    def acquire(self, session: str):
+        waiter = _Waiter()
+        self._enqueue(session, waiter)
+        waiter.event.wait()
+
+    async def aacquire(self, session: str):
+        waiter = _Waiter(asyncio.get_running_loop())
+        self._enqueue(session, waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                queued = self._queues.get(session)
+                if not waiter.granted and queued and waiter in queued:
+                    queued.remove(waiter)
+                    if not queued:
+                        del self._queues[session]
+            if waiter.granted:
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            self._running -= 1
+            self._dispatch()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"running": self._running,
+                    "queued": {session: len(waiters) for session, waiters in self._queues.items()}}
+
+
+class ClientStats:
+    """Process-wide counters describing how the scheduler shaped the LLM traffic."""
+
+    FIELDS = (
+        "calls",  # Calls made to the model, retries included
+        "retries",  # Calls repeated after a retryable error
+        "rate_limited",  # Calls rejected with a rate-limit (429) or overload error
+        "timeouts",  # Calls abandoned after REQUEST_TIMEOUT
+        "failures",  # Requests that failed after their last attempt
+        "queue_wait_s",  # Time spent waiting for a concurrency slot
+        "rate_wait_s",  # Time spent waiting on the request and token buckets
+        "backoff_wait_s",  # Time spent backing off between retries
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def record(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                self._counts[name] += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self):
+        with self._lock:
+            self._counts = dict.fromkeys(self.FIELDS, 0)
+
+
+_session_override = contextvars.ContextVar("llm_session", default=None)
+
+
+def current_session() -> str:
+    """The key requests are queued under: the Streamlit session, or else the thread."""
+    session = _session_override.get()
+    if session:
+        return session
+    ctx = None
+    if "streamlit" in sys.modules: # Without Streamlit loaded there is no script run to ask
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx else threading.current_thread().name
+
+
+@contextmanager
+def session_scope(session: str):
+    """Queues the calls made inside the block under `session`, e.g. from worker threads."""
+    token = _session_override.set(session)
+    try:
+        yield
+    finally:
+        _session_override.reset(token)
+
+
+class LLMScheduler:
+    """
+    Shares the model quota between every caller in the process.
+
+    A call waits for a concurrency slot (handed out fairly across sessions), then for
+    the request and token buckets, and runs with a timeout. Retryable errors (429s,
+    overloaded servers, timeouts) are retried with exponential backoff and full jitter;
+    the slot is given up while backing off.
+    """
+
+    def __init__(self, requests_per_minute: int = REQUESTS_PER_MINUTE, tokens_per_minute: int = TOKENS_PER_MINUTE,
+                 max_concurrent: int = MAX_CONCURRENT_REQUESTS, timeout: float = REQUEST_TIMEOUT,
+                 max_retries: int = MAX_RETRIES, backoff_base: float = BACKOFF_BASE,
+                 backoff_max: float = BACKOFF_MAX):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.slots = FairSlots(max_concurrent)
+        self.timeout = timeout
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats = ClientStats()
+
+    def _reserve(self, prompt_tokens: int) -> float:
+        delay = 0.0
+        if self.requests:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens:
+            delay = max(delay, self.tokens.reserve(prompt_tokens))
+        return delay
+
+    def _charge_output(self, output_tokens: int):
+        if self.tokens and output_tokens:
+            self.tokens.charge(output_tokens)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, honouring a server-supplied retry delay."""
+        retry_after = getattr(error, "retry_after", None)
+        if isinstance(retry_after, (int, float)) and retry_after > 0:
+            return min(self.backoff_max, retry_after) * random.uniform(1.0, 1.2)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _should_retry(self, attempt: int, error: Exception) -> bool:
+        if isinstance(error, (TimeoutError, asyncio.TimeoutError)):
+            self.stats.record(timeouts=1)
+        elif is_retryable(error):
+            self.stats.record(rate_limited=1)
+        if attempt < self.max_retries and is_retryable(error):
+            self.stats.record(retries=1)
+            print(f"LLM call failed ({error}); retrying.") # For developer debugging
+            return True
+        self.stats.record(failures=1)
+        return False
+
+    def _wait_for_rate(self, prompt_tokens: int) -> float:
+        """Waits for the request and token buckets; done before taking a slot, so waiting holds none."""
+        delay = self._reserve(prompt_tokens)
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    def _run_in_slot(self, call, session: str, on_start):
+        """
+        Runs a blocking call in a concurrency slot, with the timeout.
+
+        A blocking client call cannot be interrupted, so on timeout it is abandoned on its
+        daemon thread, which keeps the slot until the call really returns: abandoned
+        calls still count towards the concurrency limit.
+        """
+        self.slots.acquire(session)
+        on_start()
+        if not self.timeout:
+            try:
+                return call()
+            finally:
+                self.slots.release()
+        outcome = {}
+        lock = threading.Lock()
+
+        def target():
+            try:
+                outcome["result"] = call()
+            except BaseException as e:
+                outcome["error"] = e
+            finally:
+                with lock:
+                    outcome["finished"] = True
+                    abandoned = outcome.get("abandoned", False)
+                if abandoned:
+                    self.slots.release()
+
+        worker = threading.Thread(target=target, daemon=True)
+        worker.start()
+        worker.join(self.timeout)
+        with lock:
+            finished = outcome.get("finished", False)
+            outcome["abandoned"] = not finished
+        if not finished:
+            raise TimeoutError(f"The model did not answer within {self.timeout:g} seconds.")
+        self.slots.release()
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["result"]
+
+    def call(self, call, prompt_tokens: int = 0, output_tokens=None, session: str = None):
+        """
+        Runs a blocking model call under the scheduler.
+
+        Args:
+            call: Function making the call.
+            prompt_tokens (int): Estimated input tokens, reserved before the call.
+            output_tokens: Optional function returning the output tokens of a result,
+                charged to the token bucket afterwards.
+            session (str): Queue key; defaults to current_session().
+        """
+        session = session or current_session()
+        attempt = 0
+        while True:
+            delay = self._wait_for_rate(prompt_tokens)
+            started = time.perf_counter()
+            try:
+                result = self._run_in_slot(call, session, lambda: self._record_start(started, delay))
+            except Exception as e:
+                if not self._should_retry(attempt, e):
+                    raise
+                error = e
+            else:
+                self._charge_output(output_tokens(result) if output_tokens else 0)
+                return result
+            backoff = self._backoff(attempt, error)
+            self.stats.record(backoff_wait_s=backoff)
+            time.sleep(backoff)
+            attempt += 1
+
+    def _record_start(self, started: float, delay: float):
+        """Counts a call as it starts, with how long it queued for a slot and for the rate limits."""
+        self.stats.record(calls=1, queue_wait_s=time.perf_counter() - started, rate_wait_s=delay)
+
+    async def acall(self, call, prompt_tokens: int = 0, output_tokens=None, session: str = None):
+        """Async counterpart of call(); `call` returns a fresh coroutine on every attempt."""
+        session = session or current_session()
+        attempt = 0
+        while True:
+            delay = self._reserve(prompt_tokens)
+            if delay:
+                await asyncio.sleep(delay)
+            started = time.perf_counter()
+            await self.slots.aacquire(session)
+            try:
+                self._record_start(started, delay)
+                # Unlike a blocking call, a timed-out coroutine is cancelled, so its slot is free again
+                result = await asyncio.wait_for(call(), self.timeout or None)
+            except Exception as e:
+                if not self._should_retry(attempt, e):
+                    raise
+                error = e
+            else:
+                self._charge_output(output_tokens(result) if output_tokens else 0)
+                return result
+            finally:
+                self.slots.release()
+            backoff = self._backoff(attempt, error)
+            self.stats.record(backoff_wait_s=backoff)
+            await asyncio.sleep(backoff)
+            attempt += 1
+
+    def stream(self, start_stream, prompt_tokens: int = 0, output_tokens=None, session: str = None):
+        """
+        Runs a streaming model call under the scheduler, yielding its chunks.
+
+        The slot is held until the stream ends. The timeout applies to the wait for each
+        chunk. A retryable error is only retried if no chunk has been yielded yet.
+        """
+        session = session or current_session()
+        attempt = 0
+        while True:
+            delay = self._wait_for_rate(prompt_tokens)
+            started = time.perf_counter()
+            yielded = False
+            produced = []
+            chunks = self._stream_in_slot(start_stream, session, lambda: self._record_start(started, delay))
+            try:
+                for chunk in chunks:
+                    yielded = True
+                    produced.append(chunk)
+                    yield chunk
+            except Exception as e:
+                if yielded or not self._should_retry(attempt, e):
+                    if yielded:
+                        self.stats.record(failures=1)
+                    raise
+                error = e
+            else:
+                self._charge_output(sum(output_tokens(chunk) for chunk in produced) if output_tokens else 0)
+                return
+            finally:
+                chunks.close()
+            backoff = self._backoff(attempt, error)
+            self.stats.record(backoff_wait_s=backoff)
+            time.sleep(backoff)
+            attempt += 1
+
+    def _stream_in_slot(self, start_stream, session: str, on_start):
+        """
+        Streams a call in a concurrency slot. With a timeout, the stream is read on a
+        daemon thread; when the consumer gives up, that thread keeps the slot until the
+        client's stream has actually ended.
+        """
+        self.slots.acquire(session)
+        on_start()
+        if not self.timeout:
+            try:
+                yield from start_stream()
+            finally:
+                self.slots.release()
+            return
+        chunks = queue.Queue()
+        stop = threading.Event()
+        lock = threading.Lock()
+        state = {"finished": False, "abandoned": False}
+        done = object()
+
+        def produce():
+            try:
+                for chunk in start_stream():
+                    if stop.is_set():
+                        break
+                    chunks.put(chunk)
+            except BaseException as e:
+                chunks.put(e)
+            finally:
+                chunks.put(done)
+                with lock:
+                    state["finished"] = True
+                    abandoned = state["abandoned"]
+                if abandoned:
+                    self.slots.release()
+
+        threading.Thread(target=produce, daemon=True).start()
+        try:
+            while True:
+                try:
+                    item = chunks.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"The model stopped streaming for {self.timeout:g} seconds.") from None
+                if item is done:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set() # Lets the producer finish early when the consumer stops reading
+            with lock:
+                finished = state["finished"]
+                state["abandoned"] = not finished
+            if finished:
+                self.slots.release()
+
+
+scheduler = LLMScheduler()
+
+
+def _scheduler_metrics() -> dict:
+    slots = scheduler.slots.snapshot()
+    return dict(scheduler.stats.snapshot(), running=slots["running"], queued=sum(slots["queued"].values()))
+
+
+metrics.register_source("llm_client", _scheduler_metrics)
+
+
+def scheduled(model, client: LLMScheduler = None):
+    """
+    Routes a chat model through a scheduler (the process-wide one by default).
+    Returns a utils.scheduled_model.ScheduledChatModel.
+    """
+    from utils.scheduled_model import ScheduledChatModel # Keeps langchain out of the import of this module
+
+    if isinstance(model, ScheduledChatModel):
+        return model
+    return ScheduledChatModel(inner=model, client=client)
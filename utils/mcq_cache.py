@@ -0,0 +1,156 @@
+# utils/mcq_cache.py
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from utils.metrics import metrics
+
+# Defaults can be overridden through the environment (e.g. in .env)
+CACHE_PATH = os.getenv("QUIZGENIUS_CACHE_PATH", ".quizgenius_cache.sqlite3")
+CACHE_MAX_ENTRIES = int(os.getenv("QUIZGENIUS_CACHE_MAX_ENTRIES", "2000"))
+CACHE_MAX_BYTES = int(os.getenv("QUIZGENIUS_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+CACHE_TTL_SECONDS = int(os.getenv("QUIZGENIUS_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace so formatting-only edits map to the same cache entry."""
+    return " ".join((text or "").split())
+
+
+def make_cache_key(text: str, num_questions: int, difficulty: str, category: str,
+                   template: str, model_name: str) -> str:
+    """
+    Builds a content-addressed key for an MCQ generation request.
+
+    The key is a SHA-256 over the normalized text, the generation parameters, the
+    prompt template and the model name, so changing any of them misses the cache.
+    """
+    payload = json.dumps({
+        "text": normalize_text(text),
+        "num_questions": int(num_questions),
+        "difficulty": difficulty,
+        "category": category,
+        "template": template,
+        "model": model_name,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MCQCache:
+    """
+    A persistent, disk-backed LRU cache of generated MCQ lists.
+
+    Entries live in a single SQLite file. Reads refresh an entry's last-access time;
+    writes evict expired entries (older than `ttl_seconds`) and then the least recently
+    used ones until both `max_entries` and `max_bytes` are respected.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES,
+                 max_bytes: int = CACHE_MAX_BYTES, ttl_seconds: int = CACHE_TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """Yields a connection inside a transaction and closes it afterwards."""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            if not self._initialized:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS mcq_cache ("
+                    " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                    " created_at REAL NOT NULL, last_access REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_mcq_cache_last_access ON mcq_cache(last_access)")
+                self._initialized = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str):
+        """Returns the cached MCQ list for a key, or None on a miss or expired entry."""
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                row = conn.execute("SELECT value, created_at FROM mcq_cache WHERE key = ?", (key,)).fetchone()
+                if row is None or (self.ttl_seconds and now - row[1] > self.ttl_seconds):
+                    self.misses += 1
+                    return None
+                conn.execute("UPDATE mcq_cache SET last_access = ? WHERE key = ?", (now, key))
+                self.hits += 1
+                return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            print(f"MCQ cache read failed: {e}") # For developer debugging
+            self.misses += 1
+            return None
+
+    def set(self, key: str, mcqs: list):
+        """Stores an MCQ list under a key and applies TTL/LRU eviction."""
+        value = json.dumps(mcqs)
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO mcq_cache (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), now, now)
+                )
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            print(f"MCQ cache write failed: {e}") # For developer debugging
+
+    def _evict(self, conn, now: float):
+        if self.ttl_seconds:
+            conn.execute("DELETE FROM mcq_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        count, total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM mcq_cache").fetchone()
+        if count <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+        # Walk from least to most recently used until both limits are met
+        to_delete = []
+        for key, size in conn.execute("SELECT key, size FROM mcq_cache ORDER BY last_access ASC"):
+            if count <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            to_delete.append((key,))
+            count -= 1
+            total_bytes -= size
+        conn.executemany("DELETE FROM mcq_cache WHERE key = ?", to_delete)
+
+    def clear(self):
+        """Removes every cached entry and resets the counters."""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM mcq_cache")
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters together with the current size of the cache."""
+        try:
+            with self._lock, self._connect() as conn:
+                entries, total_bytes = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM mcq_cache"
+                ).fetchone()
+        except sqlite3.Error:
+            entries, total_bytes = 0, 0
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": total_bytes,
+        }
+
+
+# Process-wide cache shared by all Streamlit sessions
+mcq_cache = MCQCache()
+metrics.register_source("mcq_cache", mcq_cache.stats)
@@ -0,0 +1,251 @@
+# utils/metrics.py
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# --- Metrics settings ---
+# If set, the metrics are written to this file every METRICS_FILE_INTERVAL seconds:
+# Prometheus text format (e.g. for node_exporter's textfile collector), or JSON when
+# the name ends in .json
+METRICS_FILE = os.getenv("QUIZGENIUS_METRICS_FILE")
+METRICS_FILE_INTERVAL = float(os.getenv("QUIZGENIUS_METRICS_INTERVAL", "15"))
+
+PREFIX = "quizgenius"
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+FRACTION_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# name -> (type, help, buckets); every metric recorded must be declared here
+DEFINITIONS = {
+    "stage_seconds": ("histogram", "Time spent in each pipeline stage.", SECONDS_BUCKETS),
+    "stage_errors_total": ("counter", "Errors raised in each pipeline stage.", None),
+    "llm_call_tokens": ("histogram", "Estimated tokens per model call, by direction (input/output).", TOKEN_BUCKETS),
+    "bytes_total": ("counter", "Bytes read (in) and produced (out) by each stage.", None),
+    "questions_total": ("counter", "Generated questions by outcome (accepted or the reason they were rejected).", None),
+    "saved_questions_total": ("counter", "Questions screened when saving sets: unique, flagged or dropped as near-duplicates.", None),
+    "passage_kept_fraction": ("histogram", "Fraction of the document text kept by passage selection.", FRACTION_BUCKETS),
+    "salvaged_objects": ("histogram", "Questions recovered from each malformed model response.", COUNT_BUCKETS),
+    "bank_questions_total": ("counter", "Questions moved by bank import and export, by direction (imported/exported).", None),
+}
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(label_key: tuple, extra: tuple = ()) -> str:
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # The last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimates a quantile by interpolating within its bucket, like Prometheus' histogram_quantile."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets): # +Inf bucket: the best estimate is its lower bound
+                    return lower
+                return lower + (self.buckets[i] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters and histograms, labelled like Prometheus metrics.
+
+    Components that already keep their own counters (caches, the LLM client, repair
+    stats) register a source instead; its snapshot is exported as gauges.
+    """
+
+    def __init__(self):
+        self._counters = {} # (name, label_key) -> value
+        self._histograms = {} # (name, label_key) -> _Histogram
+        self._sources = {} # name -> function returning {field: number}
+        self._lock = threading.Lock()
+
+    def count(self, name: str, value: float = 1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(DEFINITIONS[name][2])
+            histogram.observe(value)
+
+    def error(self, stage: str, **labels):
+        """Counts an error a stage handled itself (one that did not escape its timer)."""
+        self.count("stage_errors_total", stage=stage, **labels)
+
+    @contextmanager
+    def timer(self, stage: str, **labels):
+        """Times the block into stage_seconds; an exception escaping it also counts in stage_errors_total."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.error(stage, **labels)
+            raise
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, stage=stage, **labels)
+
+    def register_source(self, name: str, snapshot):
+        """Exports the numeric fields of snapshot() as gauges named <name>_<field>."""
+        self._sources[name] = snapshot
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def _source_values(self) -> dict:
+        values = {}
+        for name, snapshot in list(self._sources.items()):
+            try:
+                fields = snapshot()
+            except Exception as e:
+                print(f"Metrics source '{name}' failed: {e}") # For developer debugging
+                continue
+            values[name] = {field: value for field, value in fields.items()
+                            if isinstance(value, (int, float)) and not isinstance(value, bool)}
+        return values
+
+    def snapshot(self) -> dict:
+        """All metrics as plain data, with p50/p95/p99 estimates for the histograms."""
+        with self._lock:
+            counters = [{"name": name, "labels": dict(label_key), "value": value}
+                        for (name, label_key), value in sorted(self._counters.items())]
+            histograms = []
+            for (name, label_key), histogram in sorted(self._histograms.items()):
+                histograms.append({
+                    "name": name,
+                    "labels": dict(label_key),
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "mean": histogram.sum / histogram.count if histogram.count else 0.0,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99),
+                    "buckets": dict(zip([str(b) for b in histogram.buckets] + ["+Inf"], histogram.counts)),
+                })
+        return {"timestamp": time.time(), "counters": counters, "histograms": histograms,
+                "sources": self._source_values()}
+
+    def stage_summary(self) -> list:
+        """One row per timed stage and label set: calls, errors, and mean/p50/p95 latency in milliseconds."""
+        with self._lock:
+            errors = {label_key: value for (name, label_key), value in self._counters.items()
+                      if name == "stage_errors_total"}
+            rows = []
+            for (name, label_key), histogram in sorted(self._histograms.items()):
+                if name != "stage_seconds":
+                    continue
+                labels = dict(label_key)
+                rows.append({
+                    "stage": labels.pop("stage"),
+                    "labels": ", ".join(f"{key}={value}" for key, value in labels.items()),
+                    "calls": histogram.count,
+                    "errors": int(errors.get(label_key, 0)),
+                    "mean_ms": round(histogram.sum / histogram.count * 1000, 1),
+                    "p50_ms": round(histogram.quantile(0.5) * 1000, 1),
+                    "p95_ms": round(histogram.quantile(0.95) * 1000, 1),
+                })
+        return rows
+
+    def render_prometheus(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, (list(h.counts), h.sum, h.count, h.buckets)) for key, h in self._histograms.items())
+        declared = set()
+
+        def declare(name, metric_type, help_text):
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+                lines.append(f"# TYPE {PREFIX}_{name} {metric_type}")
+
+        for (name, label_key), value in counters:
+            metric_type, help_text, _ = DEFINITIONS[name]
+            declare(name, metric_type, help_text)
+            lines.append(f"{PREFIX}_{name}{_format_labels(label_key)} {value:g}")
+        for (name, label_key), (counts, total, count, buckets) in histograms:
+            metric_type, help_text, _ = DEFINITIONS[name]
+            declare(name, metric_type, help_text)
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += bucket_count
+                lines.append(f"{PREFIX}_{name}_bucket{_format_labels(label_key, (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{PREFIX}_{name}_sum{_format_labels(label_key)} {total:g}")
+            lines.append(f"{PREFIX}_{name}_count{_format_labels(label_key)} {count}")
+        for source, fields in sorted(self._source_values().items()):
+            for field, value in sorted(fields.items()):
+                declare(f"{source}_{field}", "gauge", f"{field} reported by {source}.")
+                lines.append(f"{PREFIX}_{source}_{field} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """Writes the metrics to a file atomically: JSON if the name ends in .json, else Prometheus text."""
+        content = json.dumps(self.snapshot(), indent=2) if path.endswith(".json") else self.render_prometheus()
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+
+metrics = MetricsRegistry()
+
+_writer_started = False
+_writer_lock = threading.Lock()
+
+
+def start_metrics_file_writer(path: str = METRICS_FILE, interval: float = METRICS_FILE_INTERVAL) -> bool:
+    """Starts (once per process) a daemon thread writing the metrics to `path` every `interval` seconds."""
+    global _writer_started
+    if not path:
+        return False
+    with _writer_lock:
+        if _writer_started:
+            return True
+        _writer_started = True
+
+    def write_periodically():
+        while True:
+            try:
+                metrics.write(path)
+            except OSError as e:
+                print(f"Writing metrics to {path} failed: {e}") # For developer debugging
+            time.sleep(interval)
+
+    threading.Thread(target=write_periodically, name="quizgenius-metrics", daemon=True).start()
+    return True
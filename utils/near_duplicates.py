@@ -0,0 +1,327 @@
+# utils/near_duplicates.py
+import os
+
+import numpy as np
+
+# Questions whose estimated Jaccard similarity (over the words and word pairs of the
+# question and its options) reaches this value are treated as near-duplicates
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("QUIZGENIUS_DUPLICATE_THRESHOLD", "0.7"))
+NUM_PERM = 64 # MinHash values per signature
+MAX_BUCKET_CANDIDATES = 64 # Candidates taken from any one LSH bucket per query
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_WORD_BASE = np.uint64(1099511628211)
+_EMPTY = np.iinfo(np.uint32).max
+# Bytes that belong to a word: ASCII letters and digits, "|" (the options separator)
+# and every byte of a multi-byte UTF-8 character
+_WORD_BYTES = np.zeros(256, dtype=bool)
+_WORD_BYTES[[ord(c) for c in "abcdefghijklmnopqrstuvwxyz0123456789|"]] = True
+_WORD_BYTES[128:] = True
+
+
+def question_text(mcq: dict) -> str:
+    """The question followed by its options in sorted order, so option order does not matter."""
+    options = sorted(str(opt) for opt in mcq.get("options", []))
+    return f"{mcq.get('question', '')} | {' '.join(options)}".replace("\n", " ")
+
+
+def _word_hashes(mcqs: list) -> tuple:
+    """
+    Hashes every word of every question in one vectorized pass over the UTF-8 bytes.
+
+    Returns:
+        tuple: (hashes, owner) where owner[i] is the index of the question of word i.
+    """
+    text = "\n".join(question_text(mcq) for mcq in mcqs).lower()
+    data = np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+    owner_of_byte = np.concatenate(([0], np.cumsum(data == 10)[:-1]))
+    in_word = _WORD_BYTES[data]
+    is_start = in_word & ~np.concatenate(([False], in_word[:-1]))
+    word_starts = np.flatnonzero(is_start)
+    word_bytes = np.flatnonzero(in_word)
+    word_of_byte = np.cumsum(is_start)[word_bytes] - 1
+    # Polynomial hash of each word (mod 2**64), summed per word with reduceat
+    offset = word_bytes - word_starts[word_of_byte]
+    powers = np.cumprod(np.full(offset.max() + 1, _WORD_BASE, dtype=np.uint64)) if len(offset) else np.ones(1, np.uint64)
+    terms = (data[word_bytes].astype(np.uint64) + np.uint64(1)) * powers[offset]
+    first_byte = np.flatnonzero(offset == 0)
+    hashes = np.add.reduceat(terms, first_byte) if len(terms) else np.empty(0, np.uint64)
+    return hashes, owner_of_byte[word_starts]
+
+
+def minhash_signatures(mcqs: list) -> np.ndarray:
+    """
+    Computes the MinHash signatures of many questions at once.
+
+    The shingles of a question are its words and pairs of adjacent words (see
+    question_text). Signatures use one-permutation hashing: each shingle is hashed
+    once, the top bits pick one of NUM_PERM bins and the bin keeps the smallest value;
+    empty bins borrow from the next non-empty bin (rotation densification). Everything
+    runs as a handful of NumPy passes over all the questions together.
+
+    Returns:
+        np.ndarray: A (len(mcqs), NUM_PERM) uint32 array.
+    """
+    if not mcqs:
+        return np.empty((0, NUM_PERM), dtype=np.uint32)
+    hashes, owner = _word_hashes(mcqs)
+
+    # Word pairs never span two questions
+    same_question = owner[1:] == owner[:-1]
+    pairs = (hashes[:-1][same_question] * _GOLDEN) ^ hashes[1:][same_question]
+    shingles = np.concatenate((hashes, pairs)) * _GOLDEN
+    owner = np.concatenate((owner, owner[:-1][same_question]))
+
+    bins = (shingles >> np.uint64(58)).astype(np.int64) # NUM_PERM = 2**6 bins
+    values = ((shingles >> np.uint64(16)) & np.uint64(_EMPTY - 1)).astype(np.uint32)
+    signatures = np.full(len(mcqs) * NUM_PERM, _EMPTY, dtype=np.uint32)
+    np.minimum.at(signatures, owner * NUM_PERM + bins, values)
+    signatures = signatures.reshape(len(mcqs), NUM_PERM)
+
+    # Rotation densification: an empty bin takes the next non-empty bin's value, offset by the distance
+    empty = signatures == _EMPTY
+    if empty.any():
+        doubled = np.concatenate((signatures, signatures), axis=1)
+        positions = np.where(doubled != _EMPTY, np.arange(2 * NUM_PERM), 2 * NUM_PERM - 1)
+        source = np.minimum.accumulate(positions[:, ::-1], axis=1)[:, ::-1][:, :NUM_PERM]
+        borrowed = doubled[np.arange(len(mcqs))[:, None], source]
+        distance = (source - np.arange(NUM_PERM)).astype(np.uint32)
+        signatures = np.where(empty, borrowed + distance * np.uint32(0x9E3779B1), signatures)
+    return signatures
+
+
+def _lsh_bands(threshold: float, num_perm: int) -> tuple:
+    """
+    Picks (bands, rows) so that pairs somewhat below the threshold still share a band.
+
+    A pair with similarity s collides in at least one band with probability
+    1 - (1 - s**rows)**bands, which rises steeply around (1 / bands) ** (1 / rows).
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if (1 / bands) ** (1 / rows) <= threshold - 0.05:
+            best = (bands, rows)
+    return best
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index that finds near-duplicate questions without pairwise comparison.
+
+    Each signature is cut into bands; questions sharing any band hash are candidates,
+    and candidates are confirmed by the similarity estimated from their signatures.
+    Band hashes are kept in per-band sorted arrays (binary search) plus a short
+    unsorted tail for recent additions that is merged in from time to time, so memory
+    stays at a few hundred bytes per question (the 256-byte signature plus its band
+    hashes) even for 100k+ questions.
+    """
+
+    def __init__(self, threshold: float = NEAR_DUPLICATE_THRESHOLD, num_perm: int = NUM_PERM):
+        if num_perm != NUM_PERM:
+            raise ValueError(f"Signatures are computed with {NUM_PERM} permutations.")
+        self.threshold = threshold
+        self.bands, self.rows = _lsh_bands(threshold, num_perm)
+        self._keys = [] # Row -> key, or None once removed
+        self._rows = {} # Key -> row
+        self._signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self._band_hashes = np.empty((0, self.bands), dtype=np.uint64)
+        self._live = np.empty(0, dtype=bool) # False for removed rows
+        self._size = 0
+        self._sorted = [] # Per band: (sorted hashes, rows) covering the first _indexed rows
+        self._indexed = 0
+        self._removed = 0
+        self._version = 0 # Bumped by every change to the rows, so caches over them can tell they are stale
+        self._tail_cache = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, key) -> bool:
+        return key in self._rows
+
+    def _hash_bands(self, signatures: np.ndarray) -> np.ndarray:
+        banded = signatures[:, :self.bands * self.rows].astype(np.uint64).reshape(len(signatures), self.bands, self.rows)
+        hashes = np.zeros((len(signatures), self.bands), dtype=np.uint64)
+        for r in range(self.rows):
+            hashes = (hashes ^ banded[:, :, r]) * _GOLDEN
+        return hashes
+
+    def _grow(self, extra: int):
+        capacity = len(self._signatures)
+        if self._size + extra <= capacity:
+            return
+        capacity = max(self._size + extra, capacity * 2, 1024)
+        signatures = np.empty((capacity, self._signatures.shape[1]), dtype=np.uint32)
+        signatures[:self._size] = self._signatures[:self._size]
+        band_hashes = np.empty((capacity, self.bands), dtype=np.uint64)
+        band_hashes[:self._size] = self._band_hashes[:self._size]
+        live = np.zeros(capacity, dtype=bool)
+        live[:self._size] = self._live[:self._size]
+        self._signatures, self._band_hashes, self._live = signatures, band_hashes, live
+
+    def _reindex(self):
+        """Sorts every band column; called when the unsorted tail grows too long."""
+        rows = np.flatnonzero(self._live[:self._size])
+        self._sorted = []
+        for band in range(self.bands):
+            column = self._band_hashes[rows, band]
+            order = np.argsort(column, kind="stable")
+            self._sorted.append((column[order], rows[order]))
+        self._indexed = self._size
+        self._version += 1
+
+    def add_signatures(self, keys: list, signatures: np.ndarray):
+        """Adds precomputed signatures (see minhash_signatures) under the given keys."""
+        for key in keys:
+            if key in self._rows:
+                self.remove(key)
+        self._grow(len(keys))
+        end = self._size + len(keys)
+        self._signatures[self._size:end] = signatures
+        self._band_hashes[self._size:end] = self._hash_bands(signatures)
+        self._live[self._size:end] = True
+        for i, key in enumerate(keys):
+            self._rows[key] = self._size + i
+        self._keys.extend(keys)
+        self._size = end
+        self._version += 1
+        if self._size - self._indexed > max(1024, self._indexed // 8):
+            self._reindex()
+
+    def add(self, key, mcq: dict):
+        self.add_signatures([key], minhash_signatures([mcq]))
+
+    def add_many(self, items: list):
+        """Adds (key, mcq) pairs, computing all their signatures in one batch."""
+        if items:
+            keys, mcqs = zip(*items)
+            self.add_signatures(list(keys), minhash_signatures(list(mcqs)))
+
+    def remove(self, key):
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        self._keys[row] = None
+        self._live[row] = False
+        self._removed += 1
+        self._version += 1
+        if self._removed > max(1024, len(self._rows)):
+            self._compact()
+
+    def _compact(self):
+        """Drops removed rows from the arrays."""
+        rows = np.array([row for row in self._rows.values()], dtype=np.int64)
+        rows.sort()
+        keys = [self._keys[row] for row in rows]
+        self._signatures = self._signatures[rows]
+        self._band_hashes = self._band_hashes[rows]
+        self._live = np.ones(len(rows), dtype=bool)
+        self._keys = keys
+        self._rows = {key: i for i, key in enumerate(keys)}
+        self._size = len(keys)
+        self._removed = 0
+        self._reindex()
+
+    def _tail_segments(self) -> list:
+        """Per-band sorted view of the rows added since the last reindex (cached until the index changes)."""
+        if self._tail_cache is None or self._tail_cache[0] != self._version:
+            rows = np.arange(self._indexed, self._size)
+            segments = []
+            for band in range(self.bands):
+                column = self._band_hashes[self._indexed:self._size, band]
+                order = np.argsort(column, kind="stable")
+                segments.append((column[order], rows[order]))
+            self._tail_cache = (self._version, segments)
+        return self._tail_cache[1]
+
+    def _match(self, signatures: np.ndarray, threshold: float) -> tuple:
+        """
+        Finds every (query, indexed row) pair that shares a band and reaches the threshold.
+
+        Returns:
+            tuple: Arrays (query_indexes, rows, similarities).
+        """
+        band_hashes = self._hash_bands(signatures)
+        query_parts, row_parts = [], []
+        for segments in (self._sorted, self._tail_segments() if self._size > self._indexed else []):
+            for band, (hashes, rows) in enumerate(segments):
+                lo = np.searchsorted(hashes, band_hashes[:, band], side="left")
+                # A huge bucket means the query has many near-copies already; a few are enough
+                hi = np.minimum(np.searchsorted(hashes, band_hashes[:, band], side="right"), lo + MAX_BUCKET_CANDIDATES)
+                counts = hi - lo
+                total = counts.sum()
+                if not total:
+                    continue
+                query_parts.append(np.repeat(np.arange(len(signatures)), counts))
+                offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+                row_parts.append(rows[np.repeat(lo, counts) + offsets])
+        if not query_parts:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0)
+        pairs = np.unique(np.concatenate(query_parts) * self._size + np.concatenate(row_parts))
+        query_indexes, rows = pairs // self._size, pairs % self._size
+        live = self._live[rows]
+        query_indexes, rows = query_indexes[live], rows[live]
+        similarity = (self._signatures[rows] == signatures[query_indexes]).mean(axis=1)
+        keep = similarity >= threshold
+        return query_indexes[keep], rows[keep], similarity[keep]
+
+    def query_signatures(self, signatures: np.ndarray, threshold: float = None) -> list:
+        """
+        Looks up many signatures at once.
+
+        Returns:
+            list: For each signature, the (key, similarity) of its closest indexed
+            question at or above the threshold, or None.
+        """
+        best = [None] * len(signatures)
+        if not self._rows or not len(signatures):
+            return best
+        query_indexes, rows, similarity = self._match(signatures, self.threshold if threshold is None else threshold)
+        for i in np.argsort(similarity, kind="stable"):
+            best[query_indexes[i]] = (self._keys[rows[i]], float(similarity[i]))
+        return best
+
+    def query(self, mcq: dict, threshold: float = None) -> list:
+        """Returns [(key, similarity)] of the indexed questions similar to `mcq`, best first."""
+        if not self._rows:
+            return []
+        _, rows, similarity = self._match(minhash_signatures([mcq]), self.threshold if threshold is None else threshold)
+        return sorted(((self._keys[row], float(score)) for row, score in zip(rows, similarity)),
+                      key=lambda match: -match[1])
+
+
+def find_near_duplicates(mcqs: list, index: NearDuplicateIndex = None,
+                         threshold: float = NEAR_DUPLICATE_THRESHOLD, keys: list = None,
+                         signatures: np.ndarray = None) -> list:
+    """
+    Checks a batch of questions against an index and against the earlier questions of
+    the batch itself, without modifying the index.
+
+    Args:
+        mcqs (list): The questions to check.
+        index (NearDuplicateIndex): Questions already stored, if any.
+        threshold (float): Minimum estimated similarity of a near-duplicate.
+        keys (list): Keys reported for matches within the batch; defaults to positions.
+        signatures (np.ndarray): The batch's signatures, if already computed.
+
+    Returns:
+        list: One entry per question: None for a new question, otherwise the
+        (key, similarity) of its closest match, preferring matches in the index.
+    """
+    if signatures is None:
+        signatures = minhash_signatures(mcqs)
+    keys = list(range(len(mcqs))) if keys is None else keys
+    matches = index.query_signatures(signatures, threshold) if index is not None else [None] * len(mcqs)
+
+    batch_index = NearDuplicateIndex(threshold)
+    batch_index.add_signatures(list(range(len(mcqs))), signatures)
+    query_indexes, rows, similarity = batch_index._match(signatures, threshold)
+    earlier = rows < query_indexes
+    query_indexes, rows, similarity = query_indexes[earlier], rows[earlier], similarity[earlier]
+    in_index = [match is not None for match in matches]
+    for i in np.argsort(similarity, kind="stable"):
+        if not in_index[query_indexes[i]]:
+            matches[query_indexes[i]] = (keys[rows[i]], float(similarity[i]))
+    return matches
@@ -0,0 +1,40 @@
+# utils/notify.py
+import contextvars
+import sys
+from contextlib import contextmanager
+
+# Where warnings and errors go; None shows them on the page. Background jobs run away
+# from the Streamlit script thread, and the batch CLI has no page at all, so they
+# capture them instead.
+_sink = contextvars.ContextVar("notify_sink", default=None)
+
+
+def _show(level: str, message: str):
+    # Imported here so the utils modules can be used without Streamlit
+    import streamlit as st
+    getattr(st, level)(message)
+
+
+def print_message(level: str, message: str):
+    """A sink for capture_messages that prints to stderr, for use outside Streamlit."""
+    print(f"{level.upper()}: {message}", file=sys.stderr)
+
+
+def warning(message: str):
+    """Shows a warning to the user (or hands it to the active capture)."""
+    (_sink.get() or _show)("warning", message)
+
+
+def error(message: str):
+    """Shows an error to the user (or hands it to the active capture)."""
+    (_sink.get() or _show)("error", message)
+
+
+@contextmanager
+def capture_messages(sink):
+    """Sends the warnings and errors raised inside the block to sink(level, message) instead of the page."""
+    token = _sink.set(sink)
+    try:
+        yield
+    finally:
+        _sink.reset(token)
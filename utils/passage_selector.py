@@ -0,0 +1,200 @@
+# utils/passage_selector.py
+import re
+
+import numpy as np
+
+CHARS_PER_TOKEN = 4 # Same rough estimate as utils.ai_generator.estimate_tokens
+PASSAGE_TOKENS = 150 # Target passage size when splitting a document
+NUM_QUERY_TERMS = 64 # Keywords that stand in for "what this document is about"
+BM25_K1 = 1.5
+BM25_B = 0.75
+MIN_RELEVANCE = 0.05 # Passages scoring below this fraction of the best one are never packed
+DIVERSITY_WEIGHT = 0.5 # How much similarity to already-picked passages discounts a passage (0 to 1)
+
+_WORD = re.compile(r"[a-z][a-z'-]{2,}")
+_STOPWORDS = frozenset("""
+the and for are but not you all any can had her was one our out has have him his how its may new now
+old see two way who did get let put say she too use that this with from they will would there their
+what about which when make like time just know take into year your good some could them than then
+look only come over think also back after work first well even want because these give most very
+been were said each where while more such here other between both through during before under
+within without upon however therefore thus those should shall must might page pages chapter figure
+table see also et al ibid
+""".split())
+
+
+def _estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def split_passages(text: str, passage_tokens: int = PASSAGE_TOKENS) -> list:
+    """
+    Splits a document into passages of roughly `passage_tokens` tokens.
+
+    Paragraphs are the unit of splitting: short ones are merged with their
+    neighbours and very long ones are cut at sentence boundaries.
+    """
+    max_chars = passage_tokens * CHARS_PER_TOKEN
+    passages = []
+    current = ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        pieces = [paragraph]
+        if len(paragraph) > max_chars * 2:
+            pieces = re.split(r"(?<=[.!?])\s+", paragraph)
+        for piece in pieces:
+            if current and len(current) + len(piece) > max_chars:
+                passages.append(current)
+                current = ""
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        passages.append(current)
+    return passages
+
+
+def _term_matrix(passages: list):
+    """Tokenizes the passages into a sparse (passage, term, count) representation."""
+    doc_ids = []
+    words = []
+    for i, passage in enumerate(passages):
+        tokens = [w for w in _WORD.findall(passage.lower()) if w not in _STOPWORDS]
+        words.extend(tokens)
+        doc_ids.extend([i] * len(tokens))
+    if not words:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, empty, np.array([])
+    vocabulary, term_ids = np.unique(np.array(words), return_inverse=True)
+    doc_ids = np.array(doc_ids, dtype=np.int64)
+    # Collapse repeated (passage, term) pairs into counts
+    pair_keys = doc_ids * len(vocabulary) + term_ids
+    unique_pairs, counts = np.unique(pair_keys, return_counts=True)
+    return unique_pairs // len(vocabulary), unique_pairs % len(vocabulary), counts, vocabulary
+
+
+def _boilerplate_factor(passages: list) -> np.ndarray:
+    """
+    Down-weights passages that look like tables of contents, references or headers:
+    mostly digits/punctuation, or made of many very short lines.
+    """
+    factors = np.ones(len(passages))
+    for i, passage in enumerate(passages):
+        letters = sum(c.isalpha() for c in passage)
+        alpha_ratio = letters / max(1, len(passage))
+        lines = [line for line in passage.splitlines() if line.strip()]
+        avg_line = len(passage) / max(1, len(lines))
+        factors[i] = min(1.0, alpha_ratio / 0.7) * min(1.0, avg_line / 40)
+    return factors
+
+
+def select_passages(text: str, token_budget: int, focus: str = "",
+                    passage_tokens: int = PASSAGE_TOKENS,
+                    diversity: float = DIVERSITY_WEIGHT) -> tuple:
+    """
+    Packs the most relevant, least redundant passages of a document into a token budget.
+
+    Passages are scored with BM25 against the document's own keywords (plus any words
+    in `focus`, such as the requested category), boilerplate-looking passages are
+    down-weighted, and passages are picked greedily by maximal marginal relevance
+    until the budget is full. Everything is computed with NumPy; no network calls.
+
+    Args:
+        text (str or list): The full document text, or its chunks in order (e.g. the
+            pages from utils.file_parser.iter_document_chunks), which are split into
+            passages one by one so the whole text is never built.
+        token_budget (int): Maximum (estimated) tokens of text to keep.
+        focus (str): Optional extra words to favour, e.g. the category.
+        passage_tokens (int): Target passage size.
+        diversity (float): How strongly to penalise passages similar to ones already picked.
+
+    Returns:
+        tuple: (selected_text, report) where selected_text keeps the chosen passages in
+        document order and report is a dict with kept/total passages and tokens and the
+        kept_fraction of the original text.
+    """
+    chunks = [text] if isinstance(text, str) else list(text)
+    total_tokens = sum(_estimate_tokens(chunk) for chunk in chunks)
+    passages = [passage for chunk in chunks for passage in split_passages(chunk, passage_tokens)]
+    report = {
+        "total_passages": len(passages),
+        "kept_passages": len(passages),
+        "total_tokens": total_tokens,
+        "kept_tokens": total_tokens,
+        "kept_fraction": 1.0,
+    }
+    if total_tokens <= token_budget or not passages:
+        return "".join(chunks), report
+
+    doc_ids, term_ids, counts, vocabulary = _term_matrix(passages)
+    vocab_size = len(vocabulary)
+    num_passages = len(passages)
+    lengths = np.array([_estimate_tokens(p) for p in passages])
+
+    if vocab_size:
+        # BM25 term statistics
+        doc_freq = np.bincount(term_ids, minlength=vocab_size)
+        idf = np.log(1 + (num_passages - doc_freq + 0.5) / (doc_freq + 0.5))
+        passage_len = np.bincount(doc_ids, weights=counts, minlength=num_passages)
+        avg_len = max(passage_len.mean(), 1.0)
+
+        # The "query" is the document's own keyword profile: terms that recur across many
+        # passages without being everywhere (df * idf), so one-off jargon such as author
+        # names in a reference list cannot dominate it
+        term_weight = doc_freq * idf
+        query_terms = np.argsort(term_weight)[::-1][:NUM_QUERY_TERMS]
+        focus_words = set(_WORD.findall(focus.lower())) - _STOPWORDS
+        if focus_words:
+            focus_ids = np.nonzero(np.isin(vocabulary, list(focus_words)))[0]
+            query_terms = np.union1d(query_terms, focus_ids)
+        query_boost = np.zeros(vocab_size)
+        query_boost[query_terms] = 1.0
+        if focus_words:
+            query_boost[focus_ids] = 2.0
+
+        tf = counts.astype(float)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * passage_len[doc_ids] / avg_len)
+        entry_scores = idf[term_ids] * tf * (BM25_K1 + 1) / (tf + norm) * query_boost[term_ids]
+        relevance = np.bincount(doc_ids, weights=entry_scores, minlength=num_passages)
+
+        # Dense, L2-normalised tf-idf vectors over the query terms for the redundancy penalty
+        column = np.full(vocab_size, -1)
+        column[query_terms] = np.arange(len(query_terms))
+        in_query = column[term_ids] >= 0
+        vectors = np.zeros((num_passages, len(query_terms)))
+        np.add.at(vectors, (doc_ids[in_query], column[term_ids[in_query]]), tf[in_query] * idf[term_ids[in_query]])
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    else:
+        relevance = np.zeros(num_passages)
+        vectors = np.zeros((num_passages, 1))
+
+    relevance = relevance * _boilerplate_factor(passages)
+    if relevance.max() > 0:
+        relevance = relevance / relevance.max()
+
+    # Greedy maximal marginal relevance under the token budget
+    selected = []
+    used_tokens = 0
+    max_similarity = np.zeros(num_passages)
+    available = lengths <= token_budget
+    while available.any():
+        # Multiplicative form, so irrelevant passages never win just by being different
+        mmr = relevance * (1 - diversity * max_similarity)
+        mmr[~available] = -np.inf
+        best = int(np.argmax(mmr))
+        if mmr[best] < MIN_RELEVANCE and selected:
+            break # Only near-irrelevant passages still fit; leave the budget unused
+        selected.append(best)
+        used_tokens += lengths[best]
+        max_similarity = np.maximum(max_similarity, vectors @ vectors[best])
+        available[best] = False
+        available &= lengths <= token_budget - used_tokens
+
+    selected.sort()
+    selected_text = "\n\n".join(passages[i] for i in selected)
+    report.update(
+        kept_passages=len(selected),
+        kept_tokens=int(used_tokens),
+        kept_fraction=round(int(used_tokens) / max(1, total_tokens), 4),
+    )
+    return selected_text, report
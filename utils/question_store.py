@@ -0,0 +1,586 @@
+# utils/question_store.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from utils.near_duplicates import NUM_PERM, minhash_signatures
+
+STANDARD_FIELDS = ("question", "options", "correct_answer", "category", "difficulty")
+
+
+def _summarize(name: str, questions: list, created_at: float, updated_at: float) -> dict:
+    """Builds the lightweight summary stored (and listed) for a set."""
+    return {
+        "name": name,
+        "question_count": len(questions),
+        "categories": sorted({q.get("category") or "" for q in questions} - {""}),
+        "difficulties": sorted({q.get("difficulty") or "" for q in questions} - {""}),
+        "created_at": created_at,
+        "updated_at": updated_at,
+    }
+
+
+def _matches(summary: dict, search: str, category: str, difficulty: str) -> bool:
+    if search and search.lower() not in summary["name"].lower():
+        return False
+    if category and category not in summary["categories"]:
+        return False
+    if difficulty and difficulty not in summary["difficulties"]:
+        return False
+    return True
+
+
+def question_identity(q: dict) -> tuple:
+    """A question's text and its options in canonical (sorted) order, the key of update_difficulties."""
+    return q["question"], tuple(sorted(q["options"]))
+
+
+class QuestionStore(ABC):
+    """
+    Interface for the storage backends behind utils.session_manager.
+
+    Sets are addressed by name. Listing methods work on summaries (name, question
+    count, categories, difficulties, timestamps) and never load the questions.
+    Backends must implement the abstract methods; the others have generic defaults
+    built on them.
+    """
+
+    @abstractmethod
+    def save_set(self, set_name: str, questions: list):
+        ...
+
+    def save_sets(self, sets: dict, signatures: dict = None):
+        """
+        Saves many sets at once; backends that support it use a single transaction.
+        `signatures` optionally maps set names to their questions' precomputed signatures.
+        """
+        for set_name, questions in sets.items():
+            self.save_set(set_name, questions)
+
+    def append_sets(self, sets: dict, signatures: dict = None, replace: tuple = ()):
+        """
+        Appends questions to sets, creating the sets that do not exist yet; for bulk loads.
+        Sets named in `replace` are emptied first. `signatures` is as in save_sets.
+        """
+        for set_name, questions in sets.items():
+            existing = [] if set_name in replace else self.load_set(set_name)
+            self.save_set(set_name, existing + questions)
+
+    @abstractmethod
+    def load_set(self, set_name: str) -> list:
+        ...
+
+    def iter_questions(self):
+        """Yields (set_name, question) for every stored question, set by set, holding one set at a time."""
+        for summary in self.list_sets():
+            for q in self.load_set(summary["name"]):
+                yield summary["name"], q
+
+    @abstractmethod
+    def delete_set(self, set_name: str):
+        ...
+
+    def rename_sets(self, renames: dict):
+        """
+        Renames sets, given as {old name: new name}, replacing any set already under a new
+        name; backends that support it do all of it in a single transaction. Sets that do
+        not exist are skipped, and leave the set under the new name as it was.
+        """
+        for old_name, new_name in renames.items():
+            if old_name == new_name or not any(s["name"] == old_name for s in self.list_sets(search=old_name)):
+                continue
+            self.save_set(new_name, self.load_set(old_name))
+            self.delete_set(old_name)
+
+    @abstractmethod
+    def list_sets(self, offset: int = 0, limit: int = None, search: str = None,
+                  category: str = None, difficulty: str = None) -> list:
+        """Returns one page of set summaries ordered by name."""
+
+    @abstractmethod
+    def count_sets(self, search: str = None, category: str = None, difficulty: str = None) -> int:
+        ...
+
+    @abstractmethod
+    def count_questions(self) -> int:
+        ...
+
+    @abstractmethod
+    def list_categories(self) -> list:
+        """Returns the distinct question categories in the store, sorted."""
+
+    @abstractmethod
+    def question_strata(self) -> dict:
+        """Returns {(category, difficulty): question count} over the whole bank ("" for a missing value)."""
+
+    @abstractmethod
+    def question_ids(self, category: str = None, difficulty: str = None) -> list:
+        """
+        Returns the IDs of the stored questions with this category and difficulty (None
+        matches any), in a stable order, without loading the questions themselves.
+        """
+
+    @abstractmethod
+    def load_questions(self, ids: list) -> list:
+        """Loads the questions with these IDs (from question_ids), in the order given."""
+
+    def update_difficulties(self, difficulties: dict) -> int:
+        """
+        Re-tags stored questions in every set they appear in. `difficulties` maps a
+        question's identity, (question text, tuple of its options sorted), to its new
+        difficulty: the same text and options in any order, as in
+        utils.attempt_history.question_key. Returns the number of stored questions changed.
+        """
+        changed = 0
+        for summary in self.list_sets():
+            questions = self.load_set(summary["name"])
+            updated = []
+            for q in questions:
+                difficulty = difficulties.get(question_identity(q), q.get("difficulty"))
+                updated.append(dict(q, difficulty=difficulty) if difficulty != q.get("difficulty") else q)
+            set_changes = sum(a is not b for a, b in zip(questions, updated))
+            if set_changes:
+                self.save_set(summary["name"], updated)
+                changed += set_changes
+        return changed
+
+    def get_all_sets(self) -> dict:
+        """Loads every set with its questions. Prefer list_sets for anything large."""
+        return {s["name"]: self.load_set(s["name"]) for s in self.list_sets()}
+
+    def load_signatures(self) -> tuple:
+        """
+        Returns (keys, signatures) for every stored question, where keys are
+        (set_name, position) and signatures is an array of near-duplicate signatures
+        (see utils.near_duplicates.minhash_signatures).
+        """
+        keys = []
+        questions = []
+        for set_name, set_questions in self.get_all_sets().items():
+            keys.extend((set_name, position) for position in range(len(set_questions)))
+            questions.extend(set_questions)
+        return keys, minhash_signatures(questions)
+
+
+class InMemoryQuestionStore(QuestionStore):
+    """Dict-backed store, e.g. for a single browser session or for quick experiments."""
+
+    def __init__(self, sets: dict = None):
+        self._sets = sets if sets is not None else {}
+        self._summaries = {}
+        self._strata_index = None # (category, difficulty) -> [(set_name, position)], built on first use
+        for set_name, questions in self._sets.items():
+            self._summaries[set_name] = _summarize(set_name, questions, 0.0, 0.0)
+
+    def save_set(self, set_name: str, questions: list):
+        now = time.time()
+        created_at = self._summaries.get(set_name, {}).get("created_at", now)
+        self._sets[set_name] = questions
+        self._summaries[set_name] = _summarize(set_name, questions, created_at, now)
+        self._strata_index = None
+
+    def append_sets(self, sets: dict, signatures: dict = None, replace: tuple = ()):
+        for set_name, questions in sets.items():
+            existing = [] if set_name in replace else self._sets.get(set_name, [])
+            self.save_set(set_name, existing + list(questions))
+
+    def load_set(self, set_name: str) -> list:
+        return self._sets.get(set_name, [])
+
+    def delete_set(self, set_name: str):
+        self._sets.pop(set_name, None)
+        self._summaries.pop(set_name, None)
+        self._strata_index = None
+
+    def rename_sets(self, renames: dict):
+        for old_name, new_name in renames.items():
+            if old_name == new_name or old_name not in self._sets:
+                continue
+            self._sets[new_name] = self._sets.pop(old_name)
+            self._summaries[new_name] = dict(self._summaries.pop(old_name), name=new_name, updated_at=time.time())
+        self._strata_index = None
+
+    def list_sets(self, offset: int = 0, limit: int = None, search: str = None,
+                  category: str = None, difficulty: str = None) -> list:
+        summaries = [s for name, s in sorted(self._summaries.items()) if _matches(s, search, category, difficulty)]
+        return summaries[offset:offset + limit if limit is not None else None]
+
+    def count_sets(self, search: str = None, category: str = None, difficulty: str = None) -> int:
+        return sum(1 for s in self._summaries.values() if _matches(s, search, category, difficulty))
+
+    def count_questions(self) -> int:
+        return sum(len(questions) for questions in self._sets.values())
+
+    def list_categories(self) -> list:
+        return sorted({c for s in self._summaries.values() for c in s["categories"]})
+
+    def _strata(self) -> dict:
+        if self._strata_index is None:
+            index = {}
+            for set_name, questions in sorted(self._sets.items()):
+                for position, q in enumerate(questions):
+                    stratum = (q.get("category") or "", q.get("difficulty") or "")
+                    index.setdefault(stratum, []).append((set_name, position))
+            self._strata_index = index
+        return self._strata_index
+
+    def question_strata(self) -> dict:
+        return {stratum: len(keys) for stratum, keys in self._strata().items()}
+
+    def question_ids(self, category: str = None, difficulty: str = None) -> list:
+        ids = []
+        for (stratum_category, stratum_difficulty), keys in sorted(self._strata().items()):
+            if category is not None and stratum_category != category:
+                continue
+            if difficulty is not None and stratum_difficulty != difficulty:
+                continue
+            ids.extend(keys)
+        return sorted(ids)
+
+    def load_questions(self, ids: list) -> list:
+        return [self._sets[set_name][position] for set_name, position in ids]
+
+
+class SQLiteQuestionStore(QuestionStore):
+    """
+    Persistent store in a single SQLite file, shared by every session of the process.
+
+    Sets and questions live in separate tables. Each set row keeps its summary
+    (question count, categories, difficulties), so listings and counts never touch the
+    questions table. Questions are indexed by set, category and difficulty. Every write
+    of one or many sets happens in a single transaction.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS question_sets (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL UNIQUE,
+                    question_count INTEGER NOT NULL,
+                    categories TEXT NOT NULL,
+                    difficulties TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS questions (
+                    id INTEGER PRIMARY KEY,
+                    set_id INTEGER NOT NULL REFERENCES question_sets(id) ON DELETE CASCADE,
+                    position INTEGER NOT NULL,
+                    question TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    correct_answer TEXT NOT NULL,
+                    category TEXT,
+                    difficulty TEXT,
+                    extra TEXT,
+                    signature BLOB
+                );
+                CREATE INDEX IF NOT EXISTS idx_questions_set ON questions(set_id, position);
+                CREATE INDEX IF NOT EXISTS idx_questions_category ON questions(category, set_id);
+                CREATE INDEX IF NOT EXISTS idx_questions_difficulty ON questions(difficulty, set_id);
+                CREATE INDEX IF NOT EXISTS idx_questions_category_difficulty ON questions(category, difficulty);
+            """)
+            # Stores created before near-duplicate signatures were kept get the column added;
+            # their signatures are filled in by the first load_signatures
+            if "signature" not in {row[1] for row in conn.execute("PRAGMA table_info(questions)")}:
+                conn.execute("ALTER TABLE questions ADD COLUMN signature BLOB")
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread (Streamlit runs each session's script in its own thread)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _question_row(set_id: int, position: int, q: dict, signature: np.ndarray) -> tuple:
+        extra = {k: v for k, v in q.items() if k not in STANDARD_FIELDS}
+        return (
+            set_id, position, q.get("question", ""), json.dumps(q.get("options", [])),
+            q.get("correct_answer", ""), q.get("category"), q.get("difficulty"),
+            json.dumps(extra) if extra else None, signature.tobytes(),
+        )
+
+    @staticmethod
+    def _row_question(row: tuple) -> dict:
+        question, options, correct_answer, category, difficulty, extra = row
+        q = {
+            "question": question,
+            "options": json.loads(options),
+            "correct_answer": correct_answer,
+            "difficulty": difficulty,
+            "category": category,
+        }
+        if extra:
+            q.update(json.loads(extra))
+        return q
+
+    def _insert_questions(self, conn: sqlite3.Connection, set_id: int, start: int, questions: list,
+                          signatures: np.ndarray = None):
+        if signatures is None:
+            signatures = minhash_signatures(questions)
+        conn.executemany(
+            "INSERT INTO questions (set_id, position, question, options, correct_answer, category, difficulty, extra, signature)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (self._question_row(set_id, start + i, q, signatures[i]) for i, q in enumerate(questions))
+        )
+
+    def _write_set(self, conn: sqlite3.Connection, set_name: str, questions: list, now: float,
+                   signatures: np.ndarray = None):
+        summary = _summarize(set_name, questions, now, now)
+        row = conn.execute("SELECT id FROM question_sets WHERE name = ?", (set_name,)).fetchone()
+        if row:
+            set_id = row[0]
+            conn.execute(
+                "UPDATE question_sets SET question_count = ?, categories = ?, difficulties = ?, updated_at = ? WHERE id = ?",
+                (summary["question_count"], json.dumps(summary["categories"]),
+                 json.dumps(summary["difficulties"]), now, set_id)
+            )
+            conn.execute("DELETE FROM questions WHERE set_id = ?", (set_id,))
+        else:
+            set_id = conn.execute(
+                "INSERT INTO question_sets (name, question_count, categories, difficulties, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (set_name, summary["question_count"], json.dumps(summary["categories"]),
+                 json.dumps(summary["difficulties"]), now, now)
+            ).lastrowid
+        self._insert_questions(conn, set_id, 0, questions, signatures)
+
+    def _append_to_set(self, conn: sqlite3.Connection, set_name: str, questions: list, now: float,
+                       signatures: np.ndarray = None):
+        row = conn.execute(
+            "SELECT id, question_count, categories, difficulties FROM question_sets WHERE name = ?", (set_name,)
+        ).fetchone()
+        if row is None:
+            self._write_set(conn, set_name, questions, now, signatures)
+            return
+        set_id, count, categories, difficulties = row
+        # The summary is merged with the new questions' instead of being recomputed from every row
+        summary = _summarize(set_name, questions, now, now)
+        conn.execute(
+            "UPDATE question_sets SET question_count = ?, categories = ?, difficulties = ?, updated_at = ? WHERE id = ?",
+            (count + len(questions), json.dumps(sorted(set(json.loads(categories)) | set(summary["categories"]))),
+             json.dumps(sorted(set(json.loads(difficulties)) | set(summary["difficulties"]))), now, set_id)
+        )
+        self._insert_questions(conn, set_id, count, questions, signatures)
+
+    def save_set(self, set_name: str, questions: list):
+        self.save_sets({set_name: questions})
+
+    def save_sets(self, sets: dict, signatures: dict = None):
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            for set_name, questions in sets.items():
+                self._write_set(conn, set_name, questions, now, (signatures or {}).get(set_name))
+
+    def append_sets(self, sets: dict, signatures: dict = None, replace: tuple = ()):
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            for set_name in replace:
+                conn.execute("DELETE FROM question_sets WHERE name = ?", (set_name,))
+            for set_name, questions in sets.items():
+                self._append_to_set(conn, set_name, questions, now, (signatures or {}).get(set_name))
+
+    def iter_questions(self):
+        conn = self._connection()
+        sets = conn.execute("SELECT id, name FROM question_sets ORDER BY name").fetchall()
+        for set_id, set_name in sets:
+            # The cursor streams the rows; only the current one is decoded
+            for row in conn.execute(
+                "SELECT question, options, correct_answer, category, difficulty, extra"
+                " FROM questions WHERE set_id = ? ORDER BY position",
+                (set_id,)
+            ):
+                yield set_name, self._row_question(row)
+
+    def load_set(self, set_name: str) -> list:
+        rows = self._connection().execute(
+            "SELECT q.question, q.options, q.correct_answer, q.category, q.difficulty, q.extra"
+            " FROM questions q JOIN question_sets s ON s.id = q.set_id"
+            " WHERE s.name = ? ORDER BY q.position",
+            (set_name,)
+        ).fetchall()
+        return [self._row_question(row) for row in rows]
+
+    def delete_set(self, set_name: str):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM question_sets WHERE name = ?", (set_name,))
+
+    def rename_sets(self, renames: dict):
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            for old_name, new_name in renames.items():
+                if old_name == new_name or conn.execute(
+                    "SELECT 1 FROM question_sets WHERE name = ?", (old_name,)
+                ).fetchone() is None:
+                    continue
+                conn.execute("DELETE FROM question_sets WHERE name = ?", (new_name,))
+                conn.execute("UPDATE question_sets SET name = ?, updated_at = ? WHERE name = ?",
+                             (new_name, now, old_name))
+
+    @staticmethod
+    def _filters(search: str, category: str, difficulty: str) -> tuple:
+        clauses = []
+        params = []
+        if search:
+            clauses.append("name LIKE ? ESCAPE '\\'")
+            escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.append(f"%{escaped}%")
+        if category:
+            clauses.append("id IN (SELECT set_id FROM questions WHERE category = ?)")
+            params.append(category)
+        if difficulty:
+            clauses.append("id IN (SELECT set_id FROM questions WHERE difficulty = ?)")
+            params.append(difficulty)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def list_sets(self, offset: int = 0, limit: int = None, search: str = None,
+                  category: str = None, difficulty: str = None) -> list:
+        where, params = self._filters(search, category, difficulty)
+        rows = self._connection().execute(
+            "SELECT name, question_count, categories, difficulties, created_at, updated_at"
+            f" FROM question_sets{where} ORDER BY name LIMIT ? OFFSET ?",
+            (*params, limit if limit is not None else -1, offset)
+        ).fetchall()
+        return [
+            {
+                "name": name,
+                "question_count": count,
+                "categories": json.loads(categories),
+                "difficulties": json.loads(difficulties),
+                "created_at": created_at,
+                "updated_at": updated_at,
+            }
+            for name, count, categories, difficulties, created_at, updated_at in rows
+        ]
+
+    def count_sets(self, search: str = None, category: str = None, difficulty: str = None) -> int:
+        where, params = self._filters(search, category, difficulty)
+        return self._connection().execute(f"SELECT COUNT(*) FROM question_sets{where}", params).fetchone()[0]
+
+    def count_questions(self) -> int:
+        return self._connection().execute("SELECT COALESCE(SUM(question_count), 0) FROM question_sets").fetchone()[0]
+
+    def load_signatures(self) -> tuple:
+        conn = self._connection()
+        missing = conn.execute(
+            "SELECT id, question, options FROM questions WHERE signature IS NULL"
+        ).fetchall()
+        if missing:
+            signatures = minhash_signatures([{"question": q, "options": json.loads(o)} for _, q, o in missing])
+            with conn:
+                conn.executemany(
+                    "UPDATE questions SET signature = ? WHERE id = ?",
+                    ((signature.tobytes(), row[0]) for signature, row in zip(signatures, missing))
+                )
+        rows = conn.execute(
+            "SELECT s.name, q.position, q.signature FROM questions q JOIN question_sets s ON s.id = q.set_id"
+        ).fetchall()
+        keys = [(name, position) for name, position, _ in rows]
+        signatures = np.frombuffer(b"".join(row[2] for row in rows), dtype=np.uint32).reshape(len(rows), NUM_PERM)
+        return keys, signatures
+
+    def update_difficulties(self, difficulties: dict) -> int:
+        conn = self._connection()
+        with conn:
+            # One pass over the questions, joined on the text with the new tags through a
+            # temporary table; the options are then compared in their canonical order.
+            # Signatures are kept, since they do not depend on the difficulty
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS retag (question TEXT, options TEXT, difficulty TEXT)")
+            conn.execute("DELETE FROM retag")
+            conn.executemany("INSERT INTO retag (question, options, difficulty) VALUES (?, ?, ?)",
+                             ((question, json.dumps(list(options)), difficulty)
+                              for (question, options), difficulty in difficulties.items()))
+            updates = []
+            set_ids = set()
+            for question_id, set_id, options, difficulty, retag_options, new_difficulty in conn.execute(
+                "SELECT q.id, q.set_id, q.options, q.difficulty, r.options, r.difficulty"
+                " FROM questions q JOIN retag r ON r.question = q.question"
+            ):
+                if difficulty != new_difficulty and sorted(json.loads(options)) == json.loads(retag_options):
+                    updates.append((new_difficulty, question_id))
+                    set_ids.add(set_id)
+            conn.executemany("UPDATE questions SET difficulty = ? WHERE id = ?", updates)
+            changed = len(updates)
+            # Keep the summaries of the sets touched in step
+            for set_id in set_ids:
+                tags = [row[0] for row in conn.execute(
+                    "SELECT DISTINCT difficulty FROM questions WHERE set_id = ? AND difficulty IS NOT NULL AND difficulty != ''"
+                    " ORDER BY difficulty", (set_id,)
+                )]
+                conn.execute("UPDATE question_sets SET difficulties = ?, updated_at = ? WHERE id = ?",
+                             (json.dumps(tags), time.time(), set_id))
+            conn.execute("DELETE FROM retag")
+        return changed
+
+    def list_categories(self) -> list:
+        # Answered from the category index without reading question rows
+        rows = self._connection().execute(
+            "SELECT DISTINCT category FROM questions WHERE category IS NOT NULL AND category != '' ORDER BY category"
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def question_strata(self) -> dict:
+        # Grouped on the (category, difficulty) index, which covers the query
+        rows = self._connection().execute(
+            "SELECT category, difficulty, COUNT(*) FROM questions GROUP BY category, difficulty"
+        ).fetchall()
+        strata = {}
+        for category, difficulty, count in rows:
+            stratum = (category or "", difficulty or "")
+            strata[stratum] = strata.get(stratum, 0) + count
+        return strata
+
+    def question_ids(self, category: str = None, difficulty: str = None) -> list:
+        # Only row IDs are read, straight from the category/difficulty indexes
+        clauses = []
+        params = []
+        for column, value in (("category", category), ("difficulty", difficulty)):
+            if value is None:
+                continue
+            clauses.append(f"COALESCE({column}, '') = ?" if value == "" else f"{column} = ?")
+            params.append(value)
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        return [row[0] for row in self._connection().execute(f"SELECT id FROM questions{where} ORDER BY id", params)]
+
+    def load_questions(self, ids: list) -> list:
+        conn = self._connection()
+        found = {}
+        for start in range(0, len(ids), 500): # Stays under SQLite's bound-parameter limit
+            batch = ids[start:start + 500]
+            rows = conn.execute(
+                "SELECT id, question, options, correct_answer, category, difficulty, extra FROM questions"
+                f" WHERE id IN ({', '.join('?' * len(batch))})",
+                batch
+            ).fetchall()
+            found.update((row[0], self._row_question(row[1:])) for row in rows)
+        return [found[question_id] for question_id in ids if question_id in found]
+
+
+def create_store(backend: str = None, path: str = None) -> QuestionStore:
+    """
+    Creates the configured backend: "sqlite" (default) or "memory".
+
+    Defaults come from the QUIZGENIUS_STORE and QUIZGENIUS_DB_PATH environment variables.
+    """
+    backend = (backend or os.getenv("QUIZGENIUS_STORE", "sqlite")).lower()
+    if backend == "memory":
+        return InMemoryQuestionStore()
+    if backend == "sqlite":
+        return SQLiteQuestionStore(path or os.getenv("QUIZGENIUS_DB_PATH", "quizgenius.sqlite3"))
+    raise ValueError(f"Unknown question store backend: {backend}")
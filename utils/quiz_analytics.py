@@ -0,0 +1,161 @@
+# utils/quiz_analytics.py
+import os
+
+import numpy as np
+
+from utils.metrics import metrics
+
+# A question's difficulty is only re-tagged once this many attempts have answered it
+MIN_RESPONSES = int(os.getenv("QUIZGENIUS_MIN_RESPONSES", "20"))
+# p-value (share of correct answers) bounds of the difficulty tags: above EASY_P is
+# "Easy", below HARD_P is "Hard", in between "Medium"
+EASY_P = 0.7
+HARD_P = 0.3
+# Share of attempts in the upper and lower groups of the discrimination index
+GROUP_FRACTION = 0.27
+
+
+def _rates(counts: np.ndarray, totals: np.ndarray) -> np.ndarray:
+    """counts / totals, NaN where the total is 0."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(totals > 0, counts / np.maximum(totals, 1), np.nan)
+
+
+def difficulty_for(p_values: np.ndarray) -> np.ndarray:
+    """The difficulty tag of each p-value ("" for NaN)."""
+    return np.select([p_values > EASY_P, p_values >= HARD_P, p_values < HARD_P], ["Easy", "Medium", "Hard"], "")
+
+
+def analyze(columns: dict, catalog: dict) -> dict:
+    """
+    Item statistics over every recorded answer, computed with array operations.
+
+    Unanswered questions count as incorrect. The discrimination index of a question
+    is its p-value among the top GROUP_FRACTION of attempts (by share of correct
+    answers) minus its p-value among the bottom GROUP_FRACTION.
+
+    Args:
+        columns (dict): The arrays of AttemptHistory.columns().
+        catalog (dict): AttemptHistory.catalog().
+
+    Returns:
+        dict: "attempts", "answers", "questions" (arrays aligned on "key": "responses",
+        "p_value", "discrimination", "mean_seconds", "unanswered_rate" and
+        "distractor_rates", one row of option choice rates per question in canonical
+        option order), and "categories" (rows of category, questions, answers, mastery).
+    """
+    with metrics.timer("analytics"):
+        keys, question = np.unique(columns["question"], return_inverse=True)
+        num_questions = len(keys)
+        correct = columns["correct"].astype(np.float64)
+        chosen = columns["chosen"].astype(np.int64)
+        attempt = columns["attempt"]
+        num_attempts = len(columns["attempt_ids"])
+
+        responses = np.bincount(question, minlength=num_questions)
+        p_value = _rates(np.bincount(question, weights=correct, minlength=num_questions), responses)
+        mean_seconds = _rates(np.bincount(question, weights=columns["seconds"], minlength=num_questions), responses)
+
+        # Option choice rates: one bincount over (question, option) pairs
+        answered = chosen >= 0
+        # Wide enough for every option, including ones nobody has picked yet
+        width = max([int(chosen.max(initial=0)) + 1] + [len(entry["options"]) for entry in catalog.values()])
+        option_counts = np.bincount(question[answered] * width + chosen[answered], minlength=num_questions * width)
+        distractor_rates = _rates(option_counts.reshape(num_questions, width), responses[:, None])
+        unanswered_rate = _rates(np.bincount(question[~answered], minlength=num_questions), responses)
+
+        # Discrimination: compare the best and worst attempts on each question
+        attempt_score = _rates(np.bincount(attempt, weights=correct, minlength=num_attempts),
+                               np.bincount(attempt, minlength=num_attempts))
+        group_size = max(1, int(round(num_attempts * GROUP_FRACTION)))
+        order = np.argsort(attempt_score, kind="stable")
+        group = np.zeros(num_attempts, dtype=np.int8)
+        group[order[:group_size]] = -1
+        group[order[-group_size:]] = 1
+        row_group = group[attempt]
+        upper = row_group == 1
+        lower = row_group == -1
+        discrimination = (
+            _rates(np.bincount(question[upper], weights=correct[upper], minlength=num_questions),
+                   np.bincount(question[upper], minlength=num_questions))
+            - _rates(np.bincount(question[lower], weights=correct[lower], minlength=num_questions),
+                     np.bincount(question[lower], minlength=num_questions))
+        )
+
+        # Mastery: share of correct answers per category
+        categories = np.array([(catalog.get(int(key)) or {}).get("category") or "" for key in keys.tolist()], dtype=object)
+        category_names, category_of_question = np.unique(categories.astype(str), return_inverse=True)
+        category = category_of_question[question]
+        category_answers = np.bincount(category, minlength=len(category_names))
+        mastery = _rates(np.bincount(category, weights=correct, minlength=len(category_names)), category_answers)
+        category_questions = np.bincount(category_of_question, minlength=len(category_names))
+
+    return {
+        "attempts": num_attempts,
+        "answers": len(question),
+        "questions": {
+            "key": keys,
+            "responses": responses,
+            "p_value": p_value,
+            "discrimination": discrimination,
+            "mean_seconds": mean_seconds,
+            "unanswered_rate": unanswered_rate,
+            "distractor_rates": distractor_rates,
+        },
+        "categories": [
+            {"category": name or "(none)", "questions": int(questions), "answers": int(answers), "mastery": float(rate)}
+            for name, questions, answers, rate in zip(category_names.tolist(), category_questions.tolist(),
+                                                      category_answers.tolist(), mastery.tolist())
+        ],
+    }
+
+
+def suggest_difficulties(stats: dict, catalog: dict, min_responses: int = MIN_RESPONSES) -> list:
+    """
+    Questions whose observed p-value no longer matches their difficulty tag.
+
+    Returns:
+        list: Rows of "key", "question", "category", "current", "suggested", "p_value"
+        and "responses", for questions answered at least `min_responses` times.
+    """
+    questions = stats["questions"]
+    suggested = difficulty_for(questions["p_value"])
+    rows = []
+    for i in np.flatnonzero(questions["responses"] >= min_responses).tolist():
+        entry = catalog.get(int(questions["key"][i]))
+        if entry is None or not suggested[i] or suggested[i] == entry["difficulty"]:
+            continue
+        rows.append({
+            "key": int(questions["key"][i]),
+            "question": entry["question"],
+            "category": entry["category"],
+            "current": entry["difficulty"],
+            "suggested": str(suggested[i]),
+            "p_value": round(float(questions["p_value"][i]), 3),
+            "responses": int(questions["responses"][i]),
+        })
+    return rows
+
+
+def question_rows(stats: dict, catalog: dict) -> list:
+    """One row per question for a statistics table, with each option's choice rate (the correct one marked)."""
+    questions = stats["questions"]
+    rows = []
+    for i, key in enumerate(questions["key"].tolist()):
+        entry = catalog.get(key) or {"question": "?", "options": [], "correct_option": -1, "category": None, "difficulty": None}
+        rates = questions["distractor_rates"][i]
+        choices = [
+            f"{'✓ ' if j == entry['correct_option'] else ''}{option}: {rates[j]:.0%}"
+            for j, option in enumerate(entry["options"][:len(rates)])
+        ]
+        rows.append({
+            "Question": entry["question"],
+            "Category": entry["category"],
+            "Difficulty": entry["difficulty"],
+            "Answers": int(questions["responses"][i]),
+            "p-value": round(float(questions["p_value"][i]), 3),
+            "Discrimination": round(float(questions["discrimination"][i]), 3),
+            "Mean seconds": round(float(questions["mean_seconds"][i]), 1),
+            "Choices": " | ".join(choices),
+        })
+    return rows
@@ -0,0 +1,112 @@
+# utils/quiz_engine.py
+import itertools
+import os
+import time
+
+import numpy as np
+
+QUIZ_PAGE_SIZE = int(os.getenv("QUIZGENIUS_QUIZ_PAGE_SIZE", "10")) # Questions shown per quiz page
+UNANSWERED = -1
+
+_quiz_ids = itertools.count(1)
+
+
+def _correct_option(q: dict) -> int:
+    """Index of the correct answer among a question's options, or UNANSWERED if it is missing."""
+    try:
+        return q["options"].index(q["correct_answer"])
+    except ValueError:
+        return UNANSWERED
+
+
+class Quiz:
+    """
+    An active quiz: its questions, one answer slot per question and the page on screen.
+
+    Answers are option indexes in a compact array keyed by question position, so
+    repeated question texts cannot collide and recording an answer is O(1). Only one
+    page of questions is rendered at a time, and grade() checks every answer against
+    the answer key in a single vectorized pass.
+    """
+
+    def __init__(self, questions: list, page_size: int = QUIZ_PAGE_SIZE, label: str = ""):
+        self.id = next(_quiz_ids)
+        self.questions = questions
+        self.label = label # Recorded with the attempt, e.g. the set name
+        self.page_size = max(1, page_size)
+        self.page = 0
+        self.answers = np.full(len(questions), UNANSWERED, dtype=np.int8)
+        self.answer_key = np.array([_correct_option(q) for q in questions], dtype=np.int8)
+        self.answered = 0
+        self.seconds = np.zeros(len(questions), dtype=np.float32) # Time spent on each question
+        self.page_started = time.monotonic()
+        self.result = None # Set by grade()
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    @property
+    def num_pages(self) -> int:
+        return max(1, -(-len(self.questions) // self.page_size))
+
+    @property
+    def submitted(self) -> bool:
+        return self.result is not None
+
+    def page_indexes(self, page: int = None) -> range:
+        """Positions of the questions on a page (the current one by default)."""
+        start = (self.page if page is None else page) * self.page_size
+        return range(start, min(start + self.page_size, len(self.questions)))
+
+    def finish_page(self):
+        """Adds the time since the page was shown to its questions, split evenly between them."""
+        now = time.monotonic()
+        indexes = self.page_indexes()
+        if len(indexes):
+            self.seconds[indexes.start:indexes.stop] += (now - self.page_started) / len(indexes)
+        self.page_started = now
+
+    def go_to_page(self, page: int):
+        self.page = min(max(0, page), self.num_pages - 1)
+
+    def selected(self, index: int):
+        """The option index chosen for a question, or None if it is unanswered."""
+        option = int(self.answers[index])
+        return None if option == UNANSWERED else option
+
+    def answer(self, index: int, option: int = None):
+        """Records the option index chosen for a question; None clears the answer."""
+        option = UNANSWERED if option is None else option
+        self.answered += (option != UNANSWERED) - (int(self.answers[index]) != UNANSWERED)
+        self.answers[index] = option
+
+    def grade(self) -> dict:
+        """
+        Scores the whole quiz at once and keeps the result on the quiz.
+
+        Returns:
+            dict: "score", "total", "answered", "percent", a boolean "correct" array by
+            question position, and "rows", one review row per question for a results table.
+        """
+        answered = self.answers != UNANSWERED
+        correct = answered & (self.answers == self.answer_key)
+        total = len(self.questions)
+        score = int(np.count_nonzero(correct))
+        rows = []
+        for i, (q, option, is_correct) in enumerate(zip(self.questions, self.answers.tolist(), correct.tolist())):
+            rows.append({
+                "#": i + 1,
+                "Result": "✅" if is_correct else ("❌" if option != UNANSWERED else "—"),
+                "Question": q["question"],
+                "Your answer": q["options"][option] if option != UNANSWERED else "No answer",
+                "Correct answer": q["correct_answer"],
+            })
+        self.result = {
+            "score": score,
+            "total": total,
+            "answered": int(np.count_nonzero(answered)),
+            "percent": round(score / total * 100, 2) if total else 0,
+            "correct": correct,
+            "rows": rows,
+        }
+        return self.result
@@ -0,0 +1,57 @@
+# utils/scheduled_model.py
+# The LangChain side of utils.llm_client, kept in its own module so that importing the
+# scheduler (as the job queue does on every app start) does not load langchain.
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from utils.llm_client import LLMScheduler, _estimate_tokens, scheduler
+
+
+def _prompt_tokens(messages) -> int:
+    return sum(_estimate_tokens(str(m.content)) for m in messages)
+
+
+def _result_tokens(result) -> int:
+    return sum(_estimate_tokens(str(g.message.content)) for g in result.generations)
+
+
+def _chunk_tokens(chunk) -> int:
+    return _estimate_tokens(str(chunk.message.content))
+
+
+class ScheduledChatModel(BaseChatModel):
+    """
+    Wraps a chat model so every call (invoke, LLMChain.run/arun, stream) goes through
+    an LLMScheduler: fair queuing, rate limits, timeouts and retries.
+    """
+
+    inner: BaseChatModel
+    client: object = None # An LLMScheduler; defaults to the process-wide scheduler
+
+    @property
+    def _llm_type(self) -> str:
+        return self.inner._llm_type
+
+    @property
+    def _scheduler(self) -> LLMScheduler:
+        return self.client or scheduler
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return self._scheduler.call(
+            lambda: self.inner._generate(messages, stop=stop, **kwargs),
+            _prompt_tokens(messages), _result_tokens,
+        )
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        return await self._scheduler.acall(
+            lambda: self.inner._agenerate(messages, stop=stop, **kwargs),
+            _prompt_tokens(messages), _result_tokens,
+        )
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for chunk in self._scheduler.stream(
+            lambda: self.inner._stream(messages, stop=stop, **kwargs),
+            _prompt_tokens(messages), _chunk_tokens,
+        ):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
@@ -1,39 +1,247 @@
 # utils/session_manager.py
+import os
+import threading
 import streamlit as st
 
+from utils import notify
+from utils.metrics import metrics
+from utils.near_duplicates import NEAR_DUPLICATE_THRESHOLD, NearDuplicateIndex, find_near_duplicates, minhash_signatures
+from utils.question_store import QuestionStore, create_store
+
+# What saving does with a question that nearly repeats one already in the bank (or an
+# earlier one in the same save): "flag" keeps it with a near_duplicate_of entry,
+# "drop" leaves it out and "off" skips the check
+DUPLICATE_ACTION = os.getenv("QUIZGENIUS_DUPLICATE_ACTION", "flag")
+
+# Process-wide question bank shared by all sessions; created on first use
+_store = None
+_store_lock = threading.Lock()
+
+# Near-duplicate index over every stored question, keyed by (set_name, position)
+_duplicate_index = None
+_indexed_set_sizes = {}
+_index_lock = threading.RLock()
+
+
+def get_store() -> QuestionStore:
+    """Returns the process-wide question store, creating the configured backend on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_store()
+    return _store
+
+
+def set_store(store: QuestionStore):
+    """Replaces the question store backend (e.g. with an InMemoryQuestionStore)."""
+    global _store, _duplicate_index
+    with _index_lock:
+        _store = store
+        _duplicate_index = None
+
+
+def get_duplicate_index() -> NearDuplicateIndex:
+    """Returns the near-duplicate index of the question bank, loading the stored signatures on first use."""
+    global _duplicate_index
+    with _index_lock:
+        if _duplicate_index is None:
+            keys, signatures = get_store().load_signatures()
+            index = NearDuplicateIndex(NEAR_DUPLICATE_THRESHOLD)
+            index.add_signatures(keys, signatures)
+            _indexed_set_sizes.clear()
+            for set_name, _ in keys:
+                _indexed_set_sizes[set_name] = _indexed_set_sizes.get(set_name, 0) + 1
+            _duplicate_index = index
+        return _duplicate_index
+
+
+def _forget_set(index: NearDuplicateIndex, set_name: str):
+    for position in range(_indexed_set_sizes.pop(set_name, 0)):
+        index.remove((set_name, position))
+
+
+def _save_screened(sets: dict, duplicate_action: str = None) -> list:
+    """
+    Writes sets to the store after checking them for near-duplicates, and keeps the
+    index in step. A set being replaced is not compared with its previous version.
+    """
+    global _duplicate_index
+    action = duplicate_action or DUPLICATE_ACTION
+    with _index_lock:
+        index = get_duplicate_index()
+        try:
+            for set_name in sets:
+                _forget_set(index, set_name)
+            keys = [(set_name, i) for set_name, questions in sets.items() for i in range(len(questions))]
+            # Flags from an earlier save are recomputed, not carried over
+            questions = [{k: v for k, v in q.items() if k != "near_duplicate_of"}
+                         for set_questions in sets.values() for q in set_questions]
+            with metrics.timer("store", operation="screen"):
+                signatures = minhash_signatures(questions)
+                if action == "off":
+                    matches = [None] * len(questions)
+                else:
+                    matches = find_near_duplicates(questions, index, keys=keys, signatures=signatures)
+
+            duplicates = []
+            kept = {set_name: [] for set_name in sets}
+            kept_rows = {set_name: [] for set_name in sets}
+            for row, ((set_name, _), q, match) in enumerate(zip(keys, questions, matches)):
+                if match is not None:
+                    (other_set, other_position), similarity = match
+                    duplicate_of = {"set": other_set, "position": other_position + 1, "similarity": round(similarity, 3)}
+                    duplicates.append((q, duplicate_of))
+                    if action == "drop":
+                        continue
+                    q = dict(q, near_duplicate_of=duplicate_of)
+                kept[set_name].append(q)
+                kept_rows[set_name].append(row)
+
+            kept = {set_name: set_questions for set_name, set_questions in kept.items() if set_questions}
+            kept_signatures = {set_name: signatures[kept_rows[set_name]] for set_name in kept}
+            with metrics.timer("store", operation="save"):
+                get_store().save_sets(kept, kept_signatures)
+            duplicate_outcome = "dropped" if action == "drop" else "flagged"
+            unique = len(questions) - len(duplicates)
+            metrics.count("saved_questions_total", unique, outcome="unique")
+            metrics.count("saved_questions_total", len(duplicates), outcome=duplicate_outcome)
+            for set_name, set_questions in kept.items():
+                index.add_signatures([(set_name, i) for i in range(len(set_questions))], kept_signatures[set_name])
+                _indexed_set_sizes[set_name] = len(set_questions)
+        except Exception:
+            _duplicate_index = None # Rebuilt from the store on next use
+            raise
+    return duplicates
+
+
 def init_session():
     """Initializes all necessary session state variables."""
     if 'current_mcqs' not in st.session_state:
         st.session_state.current_mcqs = [] # Questions currently displayed/being worked on
-    if 'saved_question_sets' not in st.session_state:
-        st.session_state.saved_question_sets = {} # Dictionary to store saved sets
-    if 'current_quiz_questions' not in st.session_state:
-        st.session_state.current_quiz_questions = [] # Questions for the active quiz
-    if 'quiz_answers' not in st.session_state:
-        st.session_state.quiz_answers = {} # User's answers for the active quiz
-    if 'quiz_submitted' not in st.session_state:
-        st.session_state.quiz_submitted = False # Flag to check if quiz was submitted
-    if 'quiz_score' not in st.session_state:
-        st.session_state.quiz_score = 0 # Score for the current quiz
-
-
-def save_set(set_name: str, questions: list):
-    """Saves a list of questions as a named set in session state."""
+    if 'quiz' not in st.session_state:
+        st.session_state.quiz = None # The active quiz (a quiz_engine.Quiz), with its answers and page
+    if 'exam' not in st.session_state:
+        st.session_state.exam = None # The last exam built in the Take Quiz tab (see exam_builder.build_exam)
+    if 'generation_jobs' not in st.session_state:
+        st.session_state.generation_jobs = {} # Tab name -> ID of its latest background generation job
+    if 'delivered_jobs' not in st.session_state:
+        st.session_state.delivered_jobs = set() # IDs of finished jobs already moved into current_mcqs
+
+
+def keep_widget_state(keys: list, defaults: dict = None):
+    """
+    Keeps the values of keyed widgets that are not rendered on this run.
+
+    Streamlit drops the state of widgets missing from a run (e.g. widgets in a tab that
+    is not open); writing a value back turns it into plain session state, which the
+    widget picks up again the next time it is rendered. `defaults` seeds the initial
+    values, since such widgets must not also pass value= themselves.
+    """
+    for key, value in (defaults or {}).items():
+        if key not in st.session_state:
+            st.session_state[key] = value
+    for key in keys:
+        if key in st.session_state:
+            st.session_state[key] = st.session_state[key]
+
+
+def save_set(set_name: str, questions: list, duplicate_action: str = None) -> list:
+    """
+    Saves a list of questions as a named set in the question store.
+
+    Near-duplicates of questions already in the bank, or of earlier questions in the
+    set, are flagged or dropped according to `duplicate_action` (DUPLICATE_ACTION by default).
+
+    Returns:
+        list: The near-duplicates found, as (question, near_duplicate_of) pairs where
+        near_duplicate_of holds the matching "set", its 1-based "position" and the "similarity".
+    """
     if set_name and questions:
-        st.session_state.saved_question_sets[set_name] = questions
-    else:
-        st.error("Set name or questions cannot be empty.")
+        return _save_screened({set_name: questions}, duplicate_action)
+    notify.error("Set name or questions cannot be empty.")
+    return []
+
+def save_sets(sets: dict, duplicate_action: str = None) -> list:
+    """
+    Saves several named sets at once, in a single transaction where the backend allows it.
+    Near-duplicates are handled as in save_set, across all the sets being saved.
+    """
+    return _save_screened({name: questions for name, questions in sets.items() if name and questions}, duplicate_action)
 
 def load_set(set_name: str) -> list:
-    """Loads a named question set from session state."""
-    return st.session_state.saved_question_sets.get(set_name, [])
+    """Loads a named question set from the question store."""
+    with metrics.timer("store", operation="load"):
+        return get_store().load_set(set_name)
 
 def delete_set(set_name: str):
-    """Deletes a named question set from session state."""
-    if set_name in st.session_state.saved_question_sets:
-        del st.session_state.saved_question_sets[set_name]
+    """Deletes a named question set from the question store."""
+    with _index_lock, metrics.timer("store", operation="delete"):
+        get_store().delete_set(set_name)
+        if _duplicate_index is not None:
+            _forget_set(_duplicate_index, set_name)
 
 def get_all_sets() -> dict:
-    """Returns all saved question sets."""
-    return st.session_state.saved_question_sets
+    """Returns all saved question sets with their questions. Prefer list_sets for large banks."""
+    return get_store().get_all_sets()
+
+def list_sets(offset: int = 0, limit: int = None, search: str = None,
+              category: str = None, difficulty: str = None) -> list:
+    """Returns one page of set summaries (name, question_count, categories, ...) without loading questions."""
+    with metrics.timer("store", operation="list"):
+        return get_store().list_sets(offset, limit, search, category, difficulty)
+
+def count_sets(search: str = None, category: str = None, difficulty: str = None) -> int:
+    """Returns how many saved sets match the filters."""
+    return get_store().count_sets(search, category, difficulty)
+
+def list_categories() -> list:
+    """Returns the distinct question categories across all saved sets."""
+    return get_store().list_categories()
+
+def question_strata() -> dict:
+    """Returns {(category, difficulty): question count} across all saved sets."""
+    return get_store().question_strata()
+
+def find_question_ids(category: str = None, difficulty: str = None) -> list:
+    """Returns the IDs of the saved questions with this category and difficulty (None matches any)."""
+    with metrics.timer("store", operation="find"):
+        return get_store().question_ids(category, difficulty)
+
+def load_questions(ids: list) -> list:
+    """Loads saved questions by ID (see find_question_ids), in the order given."""
+    with metrics.timer("store", operation="load_questions"):
+        return get_store().load_questions(ids)
+
+def append_sets(sets: dict, replace: tuple = ()):
+    """
+    Bulk-loads questions into saved sets in one transaction, creating the sets as needed
+    (sets named in `replace` are emptied first). Unlike save_sets, the questions are not
+    screened for near-duplicates; the near-duplicate index is reloaded on its next use.
+    """
+    global _duplicate_index
+    with _index_lock, metrics.timer("store", operation="append"):
+        get_store().append_sets(sets, replace=replace)
+        _duplicate_index = None
+
+def rename_sets(renames: dict):
+    """
+    Renames saved sets, given as {old name: new name}, in one transaction where the
+    backend allows it; a set already saved under a new name is replaced.
+    """
+    global _duplicate_index
+    with _index_lock, metrics.timer("store", operation="rename"):
+        get_store().rename_sets(renames)
+        _duplicate_index = None # Keyed on set names; reloaded on next use
+
+def iter_questions():
+    """Yields (set_name, question) for every saved question, holding one set at a time."""
+    return get_store().iter_questions()
 
+def update_difficulties(difficulties: dict) -> int:
+    """
+    Re-tags saved questions, given as {(question text, sorted options): difficulty}
+    (see question_store.question_identity). Returns how many changed.
+    """
+    with metrics.timer("store", operation="retag"):
+        return get_store().update_difficulties(difficulties)